@@ -0,0 +1,100 @@
+import json
+import time
+from datetime import date
+from typing import Callable, Dict, Optional, Tuple
+
+from database import RECEIPTS_VERSION, DatabaseManager
+
+
+class AnalyticsCache:
+    """Serialized analytics results stored in SQLite and shared by every worker.
+    
+    Entries are keyed by query name, parameters and the current day (the
+    windows are whole days back from today) and are only valid for the receipts data
+    version they were computed at, so any save, delete or correction
+    invalidates them without having to know which results it touched.
+    """
+    
+    def __init__(self, db_manager: DatabaseManager, max_entries: int = 256):
+        self.db_manager = db_manager
+        self.max_entries = max_entries
+        self.init_cache()
+    
+    def init_cache(self):
+        """Create the cache table if needed"""
+        with self.db_manager.connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS analytics_cache (
+                    key TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            ''')
+    
+    def current(self) -> Tuple[int, Optional[str]]:
+        """(data version, when it was last bumped) for the receipts data"""
+        return self.db_manager.get_data_version_info(RECEIPTS_VERSION)
+    
+    def etag(self, version: int) -> str:
+        """Entity tag for responses built from this data version today"""
+        return f'{version}-{date.today().isoformat()}'
+    
+    def make_key(self, name: str, params: Dict) -> str:
+        return json.dumps([name, date.today().isoformat(), params], sort_keys=True)
+    
+    def get(self, key: str, version: int) -> Optional[str]:
+        """Cached JSON payload for key, if it was computed at this version"""
+        if self.max_entries <= 0:
+            return None
+        
+        with self.db_manager.connection() as conn:
+            row = conn.execute('''
+                SELECT payload FROM analytics_cache WHERE key = ? AND version = ?
+            ''', (key, version)).fetchone()
+            if row:
+                conn.execute('UPDATE analytics_cache SET last_used = ? WHERE key = ?', (time.time(), key))
+        
+        return row[0] if row else None
+    
+    def put(self, key: str, version: int, payload: str):
+        """Store a payload, dropping entries from older versions and the least recently used"""
+        if self.max_entries <= 0:
+            return
+        
+        with self.db_manager.connection() as conn:
+            conn.execute('''
+                INSERT INTO analytics_cache (key, version, payload, last_used) VALUES (?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET version = excluded.version, payload = excluded.payload,
+                       last_used = excluded.last_used
+                WHERE excluded.version >= analytics_cache.version
+            ''', (key, version, payload, time.time()))
+            conn.execute('DELETE FROM analytics_cache WHERE version < ?', (version,))
+            conn.execute('''
+                DELETE FROM analytics_cache WHERE key IN (
+                    SELECT key FROM analytics_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            ''', (self.max_entries,))
+    
+    def get_or_compute(self, name: str, params: Dict, compute: Callable[[], object],
+                       version: Optional[int] = None) -> str:
+        """JSON for compute(), reusing the cached payload while the data version is unchanged.
+        
+        Pass the version read before answering a request so the payload and
+        its ETag agree; a write that lands while computing just leaves an entry
+        that is never served.
+        """
+        if version is None:
+            version = self.current()[0]
+        key = self.make_key(name, params)
+        
+        payload = self.get(key, version)
+        if payload is None:
+            payload = json.dumps(compute())
+            self.put(key, version, payload)
+        return payload
+    
+    def clear(self):
+        """Remove all cached entries"""
+        with self.db_manager.connection() as conn:
+            conn.execute('DELETE FROM analytics_cache')
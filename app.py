@@ -1,61 +1,121 @@
 import os
 import re
+import csv
+import base64
 import sqlite3
-from datetime import datetime
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
-from werkzeug.utils import secure_filename
-import pytesseract
-from PIL import Image
-import cv2
-import numpy as np
+import hashlib
+import logging
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from io import BytesIO, StringIO
+from flask import Flask, Request, Response, g, render_template, request, jsonify, redirect, url_for, flash
 from receipt_parser import ReceiptParser
 from item_categorizer import ItemCategorizer
 from database import DatabaseManager
+from analytics_cache import AnalyticsCache
+import metrics
+from reporting import REPORTS, get_item_history, run_report
+from job_queue import JobQueue, get_ocr_cache
+from reprocess import CHECKPOINT_NAME, reparse_running
 import json
 
+logger = logging.getLogger(__name__)
+
+class InMemoryRequest(Request):
+    """Keep uploaded files in memory instead of spooling large ones to temp files"""
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # MAX_CONTENT_LENGTH bounds how much a single request can buffer
+        return BytesIO()
+
 app = Flask(__name__)
+app.request_class = InMemoryRequest
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['OCR_WORKERS'] = int(os.environ.get('OCR_WORKERS', os.cpu_count() or 1))
+app.config['OCR_CACHE_SIZE'] = int(os.environ.get('OCR_CACHE_SIZE', 5000))  # 0 disables the OCR cache
+app.config['ARCHIVE_UPLOADS'] = os.environ.get('ARCHIVE_UPLOADS', '1') != '0'  # keep originals on disk
+app.config['ANALYTICS_CACHE_SIZE'] = int(os.environ.get('ANALYTICS_CACHE_SIZE', 256))  # 0 disables it
 
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# Initialize components
+# Initialize components; the schema and migrations come first, since the
+# components below (and every worker process serving requests) rely on them
 db_manager = DatabaseManager()
+db_manager.init_database()
 receipt_parser = ReceiptParser()
 item_categorizer = ItemCategorizer()
+job_queue = JobQueue(db_manager, max_workers=app.config['OCR_WORKERS'],
+                     cache_size=app.config['OCR_CACHE_SIZE'])
+# Resume jobs left over from a restart now, not on the first upload
+job_queue.start()
+analytics_cache = AnalyticsCache(db_manager, max_entries=app.config['ANALYTICS_CACHE_SIZE'])
+archive_executor = ThreadPoolExecutor(max_workers=2)
+reparse_lock = threading.Lock()
+reparse_process = None  # the `python -m reprocess` run this process started
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff'}
 
+RECEIPTS_PAGE_SIZE = 50
+MAX_RECEIPTS_PAGE_SIZE = 500
+MAX_SEARCH_PAGE_SIZE = 100
+EXPORT_FIELDS = ['id', 'filename', 'upload_date', 'store_name', 'total_amount', 'item_count']
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def preprocess_image(image_path):
-    """Preprocess image for better OCR results"""
-    image = cv2.imread(image_path)
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+def archive_upload(image_bytes, filepath):
+    """Write an upload's original bytes to disk, skipping files already archived"""
+    if os.path.exists(filepath):
+        return
+    try:
+        # Write to a temp file first so readers never see a partial image
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(image_bytes)
+        os.replace(tmp_path, filepath)
+    except OSError:
+        metrics.inc('archive_failures_total')
+        logger.exception('Error archiving upload %s', filepath)
+
+def store_upload(file):
+    """Read an uploaded file into memory and archive it in the background.
     
-    # Apply gaussian blur to reduce noise
-    blur = cv2.GaussianBlur(gray, (5, 5), 0)
+    The archive name is the SHA-256 of the content, so re-uploads of the same
+    image share one file. Returns (filepath, image_bytes); filepath is empty
+    when ARCHIVE_UPLOADS is off, since nothing is written there.
+    """
+    image_bytes = file.read()
+    if not app.config['ARCHIVE_UPLOADS']:
+        return '', image_bytes
     
-    # Apply threshold to get better contrast
-    _, thresh = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    extension = file.filename.rsplit('.', 1)[1].lower()
+    filename = f'{hashlib.sha256(image_bytes).hexdigest()}.{extension}'
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    archive_executor.submit(archive_upload, image_bytes, filepath)
     
-    return thresh
+    return filepath, image_bytes
 
-def extract_text_from_image(image_path):
-    """Extract text from image using OCR"""
-    try:
-        # Preprocess the image
-        processed_image = preprocess_image(image_path)
-        
-        # Use pytesseract to extract text
-        text = pytesseract.image_to_string(processed_image, config='--psm 6')
-        return text.strip()
-    except Exception as e:
-        print(f"Error extracting text: {e}")
-        return ""
+@app.before_request
+def start_request_timing():
+    if metrics.ENABLED:
+        g.request_start = time.perf_counter()
+        metrics.start_trace()
+
+@app.after_request
+def record_request_timing(response):
+    if metrics.ENABLED and 'request_start' in g:
+        metrics.observe('http_request_seconds', time.perf_counter() - g.request_start,
+                        endpoint=request.endpoint or 'unmatched')
+        metrics.finish_trace('request', method=request.method, path=request.path, status=response.status_code)
+        metrics.maybe_flush(db_manager.db_path)
+    return response
 
 @app.route('/')
 def index():
@@ -74,43 +134,30 @@ def upload_receipt():
             return redirect(request.url)
         
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-            filename = timestamp + filename
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
-            
-            # Extract text from image
-            extracted_text = extract_text_from_image(filepath)
+            filepath, image_bytes = store_upload(file)
             
-            if not extracted_text:
-                flash('Could not extract text from image. Please try a clearer image.')
-                return redirect(request.url)
+            # Queue the OCR -> parse -> categorize -> save pipeline; the worker
+            # decodes the bytes in memory rather than reading the archive back
+            job_id = job_queue.submit(filepath, image_bytes)
             
-            # Parse receipt text to extract items
-            items = receipt_parser.parse_receipt(extracted_text)
+            if request.accept_mimetypes.best == 'application/json':
+                return jsonify({'job_id': job_id, 'status': 'queued'}), 202
             
-            if not items:
-                flash('Could not identify any items in the receipt. Please check the image quality.')
-                return redirect(request.url)
-            
-            # Categorize items
-            categorized_items = []
-            for item in items:
-                category = item_categorizer.categorize_item(item['name'])
-                item['category'] = category
-                categorized_items.append(item)
-            
-            # Save to database
-            receipt_id = db_manager.save_receipt(filepath, extracted_text, categorized_items)
-            
-            flash(f'Receipt processed successfully! Found {len(categorized_items)} items.')
-            return redirect(url_for('view_receipt', receipt_id=receipt_id))
+            return redirect(url_for('view_job', job_id=job_id))
         else:
             flash('Invalid file type. Please upload an image file.')
     
     return render_template('upload.html')
 
+@app.route('/jobs/<int:job_id>')
+def view_job(job_id):
+    job = job_queue.get_status(job_id)
+    if not job:
+        flash('Job not found')
+        return redirect(url_for('upload_receipt'))
+    
+    return render_template('job_status.html', job=job)
+
 @app.route('/receipt/<int:receipt_id>')
 def view_receipt(receipt_id):
     receipt_data = db_manager.get_receipt(receipt_id)
@@ -120,41 +167,294 @@ def view_receipt(receipt_id):
     
     return render_template('receipt_detail.html', receipt=receipt_data)
 
+def encode_cursor(receipt):
+    """Opaque page cursor holding the (upload_date, id) keyset position of a receipt"""
+    position = json.dumps([receipt['upload_date'], receipt['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(position).decode('ascii')
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for anything it didn't produce"""
+    try:
+        upload_date, receipt_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(upload_date, str) or not isinstance(receipt_id, int):
+        raise ValueError('Invalid cursor')
+    return upload_date, receipt_id
+
+def receipts_page(cursor, limit):
+    """One page of receipts plus the cursor of the next page (None on the last page)"""
+    after = decode_cursor(cursor) if cursor else None
+    # One extra row tells whether another page follows
+    receipts = db_manager.get_receipts_page(limit + 1, after)
+    next_cursor = encode_cursor(receipts[limit - 1]) if len(receipts) > limit else None
+    return receipts[:limit], next_cursor
+
 @app.route('/receipts')
 def list_receipts():
-    receipts = db_manager.get_all_receipts()
-    return render_template('receipts.html', receipts=receipts)
+    try:
+        receipts, next_cursor = receipts_page(request.args.get('cursor'), RECEIPTS_PAGE_SIZE)
+    except ValueError:
+        return redirect(url_for('list_receipts'))
+    
+    return render_template('receipts.html', receipts=receipts, next_cursor=next_cursor,
+                           first_page=not request.args.get('cursor'), totals=db_manager.get_receipt_totals())
+
+def spending_data(days, version=None):
+    """Chart data for the last N days as JSON, served from the analytics cache when unchanged"""
+    return analytics_cache.get_or_compute('spending_data', {'days': days}, lambda: {
+        'category_spending': db_manager.get_spending_by_category(days),
+        'time_spending': db_manager.get_spending_over_time(days),
+        'recent_items': db_manager.get_recent_items(limit=10)
+    }, version)
 
 @app.route('/analytics')
 def analytics():
-    # Get spending by category
-    category_spending = db_manager.get_spending_by_category()
-    
-    # Get spending over time
-    time_spending = db_manager.get_spending_over_time()
-    
-    # Get recent items
-    recent_items = db_manager.get_recent_items(limit=10)
+    data = json.loads(spending_data(30))
     
     return render_template('analytics.html', 
-                         category_spending=category_spending,
-                         time_spending=time_spending,
-                         recent_items=recent_items)
+                         category_spending=data['category_spending'],
+                         time_spending=data['time_spending'],
+                         recent_items=data['recent_items'])
 
 @app.route('/api/spending_data')
 def api_spending_data():
-    """API endpoint for chart data"""
+    """API endpoint for chart data; supports If-None-Match / If-Modified-Since polling"""
     days = request.args.get('days', 30, type=int)
     
-    category_spending = db_manager.get_spending_by_category(days)
-    time_spending = db_manager.get_spending_over_time(days)
-    recent_items = db_manager.get_recent_items(limit=10)
+    version, updated_at = analytics_cache.current()
+    etag = analytics_cache.etag(version)
+    # The windows move at midnight even when no receipt changes
+    last_modified = datetime.now().astimezone().replace(hour=0, minute=0, second=0, microsecond=0)
+    if updated_at:
+        last_modified = max(last_modified, datetime.fromisoformat(updated_at).replace(tzinfo=timezone.utc))
+    
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(etag)
+    else:
+        not_modified = bool(request.if_modified_since) and last_modified <= request.if_modified_since
+    
+    if not_modified:
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(spending_data(days, version), mimetype='application/json')
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
+@app.route('/api/receipts')
+def api_list_receipts():
+    """API endpoint listing receipts newest first, one page per request"""
+    limit = min(max(request.args.get('limit', RECEIPTS_PAGE_SIZE, type=int), 1), MAX_RECEIPTS_PAGE_SIZE)
+    try:
+        receipts, next_cursor = receipts_page(request.args.get('cursor'), limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'receipts': receipts, 'next_cursor': next_cursor})
+
+@app.route('/api/search')
+def api_search():
+    """API endpoint for ranked, typo-tolerant item search"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    
+    limit = min(max(request.args.get('limit', 20, type=int), 1), MAX_SEARCH_PAGE_SIZE)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    
+    # One extra row tells whether another page follows
+    results = db_manager.search_items(query, limit + 1, offset)
+    next_offset = offset + limit if len(results) > limit else None
+    
+    return jsonify({'query': query, 'results': results[:limit], 'next_offset': next_offset})
+
+@app.route('/api/products')
+def api_products():
+    """API endpoint listing products, optionally filtered by a name fragment"""
+    limit = min(max(request.args.get('limit', 50, type=int), 1), MAX_SEARCH_PAGE_SIZE)
+    return jsonify({'products': db_manager.get_products(request.args.get('q', ''), limit)})
+
+@app.route('/api/products/<int:product_id>/prices')
+def api_product_prices(product_id):
+    """API endpoint for every price paid for a product, oldest first"""
+    product = db_manager.get_product(product_id)
+    if not product:
+        return jsonify({'error': 'Product not found'}), 404
+    
+    days = max(request.args.get('days', 365, type=int), 1)
+    store = request.args.get('store')
+    return jsonify({'product': product, 'store': store,
+                    'prices': db_manager.get_price_history(product_id, days, store)})
+
+@app.route('/api/products/<int:product_id>/inflation')
+def api_product_inflation(product_id):
+    """API endpoint for a product's monthly average unit price and its change over the window"""
+    product = db_manager.get_product(product_id)
+    if not product:
+        return jsonify({'error': 'Product not found'}), 404
+    
+    days = max(request.args.get('days', 365, type=int), 1)
+    store = request.args.get('store')
+    return jsonify(dict(db_manager.get_price_inflation(product_id, days, store), product=product, store=store))
+
+@app.route('/api/reports/<name>')
+def api_report(name):
+    """API endpoint for the columnar reports; query string arguments are the report's parameters"""
+    if name not in REPORTS:
+        return jsonify({'error': 'Unknown report', 'reports': sorted(REPORTS)}), 404
+    
+    params = request.args.to_dict()
+    try:
+        payload = analytics_cache.get_or_compute(
+            f'report:{name}', params, lambda: run_report(get_item_history(db_manager), name, params))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return app.response_class(payload, mimetype='application/json')
+
+@app.route('/api/receipts/export')
+def api_export_receipts():
+    """Stream every receipt as CSV (default) or JSON Lines without loading them all"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'jsonl'):
+        return jsonify({'error': 'format must be csv or jsonl'}), 400
+    
+    def generate():
+        buffer = StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        if export_format == 'csv':
+            writer.writeheader()
+        for receipt in db_manager.iter_receipts():
+            if export_format == 'csv':
+                writer.writerow(receipt)
+            else:
+                buffer.write(json.dumps(receipt) + '\n')
+            # Send in ~64 KB chunks rather than one tiny write per row
+            if buffer.tell() >= 65536:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    return Response(generate(), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=receipts.{export_format}'})
+
+@app.route('/metrics')
+def metrics_text():
+    """Pipeline counters and latency histograms from every process, in the Prometheus text format"""
+    if not metrics.ENABLED:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(metrics.render(db_manager.db_path), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/receipts/batch', methods=['POST'])
+def api_batch_upload():
+    """API endpoint to queue many receipt images in one request; poll /api/jobs/<id> for each"""
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+    
+    results = []
+    for file in files:
+        if file.filename and allowed_file(file.filename):
+            filepath, image_bytes = store_upload(file)
+            job_id = job_queue.submit(filepath, image_bytes)
+            results.append({'file': file.filename, 'status': 'queued', 'job_id': job_id})
+        else:
+            results.append({'file': file.filename, 'status': 'rejected', 'error': 'Invalid file type'})
+    
+    queued = sum(result['status'] == 'queued' for result in results)
+    if not queued:
+        return jsonify({'results': results, 'error': 'No valid image files provided'}), 400
+    
+    return jsonify({'results': results, 'queued': queued, 'rejected': len(results) - queued}), 202
+
+@app.route('/api/items/<int:item_id>/category', methods=['POST'])
+def api_correct_item_category(item_id):
+    """API endpoint to correct an item's category and learn the mapping for future receipts"""
+    data = request.get_json(silent=True) or {}
+    category = data.get('category')
+    if category not in item_categorizer.get_all_categories():
+        return jsonify({'error': 'Unknown category'}), 400
+    
+    item = db_manager.update_item_category(item_id, category)
+    if not item:
+        return jsonify({'error': 'Item not found'}), 404
+    
+    # 'other' is a fallback, not something to learn; workers pick up the rest by version
+    keyword = item['name'].lower().strip()
+    if category != 'other' and keyword:
+        item['keyword_version'] = db_manager.save_category_keyword(keyword, category)
+    
+    return jsonify(item)
+
+@app.route('/api/jobs')
+def api_list_jobs():
+    """API endpoint listing recent OCR jobs"""
+    limit = request.args.get('limit', 20, type=int)
+    status = request.args.get('status')
+    
+    return jsonify({'jobs': db_manager.get_recent_jobs(limit, status)})
+
+@app.route('/api/jobs/<int:job_id>')
+def api_job_status(job_id):
+    """API endpoint reporting the status of an OCR job"""
+    job = job_queue.get_status(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify(job)
+
+@app.route('/api/ocr_cache/stats')
+def api_ocr_cache_stats():
+    """API endpoint reporting OCR cache hit/miss counters"""
+    if app.config['OCR_CACHE_SIZE'] <= 0:
+        return jsonify({'enabled': False})
+    
+    stats = get_ocr_cache(db_manager.db_path, app.config['OCR_CACHE_SIZE']).get_stats()
+    stats['enabled'] = True
+    return jsonify(stats)
+
+@app.route('/api/maintenance/reparse', methods=['POST'])
+def api_start_reparse():
+    """API endpoint to re-parse stored receipts in the background"""
+    global reparse_process
+    restart = request.args.get('restart', '0') == '1'
+    
+    # The run gets its own process (and worker pool) through the CLI rather than
+    # forking from the web server; reprocess' lock file stops a second run
+    # started by another web worker
+    with reparse_lock:
+        if (reparse_process is not None and reparse_process.poll() is None) or \
+                reparse_running(db_manager.db_path):
+            return jsonify({'error': 'A re-parse is already running'}), 409
+        
+        command = [sys.executable, '-m', 'reprocess', '--db', os.path.abspath(db_manager.db_path),
+                   '--workers', str(app.config['OCR_WORKERS'])]
+        if restart:
+            command.append('--restart')
+        reparse_process = subprocess.Popen(command, cwd=app.root_path)
+    
+    return jsonify({'status': 'running', 'restart': restart}), 202
+
+@app.route('/api/maintenance/reparse')
+def api_reparse_status():
+    """API endpoint reporting re-parse progress"""
+    checkpoint = db_manager.get_checkpoint(CHECKPOINT_NAME)
+    if not checkpoint:
+        return jsonify({'status': 'never_run'})
+    
+    # Reap a run this process started, so a killed run's pid doesn't linger as a zombie
+    with reparse_lock:
+        if reparse_process is not None:
+            reparse_process.poll()
     
-    return jsonify({
-        'category_spending': category_spending,
-        'time_spending': time_spending,
-        'recent_items': recent_items
-    })
+    # A 'running' checkpoint whose lock holder is gone is an interrupted run that will resume
+    if checkpoint['status'] == 'running' and not reparse_running(db_manager.db_path):
+        checkpoint['status'] = 'interrupted'
+    return jsonify(checkpoint)
 
 @app.route('/api/receipt/<int:receipt_id>', methods=['DELETE'])
 def delete_receipt_api(receipt_id):
@@ -166,6 +466,4 @@ def delete_receipt_api(receipt_id):
         return jsonify({'error': 'Failed to delete receipt'}), 500
 
 if __name__ == '__main__':
-    # Initialize database
-    db_manager.init_database()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,216 @@
+"""Bulk receipt ingestion.
+
+Runs OCR, parsing and categorization for many images across a process pool
+and saves the results in one transaction per chunk.
+
+Usage:
+    python -m batch_ingest path/to/receipts/ [--db receipts.db] [--workers N]
+    python -m batch_ingest receipts.zip --extract-to uploads
+"""
+import argparse
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, List, Optional
+
+import metrics
+from database import DatabaseManager
+from item_categorizer import get_categorizer
+from job_queue import JobFailed, analyze_receipt, get_ocr_cache, lookup_image, read_image
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff'}
+
+
+def is_image_file(filename: str) -> bool:
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+def collect_images(path: str, extract_to: str = 'uploads') -> List[str]:
+    """List the image files in a directory, or extract them from a zip archive"""
+    if os.path.isdir(path):
+        filepaths = []
+        for root, _, files in os.walk(path):
+            for name in files:
+                if is_image_file(name):
+                    filepaths.append(os.path.join(root, name))
+        return sorted(filepaths)
+    
+    if zipfile.is_zipfile(path):
+        os.makedirs(extract_to, exist_ok=True)
+        prefix = os.path.splitext(os.path.basename(path))[0]
+        filepaths = []
+        with zipfile.ZipFile(path) as archive:
+            for index, member in enumerate(archive.infolist()):
+                name = os.path.basename(member.filename)
+                if member.is_dir() or not is_image_file(name):
+                    continue
+                # Flatten the archive layout so members can't escape extract_to;
+                # the member index keeps a/img.jpg and b/img.jpg apart
+                target = os.path.join(extract_to, f'{prefix}_{index:05d}_{name}')
+                with archive.open(member) as src, open(target, 'wb') as dst:
+                    dst.write(src.read())
+                filepaths.append(target)
+        return sorted(filepaths)
+    
+    raise ValueError(f'{path} is neither a directory nor a zip archive')
+
+def _analyze_file(filepath: str, db_path: str, cache_size: int,
+                  image_bytes: Optional[bytes] = None) -> Dict:
+    """Pool worker: analyze one image and report the outcome instead of raising"""
+    db_manager = DatabaseManager(db_path)
+    ocr_cache = get_ocr_cache(db_path, cache_size) if cache_size > 0 else None
+    image_key, cache_lookup = None, None
+    try:
+        get_categorizer(db_manager)
+        if image_bytes is None:
+            image_bytes = read_image(filepath)
+        if ocr_cache:
+            cache_lookup = lookup_image(image_bytes, ocr_cache)
+            image_key, cached = cache_lookup
+            if cached and cached['receipt_id']:
+                duplicate = db_manager.get_receipt(cached['receipt_id'])
+                if duplicate:
+                    return {'file': filepath, 'status': 'duplicate', 'receipt_id': duplicate['id'],
+                            'item_count': duplicate['item_count']}
+        raw_text, items = analyze_receipt(image_bytes, ocr_cache, cache_lookup)
+    except JobFailed as e:
+        return {'file': filepath, 'status': 'failed', 'error': str(e)}
+    except Exception as e:
+        return {'file': filepath, 'status': 'failed', 'error': f'Unexpected error: {e}'}
+    finally:
+        # The pool exits with the batch, so hand the stage timings over per file
+        metrics.flush(db_path)
+    
+    return {'file': filepath, 'status': 'ok', 'raw_text': raw_text, 'items': items, 'image_key': image_key}
+
+def ingest_files(filepaths: List[str], db_manager: DatabaseManager,
+                 max_workers: Optional[int] = None, chunk_size: int = 50,
+                 cache_size: int = 0, images: Optional[List[bytes]] = None) -> Dict:
+    """OCR and save many receipt images, returning per-file results and a throughput summary.
+    
+    Pass images (encoded bytes, parallel to filepaths) to skip reading the files from disk.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    ocr_cache = get_ocr_cache(db_manager.db_path, cache_size) if cache_size > 0 else None
+    start_time = time.perf_counter()
+    
+    results = []
+    pending = []
+    # image_key -> first result with that image; repeats in the batch are
+    # linked to its receipt instead of being saved again
+    first_seen = {}
+    repeats = []
+    
+    def flush():
+        # Write the analyzed receipts of this chunk in one transaction
+        if not pending:
+            return
+        receipt_ids = db_manager.save_receipts([
+            {'filename': r['file'], 'raw_text': r['raw_text'], 'items': r['items']}
+            for r in pending
+        ])
+        for result, receipt_id in zip(pending, receipt_ids):
+            result['receipt_id'] = receipt_id
+            if ocr_cache and result['image_key']:
+                ocr_cache.link_receipt(result['image_key'], receipt_id)
+        pending.clear()
+    
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        analyzed_files = executor.map(_analyze_file, filepaths, repeat(db_manager.db_path),
+                                      repeat(cache_size), images or repeat(None), chunksize=4)
+        for analyzed in analyzed_files:
+            result = {'file': analyzed['file'], 'status': analyzed['status']}
+            if analyzed['status'] == 'ok' and analyzed['image_key'] in first_seen:
+                # Both copies missed the cache before the first one was saved
+                result['status'] = 'duplicate'
+                repeats.append((result, first_seen[analyzed['image_key']]))
+            elif analyzed['status'] == 'ok':
+                if analyzed['image_key']:
+                    first_seen[analyzed['image_key']] = result
+                result['raw_text'] = analyzed['raw_text']
+                result['items'] = analyzed['items']
+                result['image_key'] = analyzed['image_key']
+                result['item_count'] = len(analyzed['items'])
+                pending.append(result)
+                if len(pending) >= chunk_size:
+                    flush()
+            elif analyzed['status'] == 'duplicate':
+                result['receipt_id'] = analyzed['receipt_id']
+                result['item_count'] = analyzed['item_count']
+            else:
+                result['error'] = analyzed['error']
+            results.append(result)
+        flush()
+    
+    for result, original in repeats:
+        result['receipt_id'] = original['receipt_id']
+        result['item_count'] = original['item_count']
+    
+    elapsed = time.perf_counter() - start_time
+    
+    # Drop the bulky OCR payload from the per-file report
+    for result in results:
+        result.pop('raw_text', None)
+        result.pop('items', None)
+        result.pop('image_key', None)
+    
+    succeeded = [r for r in results if r['status'] == 'ok']
+    duplicates = [r for r in results if r['status'] == 'duplicate']
+    summary = {
+        'files': len(results),
+        'succeeded': len(succeeded),
+        'duplicates': len(duplicates),
+        'failed': len(results) - len(succeeded) - len(duplicates),
+        'items': sum(r['item_count'] for r in succeeded),
+        'workers': max_workers,
+        'seconds': round(elapsed, 2),
+        'images_per_sec': round(len(results) / elapsed, 2) if elapsed > 0 else 0.0
+    }
+    
+    return {'results': results, 'summary': summary}
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Bulk-ingest receipt images from a directory or zip archive')
+    parser.add_argument('path', help='directory of images or a .zip archive')
+    parser.add_argument('--db', default='receipts.db', help='SQLite database path')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=50, help='receipts saved per transaction')
+    parser.add_argument('--cache-size', type=int, default=5000, help='OCR cache entries (0 disables the cache)')
+    parser.add_argument('--extract-to', default='uploads', help='where images from a zip are extracted')
+    args = parser.parse_args(argv)
+    
+    try:
+        filepaths = collect_images(args.path, args.extract_to)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    
+    if not filepaths:
+        print('No image files found.')
+        return 1
+    
+    db_manager = DatabaseManager(args.db)
+    db_manager.init_database()
+    
+    report = ingest_files(filepaths, db_manager, args.workers, args.chunk_size, args.cache_size)
+    
+    for result in report['results']:
+        if result['status'] == 'ok':
+            print(f"OK      {result['file']} -> receipt #{result['receipt_id']} ({result['item_count']} items)")
+        elif result['status'] == 'duplicate':
+            print(f"DUP     {result['file']} -> existing receipt #{result['receipt_id']}")
+        else:
+            print(f"FAILED  {result['file']}: {result['error']}")
+    
+    summary = report['summary']
+    print(f"\n{summary['succeeded']}/{summary['files']} receipts ingested ({summary['duplicates']} duplicates), "
+          f"{summary['items']} items, "
+          f"{summary['seconds']}s with {summary['workers']} workers ({summary['images_per_sec']} images/sec)")
+    
+    return 0 if summary['failed'] == 0 else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
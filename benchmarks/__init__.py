@@ -0,0 +1 @@
+"""Benchmarks for the receipt pipeline, run with `python -m benchmarks` (see __main__.py)"""
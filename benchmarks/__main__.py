@@ -0,0 +1,427 @@
+"""Benchmark every stage of the receipt pipeline on synthetic receipts.
+
+Receipts come from benchmarks.receipts with a fixed seed, so every run sees
+the same inputs and recall/accuracy are measured against known contents.
+Results are written as JSON; pass an earlier run to --compare to flag
+regressions between commits.
+
+Usage:
+    python -m benchmarks [--suite parser --suite database] [--rows 10000,100000]
+    python -m benchmarks --compare benchmarks/results/<commit>.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from benchmarks.receipts import (make_item_names, make_receipt, make_receipt_dump, make_receipts, normalize_name,
+                                 render_receipt)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+# Receipts saved per save_receipts() call when filling the database (--batch-size)
+INSERT_BATCH = 500
+
+
+def _median_ms(fn: Callable, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return round(statistics.median(timings) * 1000, 3)
+
+def _ms_summary(seconds: List[float]) -> Dict:
+    return {'p50_ms': round(statistics.median(seconds) * 1000, 3),
+            'mean_ms': round(statistics.fmean(seconds) * 1000, 3)}
+
+def _rate(count: int, seconds: float) -> float:
+    return round(count / seconds, 1) if seconds > 0 else 0.0
+
+def _item_keys(items: List[Dict]) -> Counter:
+    return Counter((normalize_name(item['name']), round(item['price'], 2)) for item in items)
+
+def _recall(parsed: List[Dict], truth: List[Dict]) -> Tuple[int, int]:
+    """(truth items found by name and price, extra parsed items)"""
+    parsed_keys, truth_keys = _item_keys(parsed), _item_keys(truth)
+    found = sum((parsed_keys & truth_keys).values())
+    return found, sum(parsed_keys.values()) - found
+
+def _png_bytes(receipt: Dict, angle: float) -> bytes:
+    buffer = io.BytesIO()
+    render_receipt(receipt, angle).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def bench_ocr(args) -> Dict:
+    """Decode + preprocess and OCR latency per image, and items recovered from the OCR text"""
+    from ocr_engine import get_engine
+    from ocr_processor import decode_image, preprocess_array
+    from receipt_parser import ReceiptParser
+    
+    rng = random.Random(args.seed)
+    receipts = make_receipts(args.images, args.seed)
+    images = [_png_bytes(receipt, rng.uniform(-3, 3)) for receipt in receipts]
+    parser = ReceiptParser()
+    
+    preprocess_times, ocr_times = [], []
+    found = total = 0
+    ocr_error = None
+    for receipt, image_bytes in zip(receipts, images):
+        start = time.perf_counter()
+        processed = preprocess_array(decode_image(image_bytes))
+        preprocess_times.append(time.perf_counter() - start)
+        if ocr_error:
+            continue
+        
+        start = time.perf_counter()
+        try:
+            text = get_engine().image_to_string(processed)
+        except Exception as e:
+            # Without Tesseract the preprocessing numbers are still worth keeping
+            ocr_error = f'OCR unavailable: {e}'
+            continue
+        ocr_times.append(time.perf_counter() - start)
+        
+        found += _recall(parser.parse_receipt(text), receipt['items'])[0]
+        total += len(receipt['items'])
+    
+    results = {'images': len(images), 'preprocess_ms': _ms_summary(preprocess_times)}
+    if ocr_error:
+        return dict(results, error=ocr_error)
+    return dict(results, ocr_ms=_ms_summary(ocr_times),
+                images_per_sec=_rate(len(images), sum(preprocess_times) + sum(ocr_times)),
+                item_recall=round(found / total, 4) if total else 0.0)
+
+def bench_parser(args) -> Dict:
+    """ReceiptParser.parse_receipt throughput and recall on clean receipts, and throughput on one noisy dump"""
+    from receipt_parser import ReceiptParser
+    
+    receipts = make_receipts(args.receipts, args.seed)
+    lines = sum(receipt['text'].count('\n') + 1 for receipt in receipts)
+    parser = ReceiptParser()
+    
+    start = time.perf_counter()
+    parsed = [parser.parse_receipt(receipt['text']) for receipt in receipts]
+    elapsed = time.perf_counter() - start
+    
+    found = extra = 0
+    for items, receipt in zip(parsed, receipts):
+        hits, misses = _recall(items, receipt['items'])
+        found += hits
+        extra += misses
+    total = sum(len(receipt['items']) for receipt in receipts)
+    
+    dump = make_receipt_dump(args.dump_lines, args.seed)
+    dump_ms = _median_ms(lambda: parser.parse_receipt(dump), args.repeat)
+    
+    return {
+        'receipts': len(receipts),
+        'lines': lines,
+        'lines_per_sec': _rate(lines, elapsed),
+        'receipts_per_sec': _rate(len(receipts), elapsed),
+        'item_recall': round(found / total, 4),
+        'extra_items': extra,
+        'dump_lines': args.dump_lines,
+        'dump_lines_per_sec': _rate(args.dump_lines, dump_ms / 1000),
+    }
+
+def bench_categorizer(args) -> Dict:
+    """ItemCategorizer.categorize_item throughput with a cold and a warm cache, accuracy, and noisy-name throughput"""
+    from item_categorizer import ItemCategorizer
+    
+    rng = random.Random(args.seed)
+    items = []
+    while len(items) < args.items:
+        items.extend(make_receipt(rng)['items'])
+    items = items[:args.items]
+    names = [item['name'] for item in items]
+    
+    cold = ItemCategorizer(cache_size=0)
+    start = time.perf_counter()
+    categories = [cold.categorize_item(name) for name in names]
+    cold_elapsed = time.perf_counter() - start
+    
+    warm = ItemCategorizer()
+    for name in names:
+        warm.categorize_item(name)
+    start = time.perf_counter()
+    for name in names:
+        warm.categorize_item(name)
+    warm_elapsed = time.perf_counter() - start
+    
+    batch = ItemCategorizer(cache_size=0)
+    start = time.perf_counter()
+    batch.categorize_many(names)
+    batch_elapsed = time.perf_counter() - start
+    
+    # Decorated, misspelt and unknown names fall through to substring and fuzzy matching
+    noisy = make_item_names(args.items, args.seed)
+    noisy_categorizer = ItemCategorizer(cache_size=0)
+    start = time.perf_counter()
+    for name in noisy:
+        noisy_categorizer.categorize_item(name)
+    noisy_elapsed = time.perf_counter() - start
+    
+    correct = sum(category == item['category'] for category, item in zip(categories, items))
+    return {
+        'items': len(items),
+        'cold_items_per_sec': _rate(len(items), cold_elapsed),
+        'warm_items_per_sec': _rate(len(items), warm_elapsed),
+        'categorize_many_items_per_sec': _rate(len(items), batch_elapsed),
+        'noisy_items_per_sec': _rate(len(noisy), noisy_elapsed),
+        'accuracy': round(correct / len(items), 4),
+    }
+
+def _save_entry(receipt: Dict) -> Dict:
+    return {'filename': f"{receipt['store']}.png", 'raw_text': receipt['text'], 'items': receipt['items']}
+
+def _receipt_batches(rng: random.Random, rows: int, batch_size: int) -> Iterator[List[Dict]]:
+    """Batches of save_receipts() entries until rows items have been generated"""
+    remaining = rows
+    while remaining > 0:
+        batch = []
+        while remaining > 0 and len(batch) < batch_size:
+            receipt = make_receipt(rng)
+            receipt['items'] = receipt['items'][:remaining]
+            remaining -= len(receipt['items'])
+            batch.append(_save_entry(receipt))
+        yield batch
+
+def _single_inserts(args) -> Dict:
+    """The same receipts saved one save_receipt() transaction each, then in save_receipts() batches"""
+    from database import DatabaseManager
+    
+    receipts = [_save_entry(receipt) for receipt in make_receipts(args.single_receipts, args.seed)]
+    rates = {}
+    for mode in ('save_receipt', 'save_receipts'):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_manager = DatabaseManager(os.path.join(tmp, 'receipts.db'))
+            db_manager.init_database()
+            
+            start = time.perf_counter()
+            if mode == 'save_receipt':
+                for receipt in receipts:
+                    db_manager.save_receipt(receipt['filename'], receipt['raw_text'], receipt['items'])
+            else:
+                for offset in range(0, len(receipts), args.batch_size):
+                    db_manager.save_receipts(receipts[offset:offset + args.batch_size])
+            rates[f'{mode}_receipts_per_sec'] = _rate(len(receipts), time.perf_counter() - start)
+    return dict(rates, receipts=len(receipts))
+
+def bench_database(args) -> Dict:
+    """DatabaseManager insert throughput and analytics latency at each table size, and batched vs single saves"""
+    from database import DatabaseManager
+    
+    results = {}
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_manager = DatabaseManager(os.path.join(tmp, 'receipts.db'))
+            db_manager.init_database()
+            
+            rng = random.Random(args.seed)
+            receipts = 0
+            elapsed = 0.0
+            for batch in _receipt_batches(rng, rows, args.batch_size):
+                start = time.perf_counter()
+                db_manager.save_receipts(batch)
+                elapsed += time.perf_counter() - start
+                receipts += len(batch)
+            
+            product = (db_manager.get_products('milk', 1) or [{'id': 1}])[0]
+            queries = {
+                'spending_by_category': lambda: db_manager.get_spending_by_category(30),
+                'spending_over_time': lambda: db_manager.get_spending_over_time(30),
+                'receipt_totals': db_manager.get_receipt_totals,
+                'receipts_page': lambda: db_manager.get_receipts_page(50),
+                'search_items': lambda: db_manager.search_items('milk', 20),
+                'top_items_by_frequency': lambda: db_manager.get_top_items_by_frequency(10),
+                'monthly_summary': db_manager.get_monthly_summary,
+                'price_history': lambda: db_manager.get_price_history(product['id']),
+            }
+            results[str(rows)] = {
+                'items': rows,
+                'receipts': receipts,
+                'insert_items_per_sec': _rate(rows, elapsed),
+                'insert_receipts_per_sec': _rate(receipts, elapsed),
+                'query_ms': {name: _median_ms(query, args.repeat) for name, query in queries.items()},
+            }
+            print(f'  {rows} rows: {results[str(rows)]["insert_items_per_sec"]} items/s inserted')
+    
+    if args.single_receipts:
+        results['single_inserts'] = _single_inserts(args)
+    return results
+
+def bench_upload(args) -> Dict:
+    """POST /upload through the Flask test client until every job has finished"""
+    rng = random.Random(args.seed)
+    images = [_png_bytes(receipt, rng.uniform(-3, 3)) for receipt in make_receipts(args.uploads, args.seed)]
+    
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # The app keeps its database and uploads relative to the working directory
+        os.chdir(tmp)
+        try:
+            # Importing the app creates and migrates its database
+            import app as app_module
+            
+            client = app_module.app.test_client()
+            
+            request_times, job_ids = [], []
+            start = time.perf_counter()
+            for i, image_bytes in enumerate(images):
+                request_start = time.perf_counter()
+                response = client.post('/upload', data={'file': (io.BytesIO(image_bytes), f'{i:04d}.png')},
+                                       headers={'Accept': 'application/json'})
+                request_times.append(time.perf_counter() - request_start)
+                job_ids.append(response.get_json()['job_id'])
+            
+            statuses = {}
+            deadline = time.monotonic() + args.upload_timeout
+            while len(statuses) < len(job_ids) and time.monotonic() < deadline:
+                for job_id in job_ids:
+                    if job_id not in statuses:
+                        job = client.get(f'/api/jobs/{job_id}').get_json()
+                        if job['status'] in ('done', 'failed'):
+                            statuses[job_id] = job['status']
+                time.sleep(0.02)
+            elapsed = time.perf_counter() - start
+            
+            app_module.job_queue.shutdown()
+            app_module.archive_executor.shutdown()
+        finally:
+            os.chdir(cwd)
+    
+    counts = Counter(statuses.values())
+    results = {
+        'uploads': len(images),
+        'request_ms': _ms_summary(request_times),
+        'statuses': dict(counts, unfinished=len(job_ids) - len(statuses)),
+    }
+    if not counts['done']:
+        return dict(results, error='No upload job completed; see statuses')
+    # Failed jobs finish early (e.g. without Tesseract), so only completed ones count
+    return dict(results, jobs_per_sec=_rate(counts['done'], elapsed))
+
+SUITES = {
+    'ocr': bench_ocr,
+    'parser': bench_parser,
+    'categorizer': bench_categorizer,
+    'database': bench_database,
+    'upload': bench_upload,
+}
+
+
+def _git_commit() -> str:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return f'{commit}-dirty' if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def _flatten(results: Dict, prefix: str = '') -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        path = f'{prefix}.{key}' if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+def _direction(metric: str) -> int:
+    """1 if higher is better, -1 if lower is better, 0 for sizes and counts"""
+    if metric.endswith(('_per_sec', 'recall', 'accuracy')):
+        return 1
+    if metric.endswith('_ms') or '.query_ms.' in metric:
+        return -1
+    return 0
+
+def compare(old: Dict, new: Dict, tolerance: float) -> List[str]:
+    """Print every metric both runs have, returning those worse by more than tolerance"""
+    old_flat, new_flat = _flatten(old['results']), _flatten(new['results'])
+    regressions = []
+    print(f"\n{'metric':<55}{old['commit']:>14}{new['commit']:>14}{'change':>9}")
+    for metric, value in new_flat.items():
+        direction = _direction(metric)
+        if not direction or metric not in old_flat or not old_flat[metric]:
+            continue
+        change = (value - old_flat[metric]) / old_flat[metric]
+        regressed = change * direction < -tolerance
+        if regressed:
+            regressions.append(metric)
+        print(f"{metric:<55}{old_flat[metric]:>14}{value:>14}{change:>+9.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description='Benchmark the receipt pipeline on synthetic receipts')
+    arg_parser.add_argument('--suite', action='append', choices=list(SUITES),
+                            help='suite to run (repeatable; default: all)')
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--rows', default='10000,100000,1000000',
+                            help='comma-separated item counts for the database suite')
+    arg_parser.add_argument('--batch-size', type=int, default=INSERT_BATCH,
+                            help='receipts per save_receipts() call in the database suite')
+    arg_parser.add_argument('--single-receipts', type=int, default=5000,
+                            help='receipts the database suite also saves one transaction each (0 skips)')
+    arg_parser.add_argument('--receipts', type=int, default=2000, help='receipts for the parser suite')
+    arg_parser.add_argument('--dump-lines', type=int, default=100000,
+                            help='lines in the parser suite\'s single noisy text')
+    arg_parser.add_argument('--items', type=int, default=20000, help='item names (clean and noisy) for the categorizer suite')
+    arg_parser.add_argument('--images', type=int, default=10, help='rendered images for the OCR suite')
+    arg_parser.add_argument('--uploads', type=int, default=20, help='images posted by the upload suite')
+    arg_parser.add_argument('--upload-timeout', type=float, default=600)
+    arg_parser.add_argument('--repeat', type=int, default=5, help='runs per query (the median is kept)')
+    arg_parser.add_argument('--output', help='results file (default: benchmarks/results/<commit>.json)')
+    arg_parser.add_argument('--compare', help='earlier results file to compare against')
+    arg_parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='relative slowdown reported as a regression (default 0.2)')
+    args = arg_parser.parse_args(argv)
+    args.rows = [int(rows) for rows in args.rows.split(',') if rows]
+    
+    commit = _git_commit()
+    report = {
+        'commit': commit,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'seed': args.seed,
+        'results': {},
+    }
+    for name in args.suite or list(SUITES):
+        print(f'Running {name}...')
+        report['results'][name] = SUITES[name](args)
+        print(json.dumps(report['results'][name], indent=2))
+    
+    output = args.output or os.path.join(RESULTS_DIR, f'{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Wrote {output}')
+    
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        if regressions:
+            print(f'\n{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
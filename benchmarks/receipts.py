@@ -0,0 +1,164 @@
+"""Synthetic receipts with known contents, as text, images or a fixture set.
+
+Items come from the categorizer's keyword lists (with brand/size decorations),
+so every line's name, category, quantity and price is known exactly.
+
+Usage:
+    python -m benchmarks.receipts fixtures/ --count 20 [--seed 0]
+"""
+import os
+import random
+import re
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+STORES = ['FRESH MART', 'CORNER GROCERY', 'VALLEY FOODS', 'GREEN LEAF MARKET', 'SUNRISE SUPERMARKET']
+BRANDS = ['', '', 'ORGANIC', 'FRESH', 'GV', 'KIRKLAND']
+SIZES = ['', '', '12OZ', '1LB', '2PK', 'LG']
+TAX_RATE = 0.06
+LINE_WIDTH = 32
+
+FONT_SIZE = 22
+LINE_HEIGHT = 30
+MARGIN = 24
+
+_catalogue = None
+
+
+def catalogue() -> List[Tuple[str, str]]:
+    """(keyword, category) pairs the categorizer maps exactly"""
+    global _catalogue
+    if _catalogue is None:
+        from item_categorizer import ItemCategorizer
+        
+        categorizer = ItemCategorizer(cache_size=0)
+        _catalogue = sorted(categorizer.item_to_category.items())
+    return _catalogue
+
+def normalize_name(name: str) -> str:
+    """Case- and punctuation-insensitive form used to compare parsed names with the truth"""
+    return ' '.join(re.findall(r'[a-z0-9]+', name.lower()))
+
+def make_receipt(rng: random.Random, min_items: int = 3, max_items: int = 25) -> Dict:
+    """A random receipt: store, date, items (in ReceiptParser's shape, plus category) and its text"""
+    items = []
+    for _ in range(rng.randint(min_items, max_items)):
+        keyword, category = rng.choice(catalogue())
+        name = ' '.join(part for part in (rng.choice(BRANDS), keyword.upper(), rng.choice(SIZES)) if part)
+        quantity = rng.choice([1, 1, 1, 1, 2, 3])
+        unit_price = round(rng.uniform(0.5, 25), 2)
+        price = round(unit_price * quantity, 2)
+        label = f'{quantity} x {name}' if quantity > 1 else name
+        items.append({
+            'name': name,
+            'category': category,
+            'quantity': quantity,
+            'price': price,
+            'unit_price': unit_price,
+            'raw_line': f'{label:<{LINE_WIDTH - 8}}{price:>8.2f}',
+        })
+    
+    subtotal = round(sum(item['price'] for item in items), 2)
+    tax = round(subtotal * TAX_RATE, 2)
+    receipt = {
+        'store': rng.choice(STORES),
+        'date': (date(2024, 1, 1) + timedelta(days=rng.randrange(1000))).strftime('%m/%d/%Y'),
+        'items': items,
+        'total': round(subtotal + tax, 2),
+    }
+    
+    lines = [receipt['store'], f'{rng.randint(1, 999)} MAIN ST', f"{receipt['date']} {rng.randint(8, 21)}:{rng.randint(0, 59):02d}", '']
+    lines += [item['raw_line'] for item in items]
+    lines += ['', f"{'SUBTOTAL':<{LINE_WIDTH - 8}}{subtotal:>8.2f}", f"{'TAX':<{LINE_WIDTH - 8}}{tax:>8.2f}",
+              f"{'TOTAL':<{LINE_WIDTH - 8}}{receipt['total']:>8.2f}", '', 'THANK YOU']
+    receipt['text'] = '\n'.join(lines)
+    return receipt
+
+def make_receipts(count: int, seed: int = 0, **kwargs) -> List[Dict]:
+    """The same count receipts for the same seed"""
+    rng = random.Random(seed)
+    return [make_receipt(rng, **kwargs) for _ in range(count)]
+
+def make_receipt_dump(lines: int, seed: int = 0) -> str:
+    """One long OCR-style text: item lines with quantity prefixes and suffixes, mixed with headers and footers"""
+    rng = random.Random(seed)
+    names = ['Bananas', 'Whole Milk', 'Item: Sourdough Bread', 'Chicken Breast', 'Cheddar Cheese ea',
+             'Olive Oil', 'Paper Towels', 'Greek Yogurt pcs', 'Ground Beef', 'Orange Juice']
+    noise = ['SUBTOTAL 45.12', 'TAX 3.10', 'TOTAL 48.22', 'THANK YOU', 'PRODUCE', '12/05/2024 10:31',
+             'VISA ****1234', '-----------', 'CASHIER: ANNA']
+    dump = []
+    for _ in range(lines):
+        if rng.random() < 0.2:
+            dump.append(rng.choice(noise))
+        else:
+            quantity = rng.choice(['', '', '2x ', '3 @ ', 'qty 4 '])
+            dump.append(f'{quantity}{rng.choice(names)} ${rng.uniform(0.5, 40):.2f}')
+    return '\n'.join(dump)
+
+def make_item_names(count: int, seed: int = 0) -> List[str]:
+    """Item names as OCR delivers them: exact, decorated with brands and sizes, misspelt, or unknown"""
+    rng = random.Random(seed)
+    keywords = [keyword for keyword, _ in catalogue()]
+    names = []
+    for _ in range(count):
+        keyword = rng.choice(keywords)
+        roll = rng.random()
+        if roll < 0.3:
+            names.append(keyword.upper())
+        elif roll < 0.6:
+            names.append(f"{rng.choice(['GV', 'Organic', 'Fresh', 'Kirkland'])} {keyword} "
+                         f"{rng.choice(['12oz', 'LG', '2pk', ''])}")
+        elif roll < 0.85:
+            i = rng.randrange(len(keyword))
+            names.append(keyword[:i] + rng.choice('aeiourstln') + keyword[i + 1:])
+        else:
+            names.append(''.join(rng.choice('abcdefghijklmnopqrstuvwxyz ') for _ in range(rng.randint(4, 14))))
+    return names
+
+def _font(size: int):
+    try:
+        return ImageFont.truetype('DejaVuSansMono.ttf', size)
+    except OSError:
+        return ImageFont.load_default(size=size)
+
+def render_receipt(receipt: Dict, angle: float = 0.0) -> Image.Image:
+    """Draw a receipt's text in black on a white strip (optionally rotated by angle degrees)"""
+    lines = receipt['text'].split('\n')
+    font = _font(FONT_SIZE)
+    width = 2 * MARGIN + int(font.getlength('M' * LINE_WIDTH))
+    image = Image.new('L', (width, 2 * MARGIN + LINE_HEIGHT * len(lines)), 255)
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((MARGIN, MARGIN + i * LINE_HEIGHT), line, fill=0, font=font)
+    if angle:
+        image = image.rotate(angle, expand=True, fillcolor=255)
+    return image
+
+def write_fixtures(out_dir: str, count: int, seed: int = 0, angle: Optional[float] = None) -> List[str]:
+    """Write NNNN.png images with matching NNNN.txt ground truth (the layout image_pipeline.evaluate reads)"""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for i, receipt in enumerate(make_receipts(count, seed)):
+        base = os.path.join(out_dir, f'{i:04d}')
+        render_receipt(receipt, rng.uniform(-3, 3) if angle is None else angle).save(base + '.png')
+        with open(base + '.txt', 'w') as f:
+            f.write(receipt['text'])
+        paths.append(base + '.png')
+    return paths
+
+
+if __name__ == '__main__':
+    import argparse
+    
+    arg_parser = argparse.ArgumentParser(description='Write synthetic receipt images with ground truth')
+    arg_parser.add_argument('out_dir')
+    arg_parser.add_argument('--count', type=int, default=20)
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--angle', type=float, help='rotation in degrees (default: random within +/-3)')
+    args = arg_parser.parse_args()
+    
+    paths = write_fixtures(args.out_dir, args.count, args.seed, args.angle)
+    print(f'Wrote {len(paths)} receipts to {args.out_dir}')
@@ -0,0 +1,287 @@
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from fuzzywuzzy import fuzz
+
+try:
+    from rapidfuzz import fuzz as rapid_fuzz, process as rapid_process
+except ImportError:  # optional: falls back to a NumPy bigram filter
+    rapid_process = None
+
+# Rows of the name x keyword matrix scored at a time in categorize_many
+FUZZY_BATCH_ROWS = 4096
+
+
+def _bigrams(text: str) -> Counter:
+    return Counter(text[i:i + 2] for i in range(len(text) - 1))
+
+
+class CategoryIndex:
+    """Precomputed lookup structures for ItemCategorizer.
+    
+    Keyword entries keep their position in category_mappings (category order,
+    then list order) so ties are broken exactly like the original nested scans:
+    the first entry with the best score wins.
+    
+    - An Aho-Corasick automaton finds every keyword contained in a name in one pass.
+    - A substring table answers "name contained in a keyword" with one dict lookup.
+    - A bigram inverted index plus length buckets narrows fuzzy matching to the
+      keywords that can still reach the score threshold. The filter is exact:
+      fuzz.ratio is at most 2 * LCS / (len(a) + len(b)), and a string loses at
+      most two bigrams per inserted or deleted character.
+    """
+    
+    def __init__(self, category_mappings: Dict[str, List[str]]):
+        # Unique keyword -> (first position, category); entries keeps every occurrence
+        self.keywords: Dict[str, Tuple[Tuple[int, int], str]] = {}
+        self.entries: Dict[str, List[Tuple[Tuple[int, int], str]]] = {}
+        self._category_order = {category: i for i, category in enumerate(category_mappings)}
+        
+        # Aho-Corasick trie: goto transitions, failure links and keyword outputs per node
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[str]] = [[]]
+        self._matches: List[Tuple[str, ...]] = [()]
+        self._links_dirty = False
+        
+        # Substring -> keyword with the earliest position containing it
+        self._substrings: Dict[str, str] = {}
+        
+        # Bigram -> {keyword: count}, and keywords grouped by length
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._by_length: Dict[int, List[str]] = {}
+        
+        # Keyword arrays for batch scoring, rebuilt after keywords change
+        self._matrix = None
+        
+        for category, items in category_mappings.items():
+            for position, keyword in enumerate(items):
+                self.add(keyword, category, position)
+    
+    def add(self, keyword: str, category: str, position: int):
+        """Add the keyword at category_mappings[category][position] to every structure"""
+        if category not in self._category_order:
+            self._category_order[category] = len(self._category_order)
+        order = (self._category_order[category], position)
+        self.entries.setdefault(keyword, []).append((order, category))
+        self.entries[keyword].sort()
+        
+        current = self.keywords.get(keyword)
+        if current is not None:
+            if order < current[0]:
+                self.keywords[keyword] = (order, category)
+                self._reindex_substrings(keyword)
+                self._matrix = None
+            return
+        self.keywords[keyword] = (order, category)
+        
+        # Trie path; failure links are recomputed lazily before the next search
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._matches.append(())
+            node = next_node
+        self._output[node].append(keyword)
+        self._links_dirty = True
+        
+        self._reindex_substrings(keyword)
+        
+        for bigram, count in _bigrams(keyword).items():
+            self._postings.setdefault(bigram, {})[keyword] = count
+        self._by_length.setdefault(len(keyword), []).append(keyword)
+    
+    def _reindex_substrings(self, keyword: str):
+        order = self.keywords[keyword][0]
+        for start in range(len(keyword)):
+            for end in range(start + 1, len(keyword) + 1):
+                substring = keyword[start:end]
+                holder = self._substrings.get(substring)
+                if holder is None or order < self.keywords[holder][0]:
+                    self._substrings[substring] = keyword
+    
+    def _build_links(self):
+        # Breadth-first so a node's failure target is always finished before it
+        queue = list(self._goto[0].values())
+        for node in queue:
+            self._fail[node] = 0
+            self._matches[node] = tuple(self._output[node])
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                # Every keyword ending here, including those reached through failure links
+                self._matches[child] = tuple(self._output[child]) + self._matches[self._fail[child]]
+        self._links_dirty = False
+    
+    def contained_keywords(self, name: str) -> Set[str]:
+        """Every keyword that occurs as a substring of name"""
+        if self._links_dirty:
+            self._build_links()
+        goto, fail, matches = self._goto, self._fail, self._matches
+        found = set()
+        node = 0
+        for char in name:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if matches[node]:
+                found.update(matches[node])
+        return found
+    
+    def best_substring_match(self, name: str) -> Optional[str]:
+        """Category of the best substring match in either direction, or None.
+        
+        Same result as scoring every keyword by len(keyword) if it is in the
+        name and by len(name) if the name is in it, keeping the first best.
+        """
+        if not name:
+            return None
+        
+        # A keyword containing the name scores len(name), which beats any keyword
+        # inside the name unless they are equal (and then either one wins first)
+        container = self._substrings.get(name)
+        contained = self.contained_keywords(name)
+        
+        best = None
+        best_key = None
+        for keyword in contained:
+            key = (-len(keyword), self.keywords[keyword][0])
+            if best_key is None or key < best_key:
+                best, best_key = keyword, key
+        if container is not None:
+            key = (-len(name), self.keywords[container][0])
+            if best_key is None or key < best_key:
+                best = container
+        return self.keywords[best][1] if best is not None else None
+    
+    def fuzzy_candidates(self, name: str, threshold: int) -> List[str]:
+        """Keywords that could score at least threshold with fuzz.ratio, in position order"""
+        # fuzz.ratio rounds to an integer; allow a little slack below the cut-off
+        min_ratio = (threshold - 0.5) / 100 - 1e-9
+        if min_ratio <= 0:
+            return sorted(self.keywords, key=lambda keyword: self.keywords[keyword][0])
+        
+        length = len(name)
+        if length == 0:
+            return []
+        
+        shared: Dict[str, int] = {}
+        for bigram, count in _bigrams(name).items():
+            for keyword, keyword_count in self._postings.get(bigram, {}).items():
+                shared[keyword] = shared.get(keyword, 0) + min(count, keyword_count)
+        
+        candidates = []
+        for keyword_length, keywords in self._by_length.items():
+            total = length + keyword_length
+            # The ratio can't exceed 2 * min(length) / total
+            if 2 * min(length, keyword_length) < min_ratio * total:
+                continue
+            # Characters that must be inserted or deleted, and the bigrams they can break
+            max_edits = int((1 - min_ratio) * total)
+            required = max(length, keyword_length) - 1 - 2 * max_edits
+            if required <= 0:
+                candidates.extend(keywords)
+            else:
+                candidates.extend(keyword for keyword in keywords if shared.get(keyword, 0) >= required)
+        
+        candidates.sort(key=lambda keyword: self.keywords[keyword][0])
+        return candidates
+    
+    def best_fuzzy_match(self, name: str, threshold: int = 80) -> Optional[str]:
+        """Category of the first keyword with the highest fuzz.ratio at or above threshold"""
+        best_category = None
+        best_score = 0
+        for keyword in self.fuzzy_candidates(name, threshold):
+            score = fuzz.ratio(name, keyword)
+            if score > best_score and score >= threshold:
+                best_score = score
+                best_category = self.keywords[keyword][1]
+        return best_category
+    
+    def fuzzy_suggestions(self, name: str, threshold: int) -> List[tuple]:
+        """(category, keyword, score) for every entry scoring at least threshold, in position order"""
+        suggestions = []
+        matches = []
+        for keyword in self.fuzzy_candidates(name, threshold):
+            score = fuzz.ratio(name, keyword)
+            if score >= threshold:
+                matches.extend((order, category, keyword, score) for order, category in self.entries[keyword])
+        matches.sort()
+        for _, category, keyword, score in matches:
+            suggestions.append((category, keyword, score))
+        return suggestions
+
+    def _get_matrix(self):
+        if self._matrix is None:
+            ordered = sorted(self.keywords, key=lambda keyword: self.keywords[keyword][0])
+            vocabulary = {bigram: i for i, bigram in enumerate(self._postings)}
+            bigram_counts = np.zeros((len(ordered), len(vocabulary)), dtype=np.float32)
+            for row, keyword in enumerate(ordered):
+                for bigram, count in _bigrams(keyword).items():
+                    bigram_counts[row, vocabulary[bigram]] = count
+            lengths = np.array([len(keyword) for keyword in ordered], dtype=np.float32)
+            self._matrix = (ordered, vocabulary, bigram_counts, lengths)
+        return self._matrix
+    
+    def _candidate_matrix(self, names: List[str], min_ratio: float) -> np.ndarray:
+        """Boolean name x keyword matrix of pairs that pass the fuzzy filter"""
+        ordered, vocabulary, keyword_counts, keyword_lengths = self._get_matrix()
+        if rapid_process is not None:
+            # rapidfuzz's ratio is 2 * LCS / total, an upper bound of fuzz.ratio
+            scores = rapid_process.cdist(names, ordered, scorer=rapid_fuzz.ratio, processor=None,
+                                         score_cutoff=100 * min_ratio, dtype=np.float32, workers=-1)
+            return scores >= 100 * min_ratio
+        
+        name_counts = np.zeros((len(names), len(vocabulary)), dtype=np.float32)
+        for row, name in enumerate(names):
+            for bigram, count in _bigrams(name).items():
+                column = vocabulary.get(bigram)
+                if column is not None:
+                    name_counts[row, column] = count
+        
+        # Products of counts bound the shared bigrams from above, so the filter stays exact
+        shared = name_counts @ keyword_counts.T
+        name_lengths = np.array([len(name) for name in names], dtype=np.float32)[:, None]
+        total = name_lengths + keyword_lengths
+        max_edits = np.floor((1 - min_ratio) * total)
+        required = np.maximum(name_lengths, keyword_lengths) - 1 - 2 * max_edits
+        return ((2 * np.minimum(name_lengths, keyword_lengths) >= min_ratio * total)
+                & (shared >= required) & (name_lengths > 0))
+    
+    def best_fuzzy_matches(self, names: List[str], threshold: int = 80) -> List[Optional[str]]:
+        """best_fuzzy_match for many names, filtering candidates with one matrix operation per batch"""
+        min_ratio = (threshold - 0.5) / 100 - 1e-9
+        if min_ratio <= 0 or not names or not self.keywords:
+            return [self.best_fuzzy_match(name, threshold) for name in names]
+        
+        ordered = self._get_matrix()[0]
+        results = []
+        for start in range(0, len(names), FUZZY_BATCH_ROWS):
+            batch = names[start:start + FUZZY_BATCH_ROWS]
+            candidates = self._candidate_matrix(batch, min_ratio)
+            for name, row in zip(batch, candidates):
+                best_category = None
+                best_score = 0
+                # Columns are in keyword position order, so the first best still wins
+                for column in np.flatnonzero(row):
+                    keyword = ordered[column]
+                    score = fuzz.ratio(name, keyword)
+                    if score > best_score and score >= threshold:
+                        best_score = score
+                        best_category = self.keywords[keyword][1]
+                results.append(best_category)
+        return results
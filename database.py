@@ -1,93 +1,352 @@
 import sqlite3
 import json
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
+import threading
+import weakref
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Iterator, List, Dict, Optional, Tuple
 import os
 
+from fuzzywuzzy import fuzz
+
+from metrics import timed_methods
+from migrations import index_new_items, migrate, rebuild_derived_tables
+from queries import (ITEM_INSERT_SQL, PRICE_FILTER, PRICE_HISTORY_SQL, PRICE_INFLATION_SQL, PRICE_STORE_FILTER,
+                     RECEIPT_INSERT_SQL, RECEIPT_ITEMS_SQL, RECEIPTS_BETWEEN_SQL, RECEIPTS_PAGE_AFTER_SQL,
+                     RECEIPTS_PAGE_SQL, RECEIPTS_SINCE_SQL, SPENDING_BY_CATEGORY_SQL, SPENDING_OVER_TIME_SQL,
+                     TOP_ITEMS_SQL, UNFINISHED_JOBS_SQL)
+
+# Applied once when a pooled connection is opened. WAL lets readers and a
+# writer work at the same time; NORMAL sync is safe in WAL mode.
+CONNECTION_PRAGMAS = [
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -16000',  # KiB per connection
+    'PRAGMA mmap_size = 268435456',
+    'PRAGMA foreign_keys = ON',
+    'PRAGMA busy_timeout = 5000',
+]
+
+# Idle connections kept per database in each process
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+
+# data_versions counter bumped by every write to receipts or items; cached
+# analytics are only served while it is unchanged
+RECEIPTS_VERSION = 'receipts'
+# Also bumped by writes that change or delete existing rows (saves only append)
+ITEM_REWRITES_VERSION = 'item_rewrites'
+
+# bm25 column weights for (name, raw_line, store_name) in search_items
+SEARCH_WEIGHTS = '10.0, 2.0, 1.0'
+# Typo-tolerant search re-scores this many trigram candidates, keeping those
+# whose fuzz.partial_ratio reaches the minimum
+SEARCH_FUZZY_CANDIDATES = 200
+SEARCH_FUZZY_MIN_SCORE = 75
+# It also scores items named like any of this many newest product names that
+# is close enough, since a transposition like 'mlik' shares no trigram with 'milk'
+SEARCH_FUZZY_PRODUCT_NAMES = 5000
+
+# Shorter price histories get no annualized change: compounding a month or
+# two of noise over a year gives meaningless rates
+MIN_ANNUALIZE_MONTHS = 6
+
+
+
+class PooledConnection(sqlite3.Connection):
+    """SQLite connection whose close() hands it back to its pool.
+    
+    Like a real close, uncommitted changes are rolled back and open cursors
+    are closed, so the next borrower starts clean.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = None
+        self._cursors = weakref.WeakSet()
+    
+    def cursor(self, *args, **kwargs):
+        cursor = super().cursor(*args, **kwargs)
+        self._cursors.add(cursor)
+        return cursor
+    
+    def close(self):
+        if self.pool is None:
+            return super().close()
+        for cursor in list(self._cursors):
+            cursor.close()
+        if self.in_transaction:
+            self.rollback()
+        self.pool.release(self)
+
+
+class ConnectionPool:
+    """Reuses configured connections to one database within a process"""
+    
+    def __init__(self, db_path: str, size: int = POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+    
+    def acquire(self) -> PooledConnection:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        
+        # Borrowers may run on different threads, one at a time
+        conn = sqlite3.connect(self.db_path, factory=PooledConnection, check_same_thread=False)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma).close()
+        conn.pool = self
+        return conn
+    
+    def release(self, conn: PooledConnection):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.pool = None
+        conn.close()
+    
+    def close_idle(self):
+        """Close every idle connection; the pool is not used afterwards"""
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.pool = None
+            conn.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path: str) -> ConnectionPool:
+    """Get this process's connection pool for a database"""
+    with _pools_lock:
+        if db_path not in _pools:
+            _pools[db_path] = ConnectionPool(db_path)
+        return _pools[db_path]
+
+def _close_inherited_pools():
+    # A forked child must not use its parent's connections. Closing its copies
+    # is safe: the parent still holds the database open (and its WAL locks),
+    # so these closes never checkpoint or remove the WAL
+    global _pools, _pools_lock
+    inherited = _pools
+    _pools, _pools_lock = {}, threading.Lock()
+    for pool in inherited.values():
+        pool.close_idle()
+
+os.register_at_fork(after_in_child=_close_inherited_pools)
+
+
+def _process_alive(pid: Optional[int]) -> bool:
+    """Whether a process with this pid exists on this host (jobs only run locally)"""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+@timed_methods('db_query_seconds', exclude=('get_connection', 'connection'))
 class DatabaseManager:
     def __init__(self, db_path: str = 'receipts.db'):
         self.db_path = db_path
         
     def get_connection(self):
-        """Get database connection"""
-        return sqlite3.connect(self.db_path)
+        """Get database connection (from this process's pool; close() returns it)"""
+        return get_pool(self.db_path).acquire()
+    
+    @contextmanager
+    def connection(self):
+        """Check out a connection for one transaction: commit on success, roll back on error"""
+        conn = self.get_connection()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
     
     def init_database(self):
         """Initialize the database with required tables"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            # Create receipts table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS receipts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    filename TEXT NOT NULL,
+                    upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    raw_text TEXT,
+                    store_name TEXT,
+                    store_address TEXT,
+                    receipt_date TEXT,
+                    total_amount REAL,
+                    item_count INTEGER
+                )
+            ''')
+            
+            # Create items table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS items (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    receipt_id INTEGER,
+                    name TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    quantity INTEGER DEFAULT 1,
+                    unit_price REAL,
+                    total_price REAL,
+                    raw_line TEXT,
+                    FOREIGN KEY (receipt_id) REFERENCES receipts (id) ON DELETE CASCADE
+                )
+            ''')
+            
+            # Create categories table for tracking category spending
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS categories (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT UNIQUE NOT NULL,
+                    description TEXT,
+                    color TEXT DEFAULT '#3498db'
+                )
+            ''')
+            
+            # Create jobs table for queued OCR work
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    filename TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    receipt_id INTEGER,
+                    item_count INTEGER,
+                    error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    started_at TIMESTAMP,
+                    finished_at TIMESTAMP,
+                    FOREIGN KEY (receipt_id) REFERENCES receipts (id) ON DELETE SET NULL
+                )
+            ''')
+            
+            # Create checkpoints table for resumable maintenance tasks
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS maintenance_checkpoints (
+                    name TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    last_id INTEGER NOT NULL DEFAULT 0,
+                    stats TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Create learned keyword -> category mappings from user corrections
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS category_keywords (
+                    keyword TEXT PRIMARY KEY,
+                    category TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Create version counters that workers poll to notice changed data
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS data_versions (
+                    name TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            
+            # Insert default categories
+            default_categories = [
+                ('fruits', 'Fresh and dried fruits', '#e74c3c'),
+                ('vegetables', 'Fresh vegetables and produce', '#27ae60'),
+                ('meat', 'Meat, poultry, and seafood', '#e67e22'),
+                ('dairy', 'Milk, cheese, yogurt, and eggs', '#f39c12'),
+                ('grains', 'Bread, rice, pasta, and cereals', '#d35400'),
+                ('beverages', 'Drinks and beverages', '#3498db'),
+                ('snacks', 'Snacks and treats', '#9b59b6'),
+                ('frozen', 'Frozen foods', '#1abc9c'),
+                ('pantry', 'Pantry staples and condiments', '#34495e'),
+                ('canned_goods', 'Canned and jarred foods', '#95a5a6'),
+                ('personal_care', 'Personal care items', '#e91e63'),
+                ('household', 'Household and cleaning supplies', '#607d8b'),
+                ('bakery', 'Bakery items', '#ff9800'),
+                ('other', 'Miscellaneous items', '#795548')
+            ]
+            
+            cursor.executemany('''
+                INSERT OR IGNORE INTO categories (name, description, color) 
+                VALUES (?, ?, ?)
+            ''', default_categories)
+            conn.commit()
+            
+            # Bring older databases up to the current schema (indexes, constraints)
+            migrate(conn)
+    
+    def save_receipt(self, filename: str, raw_text: str, items: List[Dict]) -> int:
+        """Save a receipt and its items to the database"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            receipt_id = self._insert_receipt(cursor, filename, raw_text, items)
         
-        # Create receipts table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS receipts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                filename TEXT NOT NULL,
-                upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                raw_text TEXT,
-                store_name TEXT,
-                store_address TEXT,
-                receipt_date TEXT,
-                total_amount REAL,
-                item_count INTEGER
-            )
-        ''')
+        return receipt_id
+    
+    def save_receipts(self, receipts: List[Dict]) -> List[int]:
+        """Save several receipts in a single transaction.
         
-        # Create items table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                receipt_id INTEGER,
-                name TEXT NOT NULL,
-                category TEXT NOT NULL,
-                quantity INTEGER DEFAULT 1,
-                unit_price REAL,
-                total_price REAL,
-                raw_line TEXT,
-                FOREIGN KEY (receipt_id) REFERENCES receipts (id)
-            )
-        ''')
+        Each entry is a dict with 'filename', 'raw_text' and 'items'.
+        Returns the new receipt ids in the same order.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            # Receipts go in one at a time for their ids (the prepared statement
+            # is reused), then every item of the batch in a single executemany
+            receipt_ids = []
+            for receipt in receipts:
+                cursor.execute(RECEIPT_INSERT_SQL,
+                               self._receipt_row(receipt['filename'], receipt['raw_text'], receipt['items']))
+                receipt_ids.append(cursor.lastrowid)
+            
+            after_item_id = self._last_item_id(cursor)
+            cursor.executemany(ITEM_INSERT_SQL, (
+                row
+                for receipt_id, receipt in zip(receipt_ids, receipts)
+                for row in self._item_rows(receipt_id, receipt['items'])
+            ))
+            index_new_items(cursor, after_item_id)
+            self._bump_data_version(cursor, RECEIPTS_VERSION)
         
-        # Create categories table for tracking category spending
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS categories (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                description TEXT,
-                color TEXT DEFAULT '#3498db'
-            )
-        ''')
-        
-        # Insert default categories
-        default_categories = [
-            ('fruits', 'Fresh and dried fruits', '#e74c3c'),
-            ('vegetables', 'Fresh vegetables and produce', '#27ae60'),
-            ('meat', 'Meat, poultry, and seafood', '#e67e22'),
-            ('dairy', 'Milk, cheese, yogurt, and eggs', '#f39c12'),
-            ('grains', 'Bread, rice, pasta, and cereals', '#d35400'),
-            ('beverages', 'Drinks and beverages', '#3498db'),
-            ('snacks', 'Snacks and treats', '#9b59b6'),
-            ('frozen', 'Frozen foods', '#1abc9c'),
-            ('pantry', 'Pantry staples and condiments', '#34495e'),
-            ('canned_goods', 'Canned and jarred foods', '#95a5a6'),
-            ('personal_care', 'Personal care items', '#e91e63'),
-            ('household', 'Household and cleaning supplies', '#607d8b'),
-            ('bakery', 'Bakery items', '#ff9800'),
-            ('other', 'Miscellaneous items', '#795548')
-        ]
-        
-        cursor.executemany('''
-            INSERT OR IGNORE INTO categories (name, description, color) 
-            VALUES (?, ?, ?)
-        ''', default_categories)
-        
-        conn.commit()
-        conn.close()
+        return receipt_ids
     
-    def save_receipt(self, filename: str, raw_text: str, items: List[Dict]) -> int:
-        """Save a receipt and its items to the database"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def _insert_receipt(self, cursor, filename: str, raw_text: str, items: List[Dict]) -> int:
+        """Insert a receipt and its items using an open cursor (caller commits)"""
+        cursor.execute(RECEIPT_INSERT_SQL, self._receipt_row(filename, raw_text, items))
+        receipt_id = cursor.lastrowid
         
+        after_item_id = self._last_item_id(cursor)
+        cursor.executemany(ITEM_INSERT_SQL, self._item_rows(receipt_id, items))
+        index_new_items(cursor, after_item_id)
+        self._bump_data_version(cursor, RECEIPTS_VERSION)
+        
+        return receipt_id
+    
+    def _last_item_id(self, cursor) -> int:
+        # Item ids only grow (AUTOINCREMENT), so everything inserted after this
+        # call in the same transaction has a larger id
+        cursor.execute('SELECT MAX(id) FROM items')
+        return cursor.fetchone()[0] or 0
+    
+    def _receipt_row(self, filename: str, raw_text: str, items: List[Dict]) -> Tuple:
         # Calculate totals
         total_amount = sum(item.get('price', 0) for item in items)
         item_count = len(items)
@@ -95,20 +354,11 @@ class DatabaseManager:
         # Extract store info (you might want to enhance this)
         store_name = self._extract_store_name(raw_text)
         
-        # Insert receipt
-        cursor.execute('''
-            INSERT INTO receipts (filename, raw_text, store_name, total_amount, item_count)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (filename, raw_text, store_name, total_amount, item_count))
-        
-        receipt_id = cursor.lastrowid
-        
-        # Insert items
+        return (filename, raw_text, store_name, total_amount, item_count)
+    
+    def _item_rows(self, receipt_id: int, items: List[Dict]) -> Iterator[Tuple]:
         for item in items:
-            cursor.execute('''
-                INSERT INTO items (receipt_id, name, category, quantity, unit_price, total_price, raw_line)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
+            yield (
                 receipt_id,
                 item.get('name', ''),
                 item.get('category', 'other'),
@@ -116,228 +366,225 @@ class DatabaseManager:
                 item.get('unit_price', 0),
                 item.get('price', 0),
                 item.get('raw_line', '')
-            ))
-        
-        conn.commit()
-        conn.close()
-        
-        return receipt_id
+            )
     
     def get_receipt(self, receipt_id: int) -> Optional[Dict]:
         """Get a receipt with its items"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Get receipt info
-        cursor.execute('''
-            SELECT id, filename, upload_date, raw_text, store_name, store_address, 
-                   receipt_date, total_amount, item_count
-            FROM receipts WHERE id = ?
-        ''', (receipt_id,))
-        
-        receipt_row = cursor.fetchone()
-        if not receipt_row:
-            conn.close()
-            return None
-        
-        receipt = {
-            'id': receipt_row[0],
-            'filename': receipt_row[1],
-            'upload_date': receipt_row[2],
-            'raw_text': receipt_row[3],
-            'store_name': receipt_row[4],
-            'store_address': receipt_row[5],
-            'receipt_date': receipt_row[6],
-            'total_amount': receipt_row[7],
-            'item_count': receipt_row[8]
-        }
-        
-        # Get items for this receipt
-        cursor.execute('''
-            SELECT id, name, category, quantity, unit_price, total_price, raw_line
-            FROM items WHERE receipt_id = ?
-            ORDER BY name
-        ''', (receipt_id,))
-        
-        items = []
-        for item_row in cursor.fetchall():
-            items.append({
-                'id': item_row[0],
-                'name': item_row[1],
-                'category': item_row[2],
-                'quantity': item_row[3],
-                'unit_price': item_row[4],
-                'total_price': item_row[5],
-                'raw_line': item_row[6]
-            })
-        
-        receipt['items'] = items
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            # Get receipt info
+            cursor.execute('''
+                SELECT id, filename, upload_date, raw_text, store_name, store_address, 
+                       receipt_date, total_amount, item_count
+                FROM receipts WHERE id = ?
+            ''', (receipt_id,))
+            
+            receipt_row = cursor.fetchone()
+            if not receipt_row:
+                return None
+            
+            receipt = {
+                'id': receipt_row[0],
+                'filename': receipt_row[1],
+                'upload_date': receipt_row[2],
+                'raw_text': receipt_row[3],
+                'store_name': receipt_row[4],
+                'store_address': receipt_row[5],
+                'receipt_date': receipt_row[6],
+                'total_amount': receipt_row[7],
+                'item_count': receipt_row[8]
+            }
+            
+            # Get items for this receipt
+            cursor.execute(RECEIPT_ITEMS_SQL, (receipt_id,))
+            
+            items = []
+            for item_row in cursor.fetchall():
+                items.append({
+                    'id': item_row[0],
+                    'name': item_row[1],
+                    'category': item_row[2],
+                    'quantity': item_row[3],
+                    'unit_price': item_row[4],
+                    'total_price': item_row[5],
+                    'raw_line': item_row[6]
+                })
+            
+            receipt['items'] = items
         
         return receipt
     
     def get_all_receipts(self) -> List[Dict]:
         """Get all receipts (summary info only)"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, filename, upload_date, store_name, total_amount, item_count
-            FROM receipts 
-            ORDER BY upload_date DESC
-        ''')
-        
-        receipts = []
-        for row in cursor.fetchall():
-            receipts.append({
-                'id': row[0],
-                'filename': row[1],
-                'upload_date': row[2],
-                'store_name': row[3],
-                'total_amount': row[4],
-                'item_count': row[5]
-            })
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT id, filename, upload_date, store_name, total_amount, item_count
+                FROM receipts 
+                ORDER BY upload_date DESC
+            ''')
+            
+            receipts = [self._receipt_summary_from_row(row) for row in cursor.fetchall()]
         
-        conn.close()
         return receipts
     
-    def get_spending_by_category(self, days: int = 30) -> List[Dict]:
-        """Get spending by category for the last N days"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def get_receipts_page(self, limit: int = 50, after: Optional[Tuple[str, int]] = None) -> List[Dict]:
+        """Get one page of receipts (summary info only), newest first.
         
-        cutoff_date = datetime.now() - timedelta(days=days)
+        after is the (upload_date, id) of the last receipt on the previous page;
+        the page starts right below it on the upload_date index, so deep pages
+        cost the same as the first one.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            if after is None:
+                cursor.execute(RECEIPTS_PAGE_SQL, (limit,))
+            else:
+                cursor.execute(RECEIPTS_PAGE_AFTER_SQL, (after[0], after[1], limit))
+            
+            receipts = [self._receipt_summary_from_row(row) for row in cursor.fetchall()]
         
-        cursor.execute('''
-            SELECT i.category, SUM(i.total_price) as total_spent, COUNT(i.id) as item_count,
-                   c.color
-            FROM items i
-            JOIN receipts r ON i.receipt_id = r.id
-            LEFT JOIN categories c ON i.category = c.name
-            WHERE r.upload_date >= ?
-            GROUP BY i.category
-            ORDER BY total_spent DESC
-        ''', (cutoff_date.isoformat(),))
-        
-        categories = []
-        for row in cursor.fetchall():
-            categories.append({
-                'category': row[0],
-                'total_spent': round(row[1], 2),
-                'item_count': row[2],
-                'color': row[3] or '#3498db'
-            })
+        return receipts
+    
+    def iter_receipts(self, batch_size: int = 500) -> Iterator[Dict]:
+        """Yield every receipt newest first, reading one keyset page at a time"""
+        after = None
+        while True:
+            page = self.get_receipts_page(batch_size, after)
+            yield from page
+            if len(page) < batch_size:
+                return
+            after = (page[-1]['upload_date'], page[-1]['id'])
+    
+    def get_receipt_totals(self) -> Dict:
+        """Receipt count, item count and amount spent across all receipts (from the rollups)"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT COALESCE(SUM(receipt_count), 0), COALESCE(SUM(total_amount), 0) FROM spending_daily')
+            receipt_count, total_amount = cursor.fetchone()
+            cursor.execute('SELECT COALESCE(SUM(item_count), 0) FROM spending_daily_category')
+            item_count = cursor.fetchone()[0]
+        
+        return {'receipts': receipt_count, 'items': item_count, 'total_amount': round(total_amount, 2)}
+    
+    def _receipt_summary_from_row(self, row: Tuple) -> Dict:
+        return {
+            'id': row[0],
+            'filename': row[1],
+            'upload_date': row[2],
+            'store_name': row[3],
+            'total_amount': row[4],
+            'item_count': row[5]
+        }
+    
+    def get_spending_by_category(self, days: int = 30) -> List[Dict]:
+        """Get spending by category for the last N days, from midnight N days ago"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            # Whole days, so a window only moves at midnight, like the cached results
+            cutoff_date = date.today() - timedelta(days=days)
+            
+            cursor.execute(SPENDING_BY_CATEGORY_SQL, {'cutoff': cutoff_date.isoformat()})
+            
+            categories = []
+            for row in cursor.fetchall():
+                categories.append({
+                    'category': row[0],
+                    'total_spent': round(row[1], 2),
+                    'item_count': row[2],
+                    'color': row[3] or '#3498db'
+                })
         
-        conn.close()
         return categories
     
     def get_spending_over_time(self, days: int = 30) -> List[Dict]:
-        """Get daily spending over the last N days"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cutoff_date = datetime.now() - timedelta(days=days)
-        
-        cursor.execute('''
-            SELECT DATE(r.upload_date) as date, SUM(r.total_amount) as daily_total
-            FROM receipts r
-            WHERE r.upload_date >= ?
-            GROUP BY DATE(r.upload_date)
-            ORDER BY date
-        ''', (cutoff_date.isoformat(),))
-        
-        daily_spending = []
-        for row in cursor.fetchall():
-            daily_spending.append({
-                'date': row[0],
-                'total': round(row[1], 2)
-            })
+        """Get daily spending over the last N days, from midnight N days ago"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            # Whole days, so a window only moves at midnight, like the cached results
+            cutoff_date = date.today() - timedelta(days=days)
+            
+            cursor.execute(SPENDING_OVER_TIME_SQL, {'cutoff': cutoff_date.isoformat()})
+            
+            daily_spending = []
+            for row in cursor.fetchall():
+                daily_spending.append({
+                    'date': row[0],
+                    'total': round(row[1], 2)
+                })
         
-        conn.close()
         return daily_spending
     
     def get_recent_items(self, limit: int = 10) -> List[Dict]:
         """Get recently purchased items"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT i.name, i.category, i.total_price, r.upload_date, r.store_name
-            FROM items i
-            JOIN receipts r ON i.receipt_id = r.id
-            ORDER BY r.upload_date DESC
-            LIMIT ?
-        ''', (limit,))
-        
-        recent_items = []
-        for row in cursor.fetchall():
-            recent_items.append({
-                'name': row[0],
-                'category': row[1],
-                'price': row[2],
-                'date': row[3],
-                'store': row[4]
-            })
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT i.name, i.category, i.total_price, r.upload_date, r.store_name
+                FROM items i
+                JOIN receipts r ON i.receipt_id = r.id
+                ORDER BY r.upload_date DESC
+                LIMIT ?
+            ''', (limit,))
+            
+            recent_items = []
+            for row in cursor.fetchall():
+                recent_items.append({
+                    'name': row[0],
+                    'category': row[1],
+                    'price': row[2],
+                    'date': row[3],
+                    'store': row[4]
+                })
         
-        conn.close()
         return recent_items
     
     def get_top_items_by_frequency(self, limit: int = 10) -> List[Dict]:
         """Get most frequently purchased items"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT name, category, COUNT(*) as frequency, AVG(total_price) as avg_price
-            FROM items
-            GROUP BY LOWER(name), category
-            ORDER BY frequency DESC
-            LIMIT ?
-        ''', (limit,))
-        
-        top_items = []
-        for row in cursor.fetchall():
-            top_items.append({
-                'name': row[0],
-                'category': row[1],
-                'frequency': row[2],
-                'avg_price': round(row[3], 2)
-            })
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(TOP_ITEMS_SQL, (limit,))
+            
+            top_items = []
+            for row in cursor.fetchall():
+                top_items.append({
+                    'name': row[0],
+                    'category': row[1],
+                    'frequency': row[2],
+                    'avg_price': round(row[3], 2)
+                })
         
-        conn.close()
         return top_items
     
     def get_monthly_summary(self) -> Dict:
         """Get monthly spending summary"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Current month
-        current_month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        cursor.execute('''
-            SELECT COUNT(id) as receipt_count, SUM(total_amount) as total_spent
-            FROM receipts
-            WHERE upload_date >= ?
-        ''', (current_month_start.isoformat(),))
-        
-        current_month = cursor.fetchone()
-        
-        # Previous month
-        if current_month_start.month == 1:
-            prev_month_start = current_month_start.replace(year=current_month_start.year-1, month=12)
-        else:
-            prev_month_start = current_month_start.replace(month=current_month_start.month-1)
-        
-        cursor.execute('''
-            SELECT COUNT(id) as receipt_count, SUM(total_amount) as total_spent
-            FROM receipts
-            WHERE upload_date >= ? AND upload_date < ?
-        ''', (prev_month_start.isoformat(), current_month_start.isoformat()))
-        
-        previous_month = cursor.fetchone()
-        
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            # Current month
+            current_month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            
+            cursor.execute(RECEIPTS_SINCE_SQL, (current_month_start.isoformat(),))
+            
+            current_month = cursor.fetchone()
+            
+            # Previous month
+            if current_month_start.month == 1:
+                prev_month_start = current_month_start.replace(year=current_month_start.year-1, month=12)
+            else:
+                prev_month_start = current_month_start.replace(month=current_month_start.month-1)
+            
+            cursor.execute(RECEIPTS_BETWEEN_SQL, (prev_month_start.isoformat(), current_month_start.isoformat()))
+            
+            previous_month = cursor.fetchone()
         
         return {
             'current_month': {
@@ -350,32 +597,214 @@ class DatabaseManager:
             }
         }
     
-    def search_items(self, query: str) -> List[Dict]:
-        """Search for items by name"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def search_items(self, query: str, limit: int = 20, offset: int = 0) -> List[Dict]:
+        """Search items by name, receipt line or store name, best matches first.
         
-        cursor.execute('''
-            SELECT i.name, i.category, i.total_price, r.upload_date, r.store_name
+        Words of three or more characters are matched as substrings through the
+        trigram index and ranked with bm25, name matches weighing most. When no
+        item contains every word, items sharing the query's trigrams are
+        re-scored with fuzz.partial_ratio, so typos and OCR errors still find
+        them, together with items named like a close product name (for typos
+        that share no trigram with the name). Each result's 'match' says which
+        of the two (or a plain substring scan, for queries too short for
+        trigrams) produced it.
+        """
+        words = [word for word in query.lower().split() if len(word) >= 3]
+        if not words:
+            return self._search_items_like(query.strip(), limit, offset)
+        
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            exact = ' AND '.join(self._search_phrase(word) for word in words)
+            rows = self._search_index(cursor, exact, limit, offset)
+            if rows or (offset and self._search_index(cursor, exact, 1, 0)):
+                return [dict(self._search_result_from_row(row), match='exact') for row in rows]
+            
+            # Typo-tolerant fallback: any shared trigram makes a candidate, and
+            # so does a close product name
+            needle = ' '.join(query.lower().split())
+            trigrams = {word[i:i + 3] for word in words for i in range(len(word) - 2)}
+            candidates = self._search_index(cursor, ' OR '.join(self._search_phrase(trigram) for trigram in sorted(trigrams)),
+                                            SEARCH_FUZZY_CANDIDATES, 0, with_raw_line=True)
+            seen = {row[0] for row in candidates}
+            candidates += [row for row in self._search_product_names(cursor, needle) if row[0] not in seen]
+        
+        scored = []
+        for position, row in enumerate(candidates):
+            score = max(fuzz.partial_ratio(needle, (row[2] or '').lower()),
+                        fuzz.partial_ratio(needle, (row[7] or '').lower()))
+            if score >= SEARCH_FUZZY_MIN_SCORE:
+                scored.append((-score, position, row))
+        scored.sort()
+        
+        return [dict(self._search_result_from_row(row), match='fuzzy', score=-negative_score)
+                for negative_score, _, row in scored[offset:offset + limit]]
+    
+    def _search_product_names(self, cursor, needle: str) -> List[Tuple]:
+        # The most recent items whose product name is close to needle
+        cursor.execute('SELECT product_key FROM products ORDER BY id DESC LIMIT ?', (SEARCH_FUZZY_PRODUCT_NAMES,))
+        names = [key for (key,) in cursor.fetchall() if fuzz.partial_ratio(needle, key) >= SEARCH_FUZZY_MIN_SCORE]
+        if not names:
+            return []
+        
+        placeholders = ','.join('?' * len(names))
+        cursor.execute(f'''
+            SELECT i.id, i.receipt_id, i.name, i.category, i.total_price, r.upload_date, r.store_name, i.raw_line
             FROM items i
             JOIN receipts r ON i.receipt_id = r.id
-            WHERE i.name LIKE ?
+            WHERE LOWER(i.name) IN ({placeholders})
             ORDER BY r.upload_date DESC
-        ''', (f'%{query}%',))
-        
-        results = []
-        for row in cursor.fetchall():
-            results.append({
-                'name': row[0],
-                'category': row[1],
-                'price': row[2],
-                'date': row[3],
-                'store': row[4]
-            })
+            LIMIT ?
+        ''', names + [SEARCH_FUZZY_CANDIDATES])
+        return cursor.fetchall()
+    
+    def _search_index(self, cursor, match: str, limit: int, offset: int, with_raw_line: bool = False) -> List[Tuple]:
+        # Rank and cut the page inside the index first so only its rows are joined
+        cursor.execute(f'''
+            SELECT i.id, i.receipt_id, i.name, i.category, i.total_price, r.upload_date, r.store_name
+                   {', i.raw_line' if with_raw_line else ''}
+            FROM (
+                SELECT rowid, bm25(items_search, {SEARCH_WEIGHTS}) as score
+                FROM items_search
+                WHERE items_search MATCH ?
+                ORDER BY score
+                LIMIT ? OFFSET ?
+            ) s
+            JOIN items i ON i.id = s.rowid
+            JOIN receipts r ON i.receipt_id = r.id
+            ORDER BY s.score
+        ''', (match, limit, offset))
+        return cursor.fetchall()
+    
+    def _search_phrase(self, text: str) -> str:
+        # FTS5 string literal; inside double quotes every character is literal
+        return '"' + text.replace('"', '""') + '"'
+    
+    def _like_phrase(self, text: str) -> str:
+        # LIKE pattern for values containing text, its % and _ taken literally (with ESCAPE '\')
+        return '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    
+    def _search_items_like(self, query: str, limit: int, offset: int) -> List[Dict]:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT i.id, i.receipt_id, i.name, i.category, i.total_price, r.upload_date, r.store_name
+                FROM items i
+                JOIN receipts r ON i.receipt_id = r.id
+                WHERE i.name LIKE ? ESCAPE '\\'
+                ORDER BY r.upload_date DESC
+                LIMIT ? OFFSET ?
+            ''', (self._like_phrase(query), limit, offset))
+            
+            results = [dict(self._search_result_from_row(row), match='substring') for row in cursor.fetchall()]
         
-        conn.close()
         return results
     
+    def _search_result_from_row(self, row: Tuple) -> Dict:
+        return {
+            'id': row[0],
+            'receipt_id': row[1],
+            'name': row[2],
+            'category': row[3],
+            'price': row[4],
+            'date': row[5],
+            'store': row[6]
+        }
+    
+    def get_products(self, query: str = '', limit: int = 50) -> List[Dict]:
+        """Products whose name contains query (all products when empty), by name"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT id, name, category FROM products
+                WHERE product_key LIKE ? ESCAPE '\\'
+                ORDER BY product_key
+                LIMIT ?
+            ''', (self._like_phrase(query.strip().lower()), limit))
+            
+            products = [self._product_from_row(row) for row in cursor.fetchall()]
+        
+        return products
+    
+    def get_product(self, product_id: int) -> Optional[Dict]:
+        """Get a product by id"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT id, name, category FROM products WHERE id = ?', (product_id,))
+            row = cursor.fetchone()
+        
+        return self._product_from_row(row) if row else None
+    
+    def _product_from_row(self, row: Tuple) -> Dict:
+        return {'id': row[0], 'name': row[1], 'category': row[2]}
+    
+    def get_price_history(self, product_id: int, days: int = 365, store: Optional[str] = None) -> List[Dict]:
+        """Every price paid for a product over the last N days (optionally at one store), oldest first"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            where, params = self._price_filter(product_id, days, store)
+            cursor.execute(PRICE_HISTORY_SQL.format(where=where), params)
+            
+            history = []
+            for row in cursor.fetchall():
+                history.append({
+                    'date': row[0],
+                    'store': row[1],
+                    'quantity': row[2],
+                    'unit_price': round(row[3], 2),
+                    'receipt_id': row[4]
+                })
+        
+        return history
+    
+    def get_price_inflation(self, product_id: int, days: int = 365, store: Optional[str] = None) -> Dict:
+        """Monthly average unit price of a product and its change between the first and last month.
+        
+        The change is also given annualized once the months are at least
+        MIN_ANNUALIZE_MONTHS apart (None before that).
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            where, params = self._price_filter(product_id, days, store)
+            cursor.execute(PRICE_INFLATION_SQL.format(where=where), params)
+            
+            rows = cursor.fetchall()
+            monthly = []
+            for row in rows:
+                monthly.append({
+                    'month': row[0],
+                    'avg_unit_price': round(row[1], 2),
+                    'min_unit_price': round(row[2], 2),
+                    'max_unit_price': round(row[3], 2),
+                    'observations': row[4]
+                })
+        
+        change_percent = annualized_percent = None
+        if len(rows) > 1:
+            first, last = rows[0], rows[-1]
+            ratio = last[1] / first[1]
+            (first_year, first_month), (last_year, last_month) = (map(int, row[0].split('-')) for row in (first, last))
+            months = (last_year - first_year) * 12 + last_month - first_month
+            change_percent = round((ratio - 1) * 100, 2)
+            if months >= MIN_ANNUALIZE_MONTHS:
+                annualized_percent = round((ratio ** (12 / months) - 1) * 100, 2)
+        
+        return {'monthly': monthly, 'change_percent': change_percent, 'annualized_percent': annualized_percent}
+    
+    def _price_filter(self, product_id: int, days: int, store: Optional[str]) -> Tuple[str, Dict]:
+        where = PRICE_FILTER
+        params = {'product_id': product_id, 'cutoff': (datetime.now() - timedelta(days=days)).isoformat()}
+        if store:
+            where += PRICE_STORE_FILTER
+            params['store'] = store
+        return where, params
+    
     def _extract_store_name(self, raw_text: str) -> str:
         """Extract store name from receipt text (basic implementation)"""
         lines = raw_text.split('\n')[:5]  # Look in first 5 lines
@@ -388,17 +817,352 @@ class DatabaseManager:
         
         return "Unknown Store"
     
+    def create_job(self, filename: str) -> int:
+        """Queue an OCR job for an uploaded file, owned by this process until a worker claims it"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                INSERT INTO jobs (filename, status, owner_pid) VALUES (?, 'queued', ?)
+            ''', (filename, os.getpid()))
+            
+            job_id = cursor.lastrowid
+        
+        return job_id
+    
+    def claim_job(self, job_id: int) -> Optional[Dict]:
+        """Mark a queued job as running, returning it only if this caller won the claim"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                UPDATE jobs SET status = 'running', started_at = CURRENT_TIMESTAMP, owner_pid = ?
+                WHERE id = ? AND status = 'queued'
+            ''', (os.getpid(), job_id))
+            claimed = cursor.rowcount == 1
+        
+        return self.get_job(job_id) if claimed else None
+    
+    def finish_job(self, job_id: int, receipt_id: int, item_count: int):
+        """Mark a job as done and link it to the saved receipt"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                UPDATE jobs SET status = 'done', receipt_id = ?, item_count = ?,
+                       finished_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (receipt_id, item_count, job_id))
+    
+    def fail_job(self, job_id: int, error: str):
+        """Mark a job as failed with an error message"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                UPDATE jobs SET status = 'failed', error = ?, finished_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (error, job_id))
+    
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        """Get a job and its current status"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT id, filename, status, receipt_id, item_count, error,
+                       created_at, started_at, finished_at
+                FROM jobs WHERE id = ?
+            ''', (job_id,))
+            
+            row = cursor.fetchone()
+        
+        if not row:
+            return None
+        
+        return self._job_from_row(row)
+    
+    def get_recent_jobs(self, limit: int = 20, status: Optional[str] = None) -> List[Dict]:
+        """Get the most recent jobs, optionally filtered by status"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            query = '''
+                SELECT id, filename, status, receipt_id, item_count, error,
+                       created_at, started_at, finished_at
+                FROM jobs
+            '''
+            params = []
+            if status:
+                query += ' WHERE status = ?'
+                params.append(status)
+            query += ' ORDER BY id DESC LIMIT ?'
+            params.append(limit)
+            
+            cursor.execute(query, params)
+            jobs = [self._job_from_row(row) for row in cursor.fetchall()]
+        
+        return jobs
+    
+    def requeue_pending_jobs(self) -> List[int]:
+        """Adopt unfinished jobs whose owning process has exited and return them to the queue.
+        
+        Jobs queued or running under a live process (a sibling web worker or
+        its pool) are left to it; only those orphaned by a restart or crash
+        are taken over, once, by whichever process gets here first.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            
+            cursor.execute(UNFINISHED_JOBS_SQL)
+            # Nothing has been queued by this process yet, so jobs carrying its
+            # pid belong to an earlier process that had the same one
+            job_ids = [job_id for job_id, owner_pid in cursor.fetchall()
+                       if owner_pid == os.getpid() or not _process_alive(owner_pid)]
+            
+            cursor.executemany('''
+                UPDATE jobs SET status = 'queued', started_at = NULL, owner_pid = ? WHERE id = ?
+            ''', [(os.getpid(), job_id) for job_id in job_ids])
+        return job_ids
+    
+    def _job_from_row(self, row: Tuple) -> Dict:
+        """Convert a jobs row into a dict"""
+        return {
+            'id': row[0],
+            'filename': row[1],
+            'status': row[2],
+            'receipt_id': row[3],
+            'item_count': row[4],
+            'error': row[5],
+            'created_at': row[6],
+            'started_at': row[7],
+            'finished_at': row[8]
+        }
+    
+    def get_receipts_after(self, after_id: int, limit: int) -> List[Tuple[int, str]]:
+        """Get the next chunk of (id, raw_text) rows in id order, for resumable scans"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT id, raw_text FROM receipts
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+            ''', (after_id, limit))
+            
+            rows = cursor.fetchall()
+        
+        return rows
+    
+    def get_items_for_receipts(self, receipt_ids: List[int]) -> Dict[int, List[Dict]]:
+        """Get the stored items of several receipts, grouped by receipt id"""
+        items_by_receipt = {receipt_id: [] for receipt_id in receipt_ids}
+        if not receipt_ids:
+            return items_by_receipt
+        
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            placeholders = ','.join('?' * len(receipt_ids))
+            cursor.execute(f'''
+                SELECT id, receipt_id, name, category, quantity, unit_price, total_price, raw_line
+                FROM items WHERE receipt_id IN ({placeholders})
+                ORDER BY id
+            ''', receipt_ids)
+            
+            for row in cursor.fetchall():
+                items_by_receipt[row[1]].append({
+                    'id': row[0],
+                    'name': row[2],
+                    'category': row[3],
+                    'quantity': row[4],
+                    'unit_price': row[5],
+                    'total_price': row[6],
+                    'raw_line': row[7]
+                })
+        
+        return items_by_receipt
+    
+    def apply_item_changes(self, changes: List[Dict], checkpoint: Optional[Dict] = None):
+        """Apply item diffs for several receipts in one transaction.
+        
+        Each change has 'receipt_id', 'delete' (item ids), 'update' (item dicts
+        with 'id'), 'insert' (item dicts) and the receipt's new 'total_amount'
+        and 'item_count'. A checkpoint dict ('name', 'last_id', 'stats') is saved
+        in the same transaction, so a resumed run never applies a chunk twice.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            # Take the write lock before reading the last item id, so no other
+            # writer can insert items between the read and our inserts
+            cursor.execute('BEGIN IMMEDIATE')
+            after_item_id = self._last_item_id(cursor)
+            
+            for change in changes:
+                cursor.executemany('DELETE FROM items WHERE id = ?',
+                                   [(item_id,) for item_id in change['delete']])
+                
+                cursor.executemany('''
+                    UPDATE items SET name = ?, category = ?, quantity = ?, unit_price = ?,
+                           total_price = ?, raw_line = ?
+                    WHERE id = ?
+                ''', [(item['name'], item['category'], item['quantity'], item['unit_price'],
+                       item['total_price'], item['raw_line'], item['id']) for item in change['update']])
+                
+                cursor.executemany(ITEM_INSERT_SQL, [
+                    (change['receipt_id'], item['name'], item['category'], item['quantity'],
+                     item['unit_price'], item['total_price'], item['raw_line']) for item in change['insert']
+                ])
+                
+                cursor.execute('''
+                    UPDATE receipts SET total_amount = ?, item_count = ? WHERE id = ?
+                ''', (change['total_amount'], change['item_count'], change['receipt_id']))
+            
+            index_new_items(cursor, after_item_id)
+            if changes:
+                self._bump_data_version(cursor, RECEIPTS_VERSION)
+                self._bump_data_version(cursor, ITEM_REWRITES_VERSION)
+            
+            if checkpoint:
+                self._save_checkpoint(cursor, checkpoint['name'], 'running',
+                                      checkpoint['last_id'], checkpoint.get('stats'))
+    
+    def get_checkpoint(self, name: str) -> Optional[Dict]:
+        """Get the saved progress of a maintenance task"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT name, status, last_id, stats, updated_at
+                FROM maintenance_checkpoints WHERE name = ?
+            ''', (name,))
+            
+            row = cursor.fetchone()
+        
+        if not row:
+            return None
+        
+        return {
+            'name': row[0],
+            'status': row[1],
+            'last_id': row[2],
+            'stats': json.loads(row[3]) if row[3] else {},
+            'updated_at': row[4]
+        }
+    
+    def set_checkpoint(self, name: str, status: str, last_id: int, stats: Optional[Dict] = None):
+        """Save the progress of a maintenance task"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            self._save_checkpoint(cursor, name, status, last_id, stats)
+    
+    def _save_checkpoint(self, cursor, name: str, status: str, last_id: int, stats: Optional[Dict]):
+        cursor.execute('''
+            INSERT INTO maintenance_checkpoints (name, status, last_id, stats, updated_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (name) DO UPDATE SET status = excluded.status, last_id = excluded.last_id,
+                   stats = excluded.stats, updated_at = excluded.updated_at
+        ''', (name, status, last_id, json.dumps(stats or {})))
+    
+    def update_item_category(self, item_id: int, category: str) -> Optional[Dict]:
+        """Set an item's category, returning the updated item or None if it doesn't exist"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('UPDATE items SET category = ? WHERE id = ?', (category, item_id))
+            if cursor.rowcount == 0:
+                return None
+            
+            cursor.execute('SELECT id, receipt_id, name, category FROM items WHERE id = ?', (item_id,))
+            row = cursor.fetchone()
+            self._bump_data_version(cursor, RECEIPTS_VERSION)
+            self._bump_data_version(cursor, ITEM_REWRITES_VERSION)
+        
+        return {'id': row[0], 'receipt_id': row[1], 'name': row[2], 'category': row[3]}
+    
+    def save_category_keyword(self, keyword: str, category: str) -> int:
+        """Save a learned keyword mapping and bump the keyword version, returning the new version"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            version = self._bump_data_version(cursor, 'category_keywords')
+            cursor.execute('''
+                INSERT INTO category_keywords (keyword, category, version, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (keyword) DO UPDATE SET category = excluded.category, version = excluded.version,
+                       updated_at = excluded.updated_at
+            ''', (keyword, category, version))
+        
+        return version
+    
+    def get_category_keywords(self, since_version: int = 0) -> List[Tuple[str, str, int]]:
+        """Get (keyword, category, version) mappings changed after since_version, oldest first"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT keyword, category, version FROM category_keywords
+                WHERE version > ?
+                ORDER BY version
+            ''', (since_version,))
+            
+            rows = cursor.fetchall()
+        
+        return rows
+    
+    def get_data_version(self, name: str) -> int:
+        """Get a version counter; cheap enough to check before every job"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT version FROM data_versions WHERE name = ?', (name,))
+            row = cursor.fetchone()
+        
+        return row[0] if row else 0
+    
+    def get_data_version_info(self, name: str) -> Tuple[int, Optional[str]]:
+        """Get a version counter and when it was last bumped (UTC)"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT version, updated_at FROM data_versions WHERE name = ?', (name,))
+            row = cursor.fetchone()
+        
+        return (row[0], row[1]) if row else (0, None)
+    
+    def _bump_data_version(self, cursor, name: str) -> int:
+        cursor.execute('''
+            INSERT INTO data_versions (name, version, updated_at) VALUES (?, 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (name) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at
+        ''', (name,))
+        cursor.execute('SELECT version FROM data_versions WHERE name = ?', (name,))
+        return cursor.fetchone()[0]
+    
+    def rebuild_derived_tables(self):
+        """Recompute the spending rollups, search index and price observations from scratch.
+        
+        Saves and triggers keep them current otherwise; cached analytics are
+        invalidated since they may have been computed from drifted tables.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            rebuild_derived_tables(cursor)
+            self._bump_data_version(cursor, RECEIPTS_VERSION)
+    
     def delete_receipt(self, receipt_id: int) -> bool:
         """Delete a receipt and all its items"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
         try:
-            # Delete items first (due to foreign key constraint)
-            cursor.execute('DELETE FROM items WHERE receipt_id = ?', (receipt_id,))
-            
-            # Delete receipt
+            # Items are deleted and jobs unlinked by the foreign keys (ON DELETE)
             cursor.execute('DELETE FROM receipts WHERE id = ?', (receipt_id,))
+            if cursor.rowcount:
+                self._bump_data_version(cursor, RECEIPTS_VERSION)
+                self._bump_data_version(cursor, ITEM_REWRITES_VERSION)
             
             conn.commit()
             conn.close()
@@ -407,4 +1171,4 @@ class DatabaseManager:
             print(f"Error deleting receipt: {e}")
             conn.rollback()
             conn.close()
-            return False
\ No newline at end of file
+            return False
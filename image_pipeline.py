@@ -0,0 +1,226 @@
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Receipts are usually 58-80mm wide; Tesseract works best around 300 DPI
+RECEIPT_WIDTH_MM = 80
+TARGET_DPI = 300
+
+
+def to_grayscale(image: np.ndarray) -> np.ndarray:
+    """Convert a BGR image to grayscale"""
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+def limit_size(image: np.ndarray, max_side: int = 2000) -> np.ndarray:
+    """Cheaply shrink oversized camera images before the heavier stages run"""
+    height, width = image.shape[:2]
+    scale = max_side / max(height, width)
+    if scale >= 1:
+        return image
+    return cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+def crop_to_receipt(image: np.ndarray, min_area_ratio: float = 0.2) -> np.ndarray:
+    """Crop to the largest bright contour, which is usually the receipt paper"""
+    blur = cv2.GaussianBlur(image, (5, 5), 0)
+    _, mask = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((15, 15), np.uint8))
+    
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return image
+    
+    largest = max(contours, key=cv2.contourArea)
+    x, y, w, h = cv2.boundingRect(largest)
+    
+    # Small blobs are more likely a logo than the receipt itself
+    if w * h < min_area_ratio * image.shape[0] * image.shape[1]:
+        return image
+    return image[y:y + h, x:x + w]
+
+def deskew(image: np.ndarray, max_angle: float = 15.0) -> np.ndarray:
+    """Rotate so text lines are horizontal, based on the min-area box around dark pixels"""
+    _, ink = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    coords = cv2.findNonZero(ink)
+    if coords is None:
+        return image
+    
+    angle = cv2.minAreaRect(coords)[-1]
+    # OpenCV reports [-90, 0) or (0, 90] depending on version; fold into (-45, 45]
+    if angle > 45:
+        angle -= 90
+    elif angle < -45:
+        angle += 90
+    if abs(angle) < 0.5 or abs(angle) > max_angle:
+        return image
+    
+    height, width = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(image, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_REPLICATE)
+
+def normalize_dpi(image: np.ndarray, dpi: int = TARGET_DPI,
+                  receipt_width_mm: float = RECEIPT_WIDTH_MM) -> np.ndarray:
+    """Scale so the receipt width matches the target DPI"""
+    target_width = int(receipt_width_mm / 25.4 * dpi)
+    height, width = image.shape[:2]
+    scale = target_width / width
+    if abs(scale - 1) < 0.1:
+        return image
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    return cv2.resize(image, (target_width, int(height * scale)), interpolation=interpolation)
+
+def blur(image: np.ndarray, kernel: int = 5) -> np.ndarray:
+    """Apply gaussian blur to reduce noise"""
+    return cv2.GaussianBlur(image, (kernel, kernel), 0)
+
+def threshold(image: np.ndarray, method: str = 'auto', uneven_light: float = 18.0) -> np.ndarray:
+    """Binarize with Otsu, adaptive thresholding, or pick one from the lighting ('auto')"""
+    if method == 'auto':
+        # Shadows and gradients show up as spread in a heavily blurred background
+        background = cv2.blur(image, (51, 51))
+        method = 'adaptive' if float(background.std()) > uneven_light else 'otsu'
+    
+    if method == 'adaptive':
+        return cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                     cv2.THRESH_BINARY, 31, 15)
+    
+    _, thresh = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return thresh
+
+
+STAGES: Dict[str, Callable] = {
+    'grayscale': to_grayscale,
+    'limit_size': limit_size,
+    'crop': crop_to_receipt,
+    'deskew': deskew,
+    'normalize_dpi': normalize_dpi,
+    'blur': blur,
+    'threshold': threshold,
+    'otsu': lambda image: threshold(image, 'otsu'),
+    'adaptive': lambda image: threshold(image, 'adaptive'),
+}
+
+# 'adaptive' stays opt-in until its parse accuracy on a fixture set
+# (python -m image_pipeline <fixtures>) is recorded next to 'legacy'
+DEFAULT_PRESET = 'legacy'
+
+PRESETS = {
+    # The original fixed pipeline, at full camera resolution
+    'legacy': ['grayscale', 'blur', 'otsu'],
+    'adaptive': ['grayscale', 'limit_size', 'crop', 'deskew', 'normalize_dpi', 'blur', 'threshold'],
+}
+
+
+class PreprocessPipeline:
+    """Runs a configurable list of preprocessing stages and times each one"""
+    
+    def __init__(self, stages: Optional[List[str]] = None):
+        stages = stages or PRESETS[DEFAULT_PRESET]
+        unknown = [name for name in stages if name not in STAGES]
+        if unknown:
+            raise ValueError(f"Unknown preprocessing stages: {', '.join(unknown)}")
+        self.stages = list(stages)
+    
+    @classmethod
+    def from_config(cls, config: str) -> 'PreprocessPipeline':
+        """Build from a preset name ('legacy', 'adaptive') or a comma-separated stage list"""
+        if config in PRESETS:
+            return cls(PRESETS[config])
+        return cls([name.strip() for name in config.split(',') if name.strip()])
+    
+    @property
+    def signature(self) -> str:
+        """Identify the stages for the OCR cache key"""
+        if self.stages == PRESETS['legacy']:
+            return 'gray|blur5x5|otsu'
+        return '|'.join(self.stages) + f'@{TARGET_DPI}dpi'
+    
+    def run(self, image: np.ndarray) -> Tuple[np.ndarray, Dict[str, float]]:
+        """Run every stage in order, returning the result and per-stage milliseconds"""
+        timings = {}
+        for name in self.stages:
+            start = time.perf_counter()
+            image = STAGES[name](image)
+            timings[name] = round(1000 * (time.perf_counter() - start), 2)
+        return image, timings
+
+
+_pipeline = None
+
+def get_pipeline() -> PreprocessPipeline:
+    """Get the pipeline configured with OCR_PREPROCESS (preset or stage list)"""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = PreprocessPipeline.from_config(os.environ.get('OCR_PREPROCESS', DEFAULT_PRESET))
+    return _pipeline
+
+def evaluate(fixture_dir: str, configs: List[str]) -> Dict[str, Dict]:
+    """Compare pipeline configs on a fixture set.
+    
+    Each fixture is an image plus a .txt file with the same base name holding
+    the true receipt text. Parse accuracy is the share of expected items whose
+    price was found in the OCR'd receipt.
+    """
+    from ocr_engine import get_engine
+    from receipt_parser import ReceiptParser
+    
+    parser = ReceiptParser()
+    engine = get_engine()
+    fixtures = []
+    for name in sorted(os.listdir(fixture_dir)):
+        base, ext = os.path.splitext(name)
+        truth_path = os.path.join(fixture_dir, base + '.txt')
+        if ext.lower() in ('.png', '.jpg', '.jpeg', '.bmp', '.tiff') and os.path.exists(truth_path):
+            with open(truth_path) as f:
+                fixtures.append((os.path.join(fixture_dir, name), parser.parse_receipt(f.read())))
+    
+    report = {}
+    for config in configs:
+        pipeline = PreprocessPipeline.from_config(config)
+        stage_totals = {name: 0.0 for name in pipeline.stages}
+        ocr_ms = 0.0
+        expected_count = 0
+        found_count = 0
+        
+        for image_path, expected_items in fixtures:
+            processed, timings = pipeline.run(cv2.imread(image_path))
+            for name, ms in timings.items():
+                stage_totals[name] += ms
+            
+            start = time.perf_counter()
+            text = engine.image_to_string(processed)
+            ocr_ms += 1000 * (time.perf_counter() - start)
+            
+            found_prices = [item['price'] for item in parser.parse_receipt(text)]
+            for item in expected_items:
+                expected_count += 1
+                if item['price'] in found_prices:
+                    found_prices.remove(item['price'])
+                    found_count += 1
+        
+        count = len(fixtures) or 1
+        report[config] = {
+            'fixtures': len(fixtures),
+            'stage_ms': {name: round(total / count, 2) for name, total in stage_totals.items()},
+            'preprocess_ms': round(sum(stage_totals.values()) / count, 2),
+            'ocr_ms': round(ocr_ms / count, 2),
+            'item_recall': round(found_count / expected_count, 3) if expected_count else None
+        }
+    return report
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    
+    arg_parser = argparse.ArgumentParser(description='Compare preprocessing pipelines on a fixture set')
+    arg_parser.add_argument('fixture_dir', help='directory of receipt images with matching .txt ground truth')
+    arg_parser.add_argument('--config', action='append', help="preset or stage list (repeatable)")
+    args = arg_parser.parse_args()
+    
+    print(json.dumps(evaluate(args.fixture_dir, args.config or ['legacy', 'adaptive']), indent=2))
@@ -1,9 +1,21 @@
-from typing import Dict, List
-from fuzzywuzzy import fuzz, process
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import os
 import re
+import threading
+import time
+from category_index import CategoryIndex
+
+# Default number of computed name -> category decisions remembered per categorizer
+CATEGORY_CACHE_SIZE = int(os.environ.get('CATEGORY_CACHE_SIZE', 10000))
+
+# Per-process categorizer, the learned-keyword version it has applied and when it last checked
+_categorizer = None
+_keyword_version = 0
+_keyword_checked_at = 0.0
 
 class ItemCategorizer:
-    def __init__(self):
+    def __init__(self, cache_size: int = CATEGORY_CACHE_SIZE):
         # Define category mappings with common grocery items
         self.category_mappings = {
             'fruits': [
@@ -101,6 +113,15 @@ class ItemCategorizer:
             'whole': 'grains',
             'ground': 'meat'
         }
+        
+        # Matching index over category_mappings, built on first use
+        self._index = None
+        
+        # LRU cache of decisions for names that needed matching (0 disables it)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
 
     def categorize_item(self, item_name: str) -> str:
         """Categorize a grocery item into a category"""
@@ -113,6 +134,16 @@ class ItemCategorizer:
         if item_lower in self.item_to_category:
             return self.item_to_category[item_lower]
         
+        # Repeated names skip the matching below
+        cached = self._cache_get(item_lower)
+        if cached:
+            return cached
+        
+        category = self._match_category(item_lower)
+        self._cache_put(item_lower, category)
+        return category
+
+    def _match_category(self, item_lower: str) -> str:
         # Check for partial matches within the item name
         best_category = self._find_best_category_match(item_lower)
         if best_category:
@@ -130,44 +161,96 @@ class ItemCategorizer:
         
         return 'other'
 
+    def categorize_many(self, item_names: List[str]) -> List[str]:
+        """Categorize many items at once; same results as categorize_item for each name.
+        
+        Names are normalized and deduplicated, direct and substring hits are
+        resolved first, and the rest are fuzzy-matched together in one pass.
+        """
+        categories = {}
+        fuzzy_names = []
+        computed = []
+        for item_name in item_names:
+            if not item_name:
+                continue
+            item_lower = item_name.lower().strip()
+            if item_lower in categories:
+                continue
+            
+            category = self.item_to_category.get(item_lower) or self._cache_get(item_lower)
+            if category is None:
+                category = self._find_best_category_match(item_lower)
+                computed.append(item_lower)
+            if category is None:
+                for keyword, keyword_category in self.category_keywords.items():
+                    if keyword in item_lower:
+                        category = keyword_category
+                        break
+            if category is None:
+                fuzzy_names.append(item_lower)
+            categories[item_lower] = category
+        
+        # Fuzzy matching as last resort, scored as one name x keyword matrix
+        threshold = 80  # Minimum similarity threshold
+        fuzzy_categories = self._get_index().best_fuzzy_matches(fuzzy_names, threshold)
+        for item_lower, category in zip(fuzzy_names, fuzzy_categories):
+            categories[item_lower] = category or 'other'
+        
+        for item_lower in computed:
+            self._cache_put(item_lower, categories[item_lower])
+        
+        return [categories[item_name.lower().strip()] if item_name else 'other' for item_name in item_names]
+
+    def _cache_get(self, item_lower: str) -> Optional[str]:
+        if self.cache_size <= 0:
+            return None
+        with self._cache_lock:
+            category = self._cache.get(item_lower)
+            if category is None:
+                self._cache_stats['misses'] += 1
+            else:
+                self._cache_stats['hits'] += 1
+                self._cache.move_to_end(item_lower)
+            return category
+
+    def _cache_put(self, item_lower: str, category: str):
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[item_lower] = category
+            self._cache.move_to_end(item_lower)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+                self._cache_stats['evictions'] += 1
+
+    def clear_cache(self):
+        """Forget remembered decisions, e.g. after the mappings change"""
+        with self._cache_lock:
+            self._cache.clear()
+            self._cache_stats['invalidations'] += 1
+
+    def get_cache_stats(self) -> Dict:
+        """Get size and hit/miss counters of the decision cache"""
+        with self._cache_lock:
+            stats = dict(self._cache_stats, entries=len(self._cache), max_entries=self.cache_size)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
+
+    def _get_index(self) -> CategoryIndex:
+        if self._index is None:
+            self._index = CategoryIndex(self.category_mappings)
+        return self._index
+
     def _find_best_category_match(self, item_name: str) -> str:
         """Find the best category match using substring matching"""
-        best_category = None
-        best_score = 0
-        
-        for category, items in self.category_mappings.items():
-            for category_item in items:
-                # Check if category item is contained in the input item name
-                if category_item in item_name:
-                    score = len(category_item)  # Longer matches are better
-                    if score > best_score:
-                        best_score = score
-                        best_category = category
-                
-                # Check if input item name is contained in category item
-                if item_name in category_item:
-                    score = len(item_name)
-                    if score > best_score:
-                        best_score = score
-                        best_category = category
-        
-        return best_category
+        # Longest keyword inside the name, or any keyword containing the name
+        return self._get_index().best_substring_match(item_name)
 
     def _fuzzy_match_category(self, item_name: str) -> str:
         """Use fuzzy matching to find the best category"""
-        best_category = None
-        best_score = 0
         threshold = 80  # Minimum similarity threshold
-        
-        for category, items in self.category_mappings.items():
-            for category_item in items:
-                # Calculate similarity
-                score = fuzz.ratio(item_name, category_item)
-                if score > best_score and score >= threshold:
-                    best_score = score
-                    best_category = category
-        
-        return best_category
+        return self._get_index().best_fuzzy_match(item_name, threshold)
 
     def get_all_categories(self) -> List[str]:
         """Get all available categories"""
@@ -180,6 +263,26 @@ class ItemCategorizer:
             self.item_to_category[item_lower] = category
             if item_lower not in self.category_mappings[category]:
                 self.category_mappings[category].append(item_lower)
+                if self._index is not None:
+                    self._index.add(item_lower, category, len(self.category_mappings[category]) - 1)
+                # A new keyword can change the match for any remembered name
+                self.clear_cache()
+
+    def apply_learned_mappings(self, mappings: List[tuple]):
+        """Apply (keyword, category) corrections in order, moving keywords out of other categories"""
+        for keyword, category in mappings:
+            if category not in self.category_mappings:
+                continue
+            moved = False
+            for other_category, items in self.category_mappings.items():
+                if other_category != category and keyword in items:
+                    items[:] = [item for item in items if item != keyword]
+                    moved = True
+            if moved:
+                # Removing keywords shifts positions, so rebuild the index on next use
+                self._index = None
+                self.clear_cache()
+            self.add_custom_mapping(keyword, category)
 
     def get_category_stats(self, items: List[Dict]) -> Dict:
         """Get statistics about categorized items"""
@@ -200,15 +303,33 @@ class ItemCategorizer:
 
     def suggest_category_for_unknown_item(self, item_name: str, threshold: int = 70) -> List[tuple]:
         """Suggest possible categories for an unknown item"""
-        suggestions = []
         item_lower = item_name.lower().strip()
-        
-        for category, items in self.category_mappings.items():
-            for category_item in items:
-                score = fuzz.ratio(item_lower, category_item)
-                if score >= threshold:
-                    suggestions.append((category, category_item, score))
+        suggestions = self._get_index().fuzzy_suggestions(item_lower, threshold)
         
         # Sort by score (highest first)
         suggestions.sort(key=lambda x: x[2], reverse=True)
-        return suggestions[:5]  # Return top 5 suggestions
\ No newline at end of file
+        return suggestions[:5]  # Return top 5 suggestions
+
+
+def get_categorizer(db_manager=None, max_age: float = 0.0) -> ItemCategorizer:
+    """Get this process's categorizer, applying keyword corrections saved since the last check.
+    
+    Only the version counter is read unless a correction was saved, and then
+    just the changed keywords are loaded and added to the existing index.
+    max_age skips the check if one ran within that many seconds.
+    """
+    global _categorizer, _keyword_version, _keyword_checked_at
+    if _categorizer is None:
+        _categorizer = ItemCategorizer()
+    if db_manager is not None and time.monotonic() - _keyword_checked_at >= max_age:
+        _keyword_checked_at = time.monotonic()
+        version = db_manager.get_data_version('category_keywords')
+        if version < _keyword_version:
+            # The database was replaced; start over from the built-in mappings
+            _categorizer = ItemCategorizer()
+            _keyword_version = 0
+        if version != _keyword_version:
+            rows = db_manager.get_category_keywords(_keyword_version)
+            _categorizer.apply_learned_mappings([(keyword, category) for keyword, category, _ in rows])
+            _keyword_version = version
+    return _categorizer
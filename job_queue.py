@@ -0,0 +1,201 @@
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+from database import DatabaseManager
+from item_categorizer import get_categorizer
+from ocr_cache import OCRCache
+from ocr_processor import extract_text_from_bytes, ocr_signature
+from receipt_parser import ReceiptParser
+
+logger = logging.getLogger(__name__)
+
+# Per-process parser/cache, built once in each pool worker
+_worker_parser = None
+_worker_caches = {}
+
+
+class JobFailed(Exception):
+    """Raised when a receipt cannot be processed; the message is shown to the user"""
+
+
+def get_ocr_cache(db_path: str, max_entries: int) -> OCRCache:
+    """Get this process's OCR cache for a database, creating it on first use"""
+    key = (db_path, max_entries)
+    if key not in _worker_caches:
+        _worker_caches[key] = OCRCache(db_path, max_entries, ocr_signature())
+    return _worker_caches[key]
+
+def read_image(filepath: str) -> bytes:
+    """Read an archived upload from disk"""
+    with open(filepath, 'rb') as f:
+        return f.read()
+
+def lookup_image(image_bytes: bytes, ocr_cache: OCRCache) -> Tuple[str, Optional[Dict]]:
+    """Hash an image and look it up in the OCR cache"""
+    image_key = ocr_cache.image_key(image_bytes)
+    return image_key, ocr_cache.get(image_key)
+
+def analyze_receipt(image_bytes: bytes, ocr_cache: Optional[OCRCache] = None,
+                    cache_lookup: Optional[Tuple[str, Optional[Dict]]] = None) -> Tuple[str, List[Dict]]:
+    """Run OCR, parsing and categorization for one encoded image without saving it"""
+    global _worker_parser
+    if _worker_parser is None:
+        _worker_parser = ReceiptParser()
+    
+    # Extract text from image, reusing cached OCR for identical images
+    image_key, cached = None, None
+    if ocr_cache:
+        image_key, cached = cache_lookup or lookup_image(image_bytes, ocr_cache)
+    
+    if cached:
+        extracted_text = cached['text']
+    else:
+        extracted_text = extract_text_from_bytes(image_bytes)
+        if ocr_cache and extracted_text:
+            ocr_cache.put(image_key, extracted_text)
+    
+    if not extracted_text:
+        raise JobFailed('Could not extract text from image. Please try a clearer image.')
+    
+    # Parse receipt text to extract items
+    with metrics.timed('parse'):
+        items = _worker_parser.parse_receipt(extracted_text)
+    if not items:
+        metrics.inc('empty_parses_total')
+        raise JobFailed('Could not identify any items in the receipt. Please check the image quality.')
+    metrics.observe('receipt_items', len(items))
+    
+    # Categorize items
+    with metrics.timed('categorize'):
+        categories = get_categorizer().categorize_many([item['name'] for item in items])
+    for item, category in zip(items, categories):
+        item['category'] = category
+    
+    return extracted_text, items
+
+def process_receipt(filename: str, image_bytes: bytes, db_manager: DatabaseManager,
+                    ocr_cache: Optional[OCRCache] = None) -> Dict:
+    """Run the OCR -> parse -> categorize -> save pipeline for one image"""
+    # Pick up category corrections saved since this worker's last job
+    get_categorizer(db_manager)
+    
+    cache_lookup = None
+    if ocr_cache:
+        with metrics.timed('cache_lookup'):
+            cache_lookup = lookup_image(image_bytes, ocr_cache)
+        
+        # An exact duplicate upload is linked to the existing receipt
+        cached = cache_lookup[1]
+        duplicate = db_manager.get_receipt(cached['receipt_id']) if cached and cached['receipt_id'] else None
+        if duplicate:
+            return {'receipt_id': duplicate['id'], 'item_count': duplicate['item_count'], 'duplicate': True}
+    
+    extracted_text, items = analyze_receipt(image_bytes, ocr_cache, cache_lookup)
+    
+    # Save to database
+    with metrics.timed('save'):
+        receipt_id = db_manager.save_receipt(filename, extracted_text, items)
+    if ocr_cache:
+        ocr_cache.link_receipt(cache_lookup[0], receipt_id)
+    
+    return {'receipt_id': receipt_id, 'item_count': len(items), 'duplicate': False}
+
+def run_job(job_id: int, db_path: str, cache_size: int = 0,
+            image_bytes: Optional[bytes] = None) -> Optional[str]:
+    """Worker entry point: claim a queued job and run it to completion.
+    
+    Fresh uploads arrive with their bytes in memory; jobs resumed after a
+    restart are read back from the archived file.
+    """
+    db_manager = DatabaseManager(db_path)
+    ocr_cache = get_ocr_cache(db_path, cache_size) if cache_size > 0 else None
+    
+    # Another worker (or a previous run) may already own this job
+    job = db_manager.claim_job(job_id)
+    if not job:
+        return None
+    
+    metrics.start_trace()
+    status = 'failed'
+    try:
+        if image_bytes is None:
+            if not job['filename']:
+                raise JobFailed('The upload was not archived (ARCHIVE_UPLOADS=0), so it cannot be resumed. '
+                                'Please upload it again.')
+            try:
+                image_bytes = read_image(job['filename'])
+            except OSError:
+                raise JobFailed('The uploaded image is no longer available. Please upload it again.')
+        with metrics.timed('total'):
+            result = process_receipt(job['filename'], image_bytes, db_manager, ocr_cache)
+    except JobFailed as e:
+        db_manager.fail_job(job_id, str(e))
+    except Exception as e:
+        logger.exception('Error processing job %s', job_id)
+        db_manager.fail_job(job_id, f'Unexpected error: {e}')
+    else:
+        db_manager.finish_job(job_id, result['receipt_id'], result['item_count'])
+        status = 'duplicate' if result['duplicate'] else 'done'
+    finally:
+        metrics.inc('jobs_total', status=status)
+        metrics.finish_trace('job', job_id=job_id, status=status)
+        # Workers live in a pool, so hand the numbers over after every job
+        metrics.flush(db_path)
+    
+    return 'failed' if status == 'failed' else 'done'
+
+
+class JobQueue:
+    """Queues uploaded receipts in SQLite and processes them in a process pool"""
+    
+    def __init__(self, db_manager: DatabaseManager, max_workers: Optional[int] = None,
+                 cache_size: int = 0):
+        self.db_manager = db_manager
+        self.max_workers = max_workers
+        self.cache_size = cache_size
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Start the worker pool on first use and resume jobs orphaned by a previous process"""
+        with self._lock:
+            # A pool inherited through fork (e.g. from a server that imports the
+            # app before forking its workers) can't be used, so start a new one
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                self._executor_pid = os.getpid()
+                for job_id in self.db_manager.requeue_pending_jobs():
+                    self._executor.submit(run_job, job_id, self.db_manager.db_path, self.cache_size)
+            return self._executor
+    
+    def start(self):
+        """Start the worker pool eagerly, picking up jobs left over from a restart"""
+        self._get_executor()
+    
+    def submit(self, filepath: str, image_bytes: Optional[bytes] = None) -> int:
+        """Persist a job for an upload and hand it to the pool.
+        
+        When image_bytes is given the worker decodes them in memory and never
+        reads filepath; it is only needed to resume the job after a restart,
+        and is empty for uploads that were not archived.
+        """
+        executor = self._get_executor()
+        job_id = self.db_manager.create_job(filepath)
+        executor.submit(run_job, job_id, self.db_manager.db_path, self.cache_size, image_bytes)
+        return job_id
+    
+    def get_status(self, job_id: int) -> Optional[Dict]:
+        """Get the current status of a job"""
+        return self.db_manager.get_job(job_id)
+    
+    def shutdown(self, wait: bool = True):
+        """Stop the worker pool; queued jobs stay in the database"""
+        with self._lock:
+            if self._executor is not None and self._executor_pid == os.getpid():
+                self._executor.shutdown(wait=wait)
+            self._executor = None
@@ -0,0 +1,271 @@
+"""Lightweight counters and latency histograms for the upload pipeline.
+
+Each process records into an in-memory registry, and the totals are added to
+SQLite after every job (and at most every FLUSH_INTERVAL seconds from the web
+process), so GET /metrics reports every worker in the Prometheus text format.
+
+METRICS=0 turns recording off: DatabaseManager methods are left unwrapped and
+every other call returns after one flag check. TIMING_LOG=1 logs one JSON line
+per request and per job with the time spent in each stage.
+"""
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+ENABLED = os.environ.get('METRICS', '1') != '0'
+TIMING_LOG = ENABLED and os.environ.get('TIMING_LOG', '0') == '1'
+
+# Seconds between flushes from processes that don't flush after every job
+FLUSH_INTERVAL = 10.0
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    'receipt_stage_seconds': ('histogram', 'Time spent in each stage of processing a receipt', LATENCY_BUCKETS),
+    'receipt_items': ('histogram', 'Items parsed from each receipt', COUNT_BUCKETS),
+    'ocr_failures_total': ('counter', 'Images OCR returned no text for, by reason', None),
+    'empty_parses_total': ('counter', 'Receipts whose text yielded no items', None),
+    'jobs_total': ('counter', 'Finished upload jobs by outcome', None),
+    'archive_failures_total': ('counter', 'Uploads that could not be written to the archive', None),
+    'db_query_seconds': ('histogram', 'Time spent in each DatabaseManager method', LATENCY_BUCKETS),
+    'http_request_seconds': ('histogram', 'Time spent handling requests by endpoint', LATENCY_BUCKETS),
+}
+
+logger = logging.getLogger(__name__)
+timing_logger = logging.getLogger('timing')
+if TIMING_LOG and not timing_logger.handlers:
+    timing_logger.addHandler(logging.StreamHandler())
+    timing_logger.setLevel(logging.INFO)
+
+# Changes since this process's last flush
+_counters: Dict[Tuple[str, str], float] = {}
+# (name, labels) -> [count per bucket..., count above the last bucket, sum]
+_histograms: Dict[Tuple[str, str], List[float]] = {}
+_lock = threading.Lock()
+_last_flush = 0.0
+_tables_ready = set()
+_trace = threading.local()
+
+
+def _reset_after_fork():
+    # Forked pool workers would otherwise flush the parent's pending numbers again
+    global _counters, _histograms, _lock
+    _counters, _histograms, _lock = {}, {}, threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _labels(labels: Dict) -> str:
+    return ','.join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items()))
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+def inc(name: str, amount: float = 1, **labels):
+    """Add to a counter"""
+    if not ENABLED:
+        return
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def observe(name: str, value: float, **labels):
+    """Record one value in a histogram"""
+    if ENABLED:
+        _observe((name, _labels(labels)), value)
+
+def _observe(key: Tuple[str, str], value: float):
+    buckets = METRICS[key[0]][2]
+    with _lock:
+        counts = _histograms.get(key)
+        if counts is None:
+            counts = _histograms[key] = [0] * (len(buckets) + 2)
+        counts[bisect_left(buckets, value)] += 1
+        counts[-1] += value
+
+def _record_time(key: Tuple[str, str], trace_key: str, seconds: float):
+    _observe(key, seconds)
+    stages = getattr(_trace, 'stages', None)
+    if stages is not None:
+        stages[trace_key] = stages.get(trace_key, 0) + seconds
+
+@functools.lru_cache(maxsize=None)
+def _stage_key(stage: str) -> Tuple[str, str]:
+    return 'receipt_stage_seconds', _labels({'stage': stage})
+
+@contextmanager
+def timed(stage: str):
+    """Time a block as one stage of processing a receipt"""
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record_time(_stage_key(stage), stage, time.perf_counter() - start)
+
+def record_stage(stage: str, seconds: float):
+    """Record a stage of processing a receipt that was timed elsewhere"""
+    if ENABLED:
+        _record_time(_stage_key(stage), stage, seconds)
+
+def timed_methods(name: str, exclude: Iterable[str] = ()):
+    """Class decorator timing every public method (generators excepted) into a histogram by method"""
+    def decorate(cls):
+        if not ENABLED:
+            return cls
+        for attr, method in list(vars(cls).items()):
+            if attr.startswith('_') or attr in exclude or not inspect.isfunction(method) \
+                    or inspect.isgeneratorfunction(method):
+                continue
+            setattr(cls, attr, _timed_method(name, method))
+        return cls
+    return decorate
+
+def _timed_method(name: str, method):
+    key = (name, _labels({'method': method.__name__}))
+    trace_key = f'db.{method.__name__}'
+    
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _record_time(key, trace_key, time.perf_counter() - start)
+    return wrapper
+
+
+def start_trace():
+    """Start collecting stage timings for this thread's request or job (when TIMING_LOG is on)"""
+    if TIMING_LOG:
+        _trace.stages = {}
+        _trace.start = time.perf_counter()
+
+def finish_trace(event: str, **fields):
+    """Log the stage timings collected since start_trace() as one JSON line"""
+    stages = getattr(_trace, 'stages', None)
+    if stages is None:
+        return
+    _trace.stages = None
+    fields.update(event=event, ms=round((time.perf_counter() - _trace.start) * 1000, 2),
+                  stages={stage: round(seconds * 1000, 2) for stage, seconds in stages.items()})
+    timing_logger.info(json.dumps(fields))
+
+
+def _connection(db_path: str):
+    # Imported here: database imports this module to time its methods
+    from database import get_pool
+    
+    conn = get_pool(db_path).acquire()
+    if db_path not in _tables_ready:
+        try:
+            _init_table(conn)
+        except Exception:
+            conn.close()
+            raise
+        _tables_ready.add(db_path)
+    return conn
+
+def _init_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS metric_samples (
+            name TEXT NOT NULL,
+            labels TEXT NOT NULL,
+            value REAL NOT NULL,
+            PRIMARY KEY (name, labels)
+        ) WITHOUT ROWID
+    ''')
+
+def _samples(counters: Dict, histograms: Dict) -> List[Tuple[str, str, float]]:
+    """Expand counters and histograms into Prometheus samples (cumulative buckets)"""
+    samples = [(name, labels, value) for (name, labels), value in counters.items()]
+    for (name, labels), counts in histograms.items():
+        prefix = f'{labels},' if labels else ''
+        total = 0
+        for le, count in zip(METRICS[name][2] + ('+Inf',), counts):
+            total += count
+            samples.append((f'{name}_bucket', f'{prefix}le="{le}"', total))
+        samples.append((f'{name}_sum', labels, counts[-1]))
+        samples.append((f'{name}_count', labels, total))
+    return samples
+
+def flush(db_path: str):
+    """Add this process's changes since the last flush to the shared totals"""
+    global _counters, _histograms, _last_flush
+    if not ENABLED:
+        return
+    with _lock:
+        counters, histograms = _counters, _histograms
+        _counters, _histograms = {}, {}
+        _last_flush = time.monotonic()
+    if not counters and not histograms:
+        return
+    
+    # Metrics must never fail the work they measure: any error is logged and
+    # the changes are kept for the next flush rather than lost
+    conn = None
+    try:
+        conn = _connection(db_path)
+        conn.executemany('''
+            INSERT INTO metric_samples (name, labels, value) VALUES (?, ?, ?)
+            ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value
+        ''', _samples(counters, histograms))
+        conn.commit()
+    except Exception:
+        if conn is not None:
+            conn.rollback()
+        logger.exception('Error flushing metrics to %s', db_path)
+        with _lock:
+            for key, value in counters.items():
+                _counters[key] = _counters.get(key, 0) + value
+            for key, counts in histograms.items():
+                merged = _histograms.setdefault(key, [0] * len(counts))
+                _histograms[key] = [a + b for a, b in zip(merged, counts)]
+    finally:
+        if conn is not None:
+            conn.close()
+
+def maybe_flush(db_path: str):
+    """Flush if FLUSH_INTERVAL has passed since this process's last flush"""
+    if ENABLED and time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+        flush(db_path)
+
+def _sample_order(sample: Tuple[str, str, float]):
+    # Per label set: buckets in ascending le order (le is always the last label), then sum and count
+    name, labels, _ = sample
+    if name.endswith('_bucket'):
+        rest, _, le = labels.rpartition('le="')
+        return rest.rstrip(','), 0, float(le.rstrip('"'))
+    return labels, 2 if name.endswith('_count') else 1, 0
+
+def render(db_path: str) -> str:
+    """Every process's totals in the Prometheus text exposition format"""
+    flush(db_path)
+    
+    conn = _connection(db_path)
+    try:
+        rows = conn.execute('SELECT name, labels, value FROM metric_samples').fetchall()
+    finally:
+        conn.close()
+    
+    lines = []
+    for name, (kind, help_text, _) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        family = [row for row in rows if row[0] == name or row[0] in
+                  (f'{name}_bucket', f'{name}_sum', f'{name}_count')]
+        for sample_name, labels, value in sorted(family, key=_sample_order):
+            value = int(value) if float(value).is_integer() else value
+            lines.append(f'{sample_name}{{{labels}}} {value}' if labels else f'{sample_name} {value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,451 @@
+"""Versioned schema migrations for the receipts database.
+
+init_database() creates any missing tables and then applies the migrations
+below in order. The applied version is kept in SQLite's user_version, and
+each migration runs in its own transaction, so a database can be upgraded
+from any earlier version.
+
+Usage:
+    python -m migrations [--db receipts.db]            # upgrade and show the version
+    python -m migrations --explain                     # show query plans of the hot queries
+    python -m migrations --rebuild                     # recompute rollups, search index and price history
+"""
+import argparse
+import sqlite3
+import sys
+from typing import Dict, List
+
+import queries
+
+
+def _rebuild_table(cursor, name: str, create_sql: str, columns: str, select_sql: str):
+    # SQLite can't change a foreign key in place: copy into a new table and swap it in
+    cursor.execute(create_sql.format(table=f'{name}_new'))
+    cursor.execute(f'INSERT INTO {name}_new ({columns}) {select_sql}')
+    cursor.execute(f'DROP TABLE {name}')
+    cursor.execute(f'ALTER TABLE {name}_new RENAME TO {name}')
+
+def _on_delete(cursor, table: str) -> str:
+    cursor.execute(f'PRAGMA foreign_key_list({table})')
+    actions = [row[6] for row in cursor.fetchall() if row[2] == 'receipts']
+    return actions[0] if actions else ''
+
+def cascade_receipt_deletes(cursor):
+    """Deleting a receipt deletes its items and unlinks its jobs"""
+    if _on_delete(cursor, 'items') != 'CASCADE':
+        # Orphaned items can't be shown anywhere, so they are not carried over
+        _rebuild_table(cursor, 'items', '''
+            CREATE TABLE {table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                receipt_id INTEGER,
+                name TEXT NOT NULL,
+                category TEXT NOT NULL,
+                quantity INTEGER DEFAULT 1,
+                unit_price REAL,
+                total_price REAL,
+                raw_line TEXT,
+                FOREIGN KEY (receipt_id) REFERENCES receipts (id) ON DELETE CASCADE
+            )
+        ''', 'id, receipt_id, name, category, quantity, unit_price, total_price, raw_line', '''
+            SELECT id, receipt_id, name, category, quantity, unit_price, total_price, raw_line
+            FROM items WHERE receipt_id IN (SELECT id FROM receipts)
+        ''')
+    
+    if _on_delete(cursor, 'jobs') != 'SET NULL':
+        _rebuild_table(cursor, 'jobs', '''
+            CREATE TABLE {table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                filename TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                receipt_id INTEGER,
+                item_count INTEGER,
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP,
+                FOREIGN KEY (receipt_id) REFERENCES receipts (id) ON DELETE SET NULL
+            )
+        ''', 'id, filename, status, receipt_id, item_count, error, created_at, started_at, finished_at', '''
+            SELECT id, filename, status,
+                   CASE WHEN receipt_id IN (SELECT id FROM receipts) THEN receipt_id END,
+                   item_count, error, created_at, started_at, finished_at
+            FROM jobs
+        ''')
+
+def add_query_indexes(cursor):
+    """Indexes for item lookups by receipt, date filters, category and name grouping"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_items_receipt_id ON items (receipt_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_items_category ON items (category)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_items_lower_name ON items (LOWER(name), category)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_receipts_upload_date ON receipts (upload_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_category_keywords_version ON category_keywords (version)')
+
+# Adds a delta to a rollup row, creating the row on first use
+_DAILY_DELTA = '''
+    INSERT INTO spending_daily (day, total_amount, receipt_count) {select}
+    ON CONFLICT (day) DO UPDATE SET total_amount = total_amount + excluded.total_amount,
+                                    receipt_count = receipt_count + excluded.receipt_count;
+'''
+_CATEGORY_DELTA = '''
+    INSERT INTO spending_daily_category (day, category, total_spent, item_count) {select}
+    ON CONFLICT (day, category) DO UPDATE SET total_spent = total_spent + excluded.total_spent,
+                                              item_count = item_count + excluded.item_count;
+'''
+
+def _receipt_delta(row: str, sign: str) -> str:
+    return _DAILY_DELTA.format(select=f'''
+        SELECT DATE({row}.upload_date), {sign}COALESCE({row}.total_amount, 0), {sign}1
+        WHERE DATE({row}.upload_date) IS NOT NULL''')
+
+def _item_delta(row: str, sign: str) -> str:
+    # Only items whose receipt exists are counted, like the JOIN they replace
+    return _CATEGORY_DELTA.format(select=f'''
+        SELECT DATE(r.upload_date), {row}.category, {sign}COALESCE({row}.total_price, 0), {sign}1
+        FROM receipts r WHERE r.id = {row}.receipt_id AND DATE(r.upload_date) IS NOT NULL''')
+
+def _receipt_items_delta(row: str, sign: str) -> str:
+    return _CATEGORY_DELTA.format(select=f'''
+        SELECT DATE({row}.upload_date), category, {sign}SUM(COALESCE(total_price, 0)), {sign}COUNT(*)
+        FROM items WHERE receipt_id = {row}.id AND DATE({row}.upload_date) IS NOT NULL
+        GROUP BY category''')
+
+# New items are added by add_item_rollups() (via index_new_items) once per
+# batch instead of a per-row trigger, which halved bulk ingest throughput
+SPENDING_ROLLUP_TRIGGERS = {
+    'receipts_rollup_insert': f"AFTER INSERT ON receipts BEGIN {_receipt_delta('NEW', '')} END",
+    # BEFORE, so the receipt's items are still there; the cascaded item deletes
+    # then find no receipt and leave the rollup alone
+    'receipts_rollup_delete': f"""BEFORE DELETE ON receipts BEGIN
+        {_receipt_delta('OLD', '-')} {_receipt_items_delta('OLD', '-')} END""",
+    'receipts_rollup_update': f"""AFTER UPDATE OF upload_date, total_amount ON receipts BEGIN
+        {_receipt_delta('OLD', '-')} {_receipt_delta('NEW', '')} END""",
+    'receipts_rollup_move': f"""AFTER UPDATE OF upload_date ON receipts
+        WHEN DATE(OLD.upload_date) IS NOT DATE(NEW.upload_date) BEGIN
+        {_receipt_items_delta('OLD', '-')} {_receipt_items_delta('NEW', '')} END""",
+    'items_rollup_delete': f"AFTER DELETE ON items BEGIN {_item_delta('OLD', '-')} END",
+    'items_rollup_update': f"""AFTER UPDATE OF receipt_id, category, total_price ON items BEGIN
+        {_item_delta('OLD', '-')} {_item_delta('NEW', '')} END""",
+}
+
+def add_item_rollups(cursor, after_item_id: int):
+    """Add the items inserted after after_item_id to the category rollup (caller commits)"""
+    cursor.execute(_CATEGORY_DELTA.format(select='''
+        SELECT DATE(r.upload_date), i.category, SUM(COALESCE(i.total_price, 0)), COUNT(*)
+        FROM items i JOIN receipts r ON i.receipt_id = r.id
+        WHERE i.id > ? AND DATE(r.upload_date) IS NOT NULL
+        GROUP BY DATE(r.upload_date), i.category'''), (after_item_id,))
+
+def rebuild_spending_rollups(cursor):
+    """Recompute the spending rollups from the receipts and items tables"""
+    cursor.execute('DELETE FROM spending_daily')
+    cursor.execute('DELETE FROM spending_daily_category')
+    cursor.execute('''
+        INSERT INTO spending_daily (day, total_amount, receipt_count)
+        SELECT DATE(upload_date), SUM(COALESCE(total_amount, 0)), COUNT(*)
+        FROM receipts WHERE DATE(upload_date) IS NOT NULL
+        GROUP BY DATE(upload_date)
+    ''')
+    cursor.execute('''
+        INSERT INTO spending_daily_category (day, category, total_spent, item_count)
+        SELECT DATE(r.upload_date), i.category, SUM(COALESCE(i.total_price, 0)), COUNT(*)
+        FROM items i JOIN receipts r ON i.receipt_id = r.id
+        WHERE DATE(r.upload_date) IS NOT NULL
+        GROUP BY DATE(r.upload_date), i.category
+    ''')
+
+def add_spending_rollups(cursor):
+    """Per-day and per-(day, category) spending totals kept current by triggers"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS spending_daily (
+            day TEXT PRIMARY KEY,
+            total_amount REAL NOT NULL,
+            receipt_count INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS spending_daily_category (
+            day TEXT NOT NULL,
+            category TEXT NOT NULL,
+            total_spent REAL NOT NULL,
+            item_count INTEGER NOT NULL,
+            PRIMARY KEY (day, category)
+        ) WITHOUT ROWID
+    ''')
+    for name, body in SPENDING_ROLLUP_TRIGGERS.items():
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+    rebuild_spending_rollups(cursor)
+
+def add_data_version_timestamps(cursor):
+    """Remember when each data version was last bumped, for Last-Modified headers"""
+    cursor.execute('PRAGMA table_info(data_versions)')
+    if 'updated_at' not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute('ALTER TABLE data_versions ADD COLUMN updated_at TIMESTAMP')
+
+ITEM_SEARCH_TRIGGERS = {
+    'items_search_delete': 'AFTER DELETE ON items BEGIN DELETE FROM items_search WHERE rowid = OLD.id; END',
+    'items_search_update': '''AFTER UPDATE OF name, raw_line, receipt_id ON items BEGIN
+        UPDATE items_search SET name = NEW.name, raw_line = NEW.raw_line,
+               store_name = (SELECT store_name FROM receipts WHERE id = NEW.receipt_id)
+        WHERE rowid = NEW.id; END''',
+    'receipts_search_store': '''AFTER UPDATE OF store_name ON receipts BEGIN
+        UPDATE items_search SET store_name = NEW.store_name
+        WHERE rowid IN (SELECT id FROM items WHERE receipt_id = NEW.id); END''',
+}
+
+def add_item_search(cursor, after_item_id: int = 0):
+    """Add the items inserted after after_item_id to the search index (caller commits)"""
+    cursor.execute('''
+        INSERT INTO items_search (rowid, name, raw_line, store_name)
+        SELECT i.id, i.name, i.raw_line, r.store_name
+        FROM items i LEFT JOIN receipts r ON i.receipt_id = r.id
+        WHERE i.id > ?
+    ''', (after_item_id,))
+
+def rebuild_item_search(cursor):
+    """Recompute the search index from the items table"""
+    cursor.execute('DELETE FROM items_search')
+    add_item_search(cursor)
+
+def index_new_items(cursor, after_item_id: int):
+    """Add freshly inserted items to the spending rollups, the search index and the price history.
+    
+    Every INSERT into items must be bracketed by reading MAX(id) before it and
+    calling this after it (tests/test_derived_tables.py checks the save paths);
+    rebuild_derived_tables() repairs the tables if one ever was not.
+    """
+    add_item_rollups(cursor, after_item_id)
+    add_item_search(cursor, after_item_id)
+    add_price_observations(cursor, after_item_id)
+
+# The FTS5 trigram tokenizer first shipped with SQLite 3.34.0
+TRIGRAM_MIN_SQLITE = (3, 34, 0)
+
+def add_item_search_index(cursor):
+    """Trigram full-text index over item names, raw lines and store names"""
+    if sqlite3.sqlite_version_info < TRIGRAM_MIN_SQLITE:
+        raise RuntimeError(f"Item search needs SQLite {'.'.join(map(str, TRIGRAM_MIN_SQLITE))} or newer for "
+                           f"the FTS5 trigram tokenizer, but Python's sqlite3 uses {sqlite3.sqlite_version}")
+    # Trigrams match any substring of three or more characters, so partial and
+    # OCR-mangled words still hit; new items are added per batch like the rollups
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS items_search
+        USING fts5(name, raw_line, store_name, tokenize = 'trigram')
+    ''')
+    for name, body in ITEM_SEARCH_TRIGGERS.items():
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+    rebuild_item_search(cursor)
+
+
+# Items are grouped into products by case- and whitespace-insensitive name,
+# like get_top_items_by_frequency
+PRODUCT_KEY = 'LOWER(TRIM(i.name))'
+
+def _add_products(where: str) -> str:
+    # A new product takes the name and category of its most recent item
+    return f'''
+        INSERT INTO products (product_key, name, category)
+        SELECT product_key, name, category FROM (
+            SELECT {PRODUCT_KEY} AS product_key, TRIM(i.name) AS name, i.category, MAX(i.id)
+            FROM items i WHERE {where} AND {PRODUCT_KEY} != ''
+            GROUP BY 1
+        ) WHERE true
+        ON CONFLICT (product_key) DO NOTHING;
+    '''
+
+def _add_observations(where: str) -> str:
+    # The parsed unit price, else the line total over the quantity; lines
+    # without a usable price or receipt date are not observations
+    return f'''
+        INSERT INTO price_observations (product_id, day, item_id, receipt_id, quantity, unit_price)
+        SELECT p.id, DATE(r.upload_date), i.id, r.id, COALESCE(i.quantity, 1),
+               CASE WHEN i.unit_price > 0 THEN i.unit_price ELSE i.total_price * 1.0 / i.quantity END
+        FROM items i
+        JOIN receipts r ON r.id = i.receipt_id
+        JOIN products p ON p.product_key = {PRODUCT_KEY}
+        WHERE {where} AND DATE(r.upload_date) IS NOT NULL
+              AND (i.unit_price > 0 OR (i.quantity > 0 AND i.total_price > 0));
+    '''
+
+DELETE_ITEM_PRICES = 'DELETE FROM price_observations WHERE item_id = {item_id}'
+
+# New items are added by add_price_observations() (via index_new_items) once
+# per batch, so saves only append; corrections replace the item's observation
+PRICE_HISTORY_TRIGGERS = {
+    'items_prices_delete': f"AFTER DELETE ON items BEGIN {DELETE_ITEM_PRICES.format(item_id='OLD.id')}; END",
+    'items_prices_update': f"""AFTER UPDATE OF receipt_id, name, quantity, unit_price, total_price ON items BEGIN
+        {DELETE_ITEM_PRICES.format(item_id='OLD.id')};
+        {_add_products('i.id = NEW.id')} {_add_observations('i.id = NEW.id')} END""",
+    # The latest category given to any of a product's items becomes the product's
+    'items_products_category': f"""AFTER UPDATE OF category ON items BEGIN
+        UPDATE products SET category = NEW.category WHERE product_key = LOWER(TRIM(NEW.name)); END""",
+    'receipts_prices_move': f"""AFTER UPDATE OF upload_date ON receipts
+        WHEN DATE(OLD.upload_date) IS NOT DATE(NEW.upload_date) BEGIN
+        DELETE FROM price_observations WHERE item_id IN (SELECT id FROM items WHERE receipt_id = NEW.id);
+        {_add_observations('i.receipt_id = NEW.id')} END""",
+}
+
+def add_price_observations(cursor, after_item_id: int = 0):
+    """Add products and price observations for the items inserted after after_item_id (caller commits)"""
+    cursor.execute(_add_products('i.id > ?'), (after_item_id,))
+    cursor.execute(_add_observations('i.id > ?'), (after_item_id,))
+
+def rebuild_price_observations(cursor):
+    """Recompute the price observations (adding any missing products) from the items table"""
+    cursor.execute('DELETE FROM price_observations')
+    add_price_observations(cursor)
+
+def rebuild_derived_tables(cursor):
+    """Recompute every table index_new_items() maintains (caller commits)"""
+    rebuild_spending_rollups(cursor)
+    rebuild_item_search(cursor)
+    rebuild_price_observations(cursor)
+
+def add_price_history(cursor):
+    """Canonical products and an append-only price observation table clustered by (product, day)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_key TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            category TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # WITHOUT ROWID stores a product's observations together in date order, so
+    # a price history reads only that product's rows
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_observations (
+            product_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            item_id INTEGER NOT NULL,
+            receipt_id INTEGER NOT NULL,
+            quantity REAL NOT NULL,
+            unit_price REAL NOT NULL,
+            PRIMARY KEY (product_id, day, item_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_price_observations_item ON price_observations (item_id)')
+    for name, body in PRICE_HISTORY_TRIGGERS.items():
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+    rebuild_price_observations(cursor)
+
+def add_job_owners(cursor):
+    """Record which process owns each unfinished job, so restarts only recover orphans"""
+    cursor.execute('PRAGMA table_info(jobs)')
+    if 'owner_pid' not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute('ALTER TABLE jobs ADD COLUMN owner_pid INTEGER')
+
+# (version, migration) pairs; append new ones, never edit or reorder applied ones
+MIGRATIONS = [
+    (1, cascade_receipt_deletes),
+    (2, add_query_indexes),
+    (3, add_spending_rollups),
+    (4, add_data_version_timestamps),
+    (5, add_item_search_index),
+    (6, add_price_history),
+    (7, add_job_owners),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn: sqlite3.Connection) -> List[int]:
+    """Apply pending migrations, returning the versions applied by this call"""
+    applied = []
+    conn.commit()
+    # Table rebuilds would trip foreign key checks half-way; the pragma only
+    # takes effect outside a transaction
+    conn.execute('PRAGMA foreign_keys = OFF')
+    try:
+        for version, migration in MIGRATIONS:
+            if version <= get_schema_version(conn):
+                continue
+            # IMMEDIATE takes the write lock first, so concurrent starters apply each version once
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if version > get_schema_version(conn):
+                    cursor = conn.cursor()
+                    migration(cursor)
+                    cursor.execute(f'PRAGMA user_version = {int(version)}')
+                    applied.append(version)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    finally:
+        conn.execute('PRAGMA foreign_keys = ON')
+    return applied
+
+
+# Hot queries, with sample parameters, and the indexes each one must use.
+# The SQL is the text the application runs (queries.py, or the statements
+# index_new_items() and the triggers run), so a plan change shows up here.
+_CUTOFF = {'cutoff': '2024-01-01'}
+_PRICE_PARAMS = {'product_id': 1, 'cutoff': '2024-01-01T00:00:00', 'store': 'FRESH MART'}
+_PRICE_KEY = 'o USING PRIMARY KEY (product_id=? AND day>?)'
+HOT_QUERIES = {
+    'receipt_items': (queries.RECEIPT_ITEMS_SQL, (1,), ('idx_items_receipt_id',)),
+    # What ON DELETE CASCADE runs for each deleted receipt
+    'delete_receipt_items': ('DELETE FROM items WHERE receipt_id = ?', (1,), ('idx_items_receipt_id',)),
+    'receipts_page': (queries.RECEIPTS_PAGE_SQL, (50,), ('idx_receipts_upload_date',)),
+    'receipts_page_after': (queries.RECEIPTS_PAGE_AFTER_SQL, ('2024-01-01', 1, 50), ('idx_receipts_upload_date',)),
+    'receipts_since': (queries.RECEIPTS_SINCE_SQL, ('2024-01-01',), ('idx_receipts_upload_date',)),
+    'receipts_between': (queries.RECEIPTS_BETWEEN_SQL, ('2024-01-01', '2024-02-01'), ('idx_receipts_upload_date',)),
+    'spending_by_category': (queries.SPENDING_BY_CATEGORY_SQL, _CUTOFF,
+                             ('s USING PRIMARY KEY (day>?)',)),
+    'spending_over_time': (queries.SPENDING_OVER_TIME_SQL, _CUTOFF,
+                           ('spending_daily USING PRIMARY KEY',)),
+    'top_items': (queries.TOP_ITEMS_SQL, (10,), ('idx_items_lower_name',)),
+    'price_history': (queries.PRICE_HISTORY_SQL.format(where=queries.PRICE_FILTER), _PRICE_PARAMS, (_PRICE_KEY,)),
+    'price_history_store': (queries.PRICE_HISTORY_SQL.format(where=queries.PRICE_FILTER + queries.PRICE_STORE_FILTER),
+                            _PRICE_PARAMS, (_PRICE_KEY,)),
+    'price_inflation': (queries.PRICE_INFLATION_SQL.format(where=queries.PRICE_FILTER), _PRICE_PARAMS,
+                        (_PRICE_KEY,)),
+    'new_price_observations': (_add_observations('i.id > ?'), (0,), ('sqlite_autoindex_products_1',)),
+    'delete_item_prices': (DELETE_ITEM_PRICES.format(item_id='?'), (1,), ('idx_price_observations_item',)),
+    'unfinished_jobs': (queries.UNFINISHED_JOBS_SQL, (), ('idx_jobs_status',)),
+}
+
+def explain_hot_queries(conn: sqlite3.Connection) -> Dict[str, Dict]:
+    """Run EXPLAIN QUERY PLAN on the hot queries and report whether each uses its indexes"""
+    report = {}
+    for name, (sql, params, indexes) in HOT_QUERIES.items():
+        plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()]
+        missing = [index for index in indexes if not any(index in step for step in plan)]
+        report[name] = {'indexes': list(indexes), 'uses_index': not missing, 'missing': missing, 'plan': plan}
+    return report
+
+
+def main(argv=None) -> int:
+    from database import DatabaseManager
+    
+    parser = argparse.ArgumentParser(description='Upgrade the receipts database schema')
+    parser.add_argument('--db', default='receipts.db', help='SQLite database path')
+    parser.add_argument('--explain', action='store_true', help='check the hot queries use their indexes')
+    parser.add_argument('--rebuild', '--rebuild-rollups', dest='rebuild', action='store_true',
+                        help='recompute the spending rollups, search index and price observations')
+    args = parser.parse_args(argv)
+    
+    db_manager = DatabaseManager(args.db)
+    db_manager.init_database()
+    if args.rebuild:
+        db_manager.rebuild_derived_tables()
+        print('Rebuilt spending rollups, search index and price observations')
+    
+    conn = db_manager.get_connection()
+    print(f'Schema version {get_schema_version(conn)} (latest {LATEST_VERSION})')
+    ok = True
+    if args.explain:
+        for name, result in explain_hot_queries(conn).items():
+            ok = ok and result['uses_index']
+            print(f"{'OK  ' if result['uses_index'] else 'SCAN'} {name}: {' / '.join(result['plan'])}")
+    conn.close()
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+import hashlib
+import time
+from typing import Dict, Optional
+
+from database import get_pool
+
+
+class OCRCache:
+    """Content-addressed cache of OCR text, stored in SQLite with LRU eviction.
+    
+    Entries are keyed by a SHA-256 of the image bytes plus the OCR signature
+    (preprocessing steps and Tesseract config), and remember the receipt that
+    was created from the image so exact duplicate uploads can be linked to it.
+    Hit/miss counters live in the database so every worker process shares them.
+    """
+    
+    def __init__(self, db_path: str = 'receipts.db', max_entries: int = 5000, signature: str = ''):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.signature = signature
+        self.init_cache()
+    
+    def get_connection(self):
+        """Get database connection (pooled, like DatabaseManager's)"""
+        return get_pool(self.db_path).acquire()
+    
+    def init_cache(self):
+        """Create the cache tables if needed"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ocr_cache (
+                image_key TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                receipt_id INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_used REAL NOT NULL
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_ocr_cache_last_used ON ocr_cache (last_used)
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ocr_cache_stats (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        
+        cursor.executemany('''
+            INSERT OR IGNORE INTO ocr_cache_stats (name, value) VALUES (?, 0)
+        ''', [('hits',), ('misses',), ('evictions',)])
+        
+        conn.commit()
+        conn.close()
+    
+    def image_key(self, image_bytes: bytes) -> str:
+        """Hash image bytes together with the OCR signature"""
+        digest = hashlib.sha256(image_bytes)
+        digest.update(b'\0' + self.signature.encode('utf-8'))
+        return digest.hexdigest()
+    
+    def key_for_file(self, filepath: str) -> str:
+        """Hash an image file on disk"""
+        with open(filepath, 'rb') as f:
+            return self.image_key(f.read())
+    
+    def get(self, image_key: str) -> Optional[Dict]:
+        """Look up cached OCR text, counting the hit or miss and refreshing LRU order"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT text, receipt_id FROM ocr_cache WHERE image_key = ?
+        ''', (image_key,))
+        row = cursor.fetchone()
+        
+        if row:
+            cursor.execute('''
+                UPDATE ocr_cache SET last_used = ? WHERE image_key = ?
+            ''', (time.time(), image_key))
+        self._bump(cursor, 'hits' if row else 'misses')
+        
+        conn.commit()
+        conn.close()
+        
+        if not row:
+            return None
+        
+        return {'text': row[0], 'receipt_id': row[1]}
+    
+    def put(self, image_key: str, text: str):
+        """Store OCR text for an image and evict the least recently used entries"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            INSERT INTO ocr_cache (image_key, text, last_used) VALUES (?, ?, ?)
+            ON CONFLICT (image_key) DO UPDATE SET text = excluded.text, last_used = excluded.last_used
+        ''', (image_key, text, time.time()))
+        
+        cursor.execute('SELECT COUNT(*) FROM ocr_cache')
+        overflow = cursor.fetchone()[0] - self.max_entries
+        if overflow > 0:
+            cursor.execute('''
+                DELETE FROM ocr_cache WHERE image_key IN (
+                    SELECT image_key FROM ocr_cache ORDER BY last_used LIMIT ?
+                )
+            ''', (overflow,))
+            self._bump(cursor, 'evictions', cursor.rowcount)
+        
+        conn.commit()
+        conn.close()
+    
+    def link_receipt(self, image_key: str, receipt_id: int):
+        """Remember which receipt was created from an image"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            UPDATE ocr_cache SET receipt_id = ? WHERE image_key = ?
+        ''', (receipt_id, image_key))
+        
+        conn.commit()
+        conn.close()
+    
+    def get_stats(self) -> Dict:
+        """Get entry count and hit/miss counters"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT name, value FROM ocr_cache_stats')
+        stats = {name: value for name, value in cursor.fetchall()}
+        
+        cursor.execute('SELECT COUNT(*) FROM ocr_cache')
+        stats['entries'] = cursor.fetchone()[0]
+        stats['max_entries'] = self.max_entries
+        
+        lookups = stats.get('hits', 0) + stats.get('misses', 0)
+        stats['hit_rate'] = round(stats.get('hits', 0) / lookups, 3) if lookups else 0.0
+        
+        conn.close()
+        return stats
+    
+    def clear(self):
+        """Remove all cached entries and reset the counters"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('DELETE FROM ocr_cache')
+        cursor.execute('UPDATE ocr_cache_stats SET value = 0')
+        
+        conn.commit()
+        conn.close()
+    
+    def _bump(self, cursor, name: str, amount: int = 1):
+        cursor.execute('''
+            UPDATE ocr_cache_stats SET value = value + ? WHERE name = ?
+        ''', (amount, name))
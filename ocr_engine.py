@@ -0,0 +1,183 @@
+import abc
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pytesseract
+from PIL import Image
+
+try:
+    import tesserocr
+except ImportError:  # optional: falls back to pytesseract
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+# Tesseract options; part of the OCR cache key via ocr_processor.ocr_signature()
+OCR_CONFIG = '--psm 6'
+
+# OCR_WORKERS pool processes share the machine, so each one defaults to its
+# share of the CPUs for engine handles and band threads, not one per CPU
+_cpus = os.cpu_count() or 1
+OCR_THREADS = max(1, _cpus // max(1, int(os.environ.get('OCR_WORKERS', _cpus))))
+
+
+class OCREngine(abc.ABC):
+    """Turns a preprocessed image (NumPy array) into text"""
+    name = 'base'
+    
+    @abc.abstractmethod
+    def image_to_string(self, image: np.ndarray) -> str:
+        """OCR one image"""
+    
+    def close(self):
+        pass
+
+
+class PytesseractEngine(OCREngine):
+    """Runs the tesseract CLI once per image (spawns a process each call)"""
+    name = 'pytesseract'
+    
+    def __init__(self, config: str = OCR_CONFIG):
+        self.config = config
+    
+    def image_to_string(self, image: np.ndarray) -> str:
+        return pytesseract.image_to_string(image, config=self.config)
+
+
+class TesserocrEngine(OCREngine):
+    """Keeps libtesseract API handles loaded and reuses them across images.
+    
+    Handles are not thread-safe, so each call checks one out of a pool. Handles
+    are created on demand up to pool_size, so a single-threaded worker only ever
+    loads one while segmented OCR can run one per thread.
+    """
+    name = 'tesserocr'
+    
+    def __init__(self, pool_size: int = 1, lang: str = 'eng'):
+        if tesserocr is None:
+            raise RuntimeError('tesserocr is not installed')
+        self.pool_size = max(1, pool_size)
+        self.lang = lang
+        self._handles = queue.Queue()
+        self._all_handles = []
+        self._create_lock = threading.Lock()
+        # Load one handle up front so configuration errors surface immediately
+        self._handles.put(self._new_handle())
+    
+    def _new_handle(self):
+        api = tesserocr.PyTessBaseAPI(lang=self.lang, psm=tesserocr.PSM.SINGLE_BLOCK)
+        self._all_handles.append(api)
+        return api
+    
+    def _checkout(self):
+        try:
+            return self._handles.get_nowait()
+        except queue.Empty:
+            pass
+        with self._create_lock:
+            if len(self._all_handles) < self.pool_size:
+                return self._new_handle()
+        return self._handles.get()
+    
+    def image_to_string(self, image: np.ndarray) -> str:
+        api = self._checkout()
+        try:
+            # Hand the array over in memory; no temp files involved
+            api.SetImage(Image.fromarray(image))
+            return api.GetUTF8Text()
+        finally:
+            api.Clear()
+            self._handles.put(api)
+    
+    def close(self):
+        for api in self._all_handles:
+            api.End()
+        self._all_handles = []
+
+
+_engine = None
+_engine_pid = None
+_engine_lock = threading.Lock()
+
+def create_engine(name: str = 'auto', pool_size: int = 1) -> OCREngine:
+    """Build an OCR engine by name ('auto', 'tesserocr' or 'pytesseract')"""
+    if name in ('auto', 'tesserocr') and tesserocr is not None:
+        try:
+            return TesserocrEngine(pool_size=pool_size)
+        except Exception as e:
+            if name == 'tesserocr':
+                raise
+            logger.warning('Could not start tesserocr, falling back to pytesseract: %s', e)
+    elif name == 'tesserocr':
+        raise RuntimeError('tesserocr is not installed')
+    return PytesseractEngine()
+
+def get_engine() -> OCREngine:
+    """Get this process's long-lived OCR engine (configured with OCR_ENGINE / OCR_ENGINE_POOL).
+    
+    OCR_ENGINE_POOL caps the libtesseract handles per process; it defaults to
+    OCR_THREADS, this process's share of the CPUs, matching the band threads.
+    """
+    global _engine, _engine_pid
+    with _engine_lock:
+        # A forked pool worker must not reuse handles inherited from its parent
+        if _engine is None or _engine_pid != os.getpid():
+            _engine = create_engine(os.environ.get('OCR_ENGINE', 'auto'),
+                                    int(os.environ.get('OCR_ENGINE_POOL', OCR_THREADS)))
+            _engine_pid = os.getpid()
+        return _engine
+
+def engine_name() -> str:
+    """Name of the backend get_engine() uses, without loading an engine in this process"""
+    if _engine is not None and _engine_pid == os.getpid():
+        return _engine.name
+    name = os.environ.get('OCR_ENGINE', 'auto')
+    return 'tesserocr' if name in ('auto', 'tesserocr') and tesserocr is not None else 'pytesseract'
+
+def benchmark_engines(image_paths: List[str], engine_names: Optional[List[str]] = None,
+                      repeat: int = 3) -> Dict[str, Dict]:
+    """Time each engine on the same preprocessed images"""
+    from ocr_processor import preprocess_image
+    
+    images = [preprocess_image(path) for path in image_paths]
+    results = {}
+    for name in engine_names or ['pytesseract', 'tesserocr']:
+        try:
+            engine = create_engine(name)
+        except RuntimeError as e:
+            results[name] = {'error': str(e)}
+            continue
+        
+        timings = []
+        for _ in range(repeat):
+            for image in images:
+                start = time.perf_counter()
+                engine.image_to_string(image)
+                timings.append(time.perf_counter() - start)
+        engine.close()
+        
+        timings.sort()
+        results[name] = {
+            'images': len(timings),
+            'mean_ms': round(1000 * sum(timings) / len(timings), 1),
+            'p50_ms': round(1000 * timings[len(timings) // 2], 1),
+            'max_ms': round(1000 * timings[-1], 1)
+        }
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    
+    parser = argparse.ArgumentParser(description='Benchmark OCR engines on receipt images')
+    parser.add_argument('images', nargs='+', help='receipt image files')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    
+    print(json.dumps(benchmark_engines(args.images, repeat=args.repeat), indent=2))
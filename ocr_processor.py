@@ -0,0 +1,152 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import metrics
+from image_pipeline import get_pipeline
+from ocr_engine import OCR_CONFIG, OCR_THREADS, engine_name, get_engine
+
+logger = logging.getLogger(__name__)
+
+# Segmented OCR splits long receipts into horizontal bands and OCRs them in
+# parallel. 'auto' only segments receipts with at least SEGMENT_MIN_LINES lines,
+# and only when this process has more than one thread to spare.
+SEGMENT_MODE = os.environ.get('OCR_SEGMENTED', 'auto')
+SEGMENT_MIN_LINES = int(os.environ.get('OCR_SEGMENT_MIN_LINES', 40))
+SEGMENT_WORKERS = int(os.environ.get('OCR_SEGMENT_WORKERS', OCR_THREADS))
+
+_segment_executor = None
+_segment_executor_pid = None
+_segment_lock = threading.Lock()
+
+
+def decode_image(image_bytes):
+    """Decode encoded image bytes (PNG, JPEG, ...) straight into a BGR array"""
+    return cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+
+def preprocess_array(image):
+    """Preprocess a decoded image for better OCR results"""
+    # Stages come from OCR_PREPROCESS (see image_pipeline.PRESETS)
+    processed, timings = get_pipeline().run(image)
+    for name, ms in timings.items():
+        metrics.record_stage(f'preprocess.{name}', ms / 1000)
+    
+    return processed
+
+def preprocess_image(image_path):
+    """Preprocess image for better OCR results"""
+    return preprocess_array(cv2.imread(image_path))
+
+def find_text_bands(binary_image, min_ink=2, max_gap=2, min_height=4):
+    """Find the (top, bottom) rows of each horizontal text line in a thresholded image"""
+    # Text is dark on a light background after thresholding
+    ink_per_row = np.count_nonzero(binary_image < 128, axis=1)
+    text_rows = ink_per_row >= max(min_ink, binary_image.shape[1] // 500)
+    
+    bands = []
+    start = None
+    gap = 0
+    for row, has_ink in enumerate(text_rows):
+        if has_ink:
+            if start is None:
+                start = row
+            gap = 0
+        elif start is not None:
+            gap += 1
+            # Tolerate tiny gaps so broken glyphs don't split a line
+            if gap > max_gap:
+                end = row - gap + 1
+                if end - start >= min_height:
+                    bands.append((start, end))
+                start = None
+                gap = 0
+    if start is not None and len(text_rows) - start >= min_height:
+        bands.append((start, len(text_rows)))
+    
+    return bands
+
+def group_bands(bands, height, groups, padding=4):
+    """Merge consecutive line bands into about `groups` segments, cut only between lines"""
+    groups = max(1, min(groups, len(bands)))
+    per_group = -(-len(bands) // groups)
+    segments = []
+    for i in range(0, len(bands), per_group):
+        chunk = bands[i:i + per_group]
+        segments.append((max(0, chunk[0][0] - padding), min(height, chunk[-1][1] + padding)))
+    return segments
+
+def _get_segment_executor():
+    """Thread pool for band OCR (engines release the GIL while recognizing)"""
+    global _segment_executor, _segment_executor_pid
+    with _segment_lock:
+        if _segment_executor is None or _segment_executor_pid != os.getpid():
+            _segment_executor = ThreadPoolExecutor(max_workers=SEGMENT_WORKERS)
+            _segment_executor_pid = os.getpid()
+        return _segment_executor
+
+def ocr_segmented(processed_image, bands=None):
+    """OCR a thresholded image band by band in parallel, reassembling lines in order"""
+    if bands is None:
+        bands = find_text_bands(processed_image)
+    if not bands:
+        return get_engine().image_to_string(processed_image)
+    
+    segments = group_bands(bands, processed_image.shape[0], SEGMENT_WORKERS)
+    engine = get_engine()
+    texts = _get_segment_executor().map(
+        lambda segment: engine.image_to_string(processed_image[segment[0]:segment[1]]),
+        segments
+    )
+    return '\n'.join(text.strip('\n') for text in texts)
+
+def extract_text_from_array(image, segmented=None):
+    """Extract text from a decoded image using OCR.
+    
+    segmented overrides OCR_SEGMENTED: True/'on' always splits into bands,
+    False/'off' never does, 'auto' splits long receipts only.
+    """
+    try:
+        if image is None:
+            raise ValueError('image could not be decoded')
+        
+        # Preprocess the image
+        with metrics.timed('preprocess'):
+            processed_image = preprocess_array(image)
+        
+        mode = SEGMENT_MODE if segmented is None else segmented
+        with metrics.timed('ocr'):
+            if mode is True or mode == 'on':
+                text = ocr_segmented(processed_image)
+            elif mode == 'auto' and SEGMENT_WORKERS > 1:
+                bands = find_text_bands(processed_image)
+                if len(bands) >= SEGMENT_MIN_LINES:
+                    text = ocr_segmented(processed_image, bands)
+                else:
+                    text = get_engine().image_to_string(processed_image)
+            else:
+                # Hand the array to this process's long-lived OCR engine
+                text = get_engine().image_to_string(processed_image)
+        text = text.strip()
+        if not text:
+            metrics.inc('ocr_failures_total', reason='no_text')
+        return text
+    except Exception:
+        metrics.inc('ocr_failures_total', reason='error')
+        logger.exception('Error extracting text')
+        return ""
+
+def extract_text_from_bytes(image_bytes):
+    """Extract text from an encoded image held in memory"""
+    with metrics.timed('decode'):
+        image = decode_image(image_bytes)
+    return extract_text_from_array(image)
+
+def extract_text_from_image(image_path):
+    """Extract text from image using OCR"""
+    return extract_text_from_array(cv2.imread(image_path))
+
+def ocr_signature():
+    """Identify the current preprocessing + OCR configuration (without loading an OCR engine)"""
+    return f'{get_pipeline().signature}|{engine_name()}|{OCR_CONFIG}|segment={SEGMENT_MODE}'
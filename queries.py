@@ -0,0 +1,101 @@
+"""SQL statements DatabaseManager runs on its hot paths.
+
+They live apart from database.py so that migrations.HOT_QUERIES (and the
+query plan tests) check exactly the statements the application executes.
+Statements with a {where} placeholder are completed with one of the filters
+defined next to them.
+"""
+
+# Insert statements shared by the save methods; keeping the text identical lets
+# sqlite3's statement cache reuse one prepared statement per connection
+RECEIPT_INSERT_SQL = '''
+    INSERT INTO receipts (filename, raw_text, store_name, total_amount, item_count)
+    VALUES (?, ?, ?, ?, ?)
+'''
+ITEM_INSERT_SQL = '''
+    INSERT INTO items (receipt_id, name, category, quantity, unit_price, total_price, raw_line)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+RECEIPT_ITEMS_SQL = '''
+    SELECT id, name, category, quantity, unit_price, total_price, raw_line
+    FROM items WHERE receipt_id = ?
+    ORDER BY name
+'''
+
+# Keyset pages of receipts, newest first; the second starts below (upload_date, id)
+RECEIPTS_PAGE_SQL = '''
+    SELECT id, filename, upload_date, store_name, total_amount, item_count
+    FROM receipts
+    ORDER BY upload_date DESC, id DESC
+    LIMIT ?
+'''
+RECEIPTS_PAGE_AFTER_SQL = '''
+    SELECT id, filename, upload_date, store_name, total_amount, item_count
+    FROM receipts
+    WHERE (upload_date, id) < (?, ?)
+    ORDER BY upload_date DESC, id DESC
+    LIMIT ?
+'''
+
+RECEIPTS_SINCE_SQL = '''
+    SELECT COUNT(id) as receipt_count, SUM(total_amount) as total_spent
+    FROM receipts
+    WHERE upload_date >= ?
+'''
+RECEIPTS_BETWEEN_SQL = '''
+    SELECT COUNT(id) as receipt_count, SUM(total_amount) as total_spent
+    FROM receipts
+    WHERE upload_date >= ? AND upload_date < ?
+'''
+
+# Windows are whole days, from midnight N days ago, so they read only the
+# rollups and stay the same all day (the analytics cache is keyed by day)
+SPENDING_BY_CATEGORY_SQL = '''
+    SELECT s.category, SUM(s.total_spent) as total_spent, SUM(s.item_count) as item_count,
+           c.color
+    FROM spending_daily_category s
+    LEFT JOIN categories c ON s.category = c.name
+    WHERE s.day >= :cutoff AND s.item_count > 0
+    GROUP BY s.category
+    ORDER BY total_spent DESC
+'''
+SPENDING_OVER_TIME_SQL = '''
+    SELECT day as date, SUM(total_amount) as daily_total
+    FROM spending_daily
+    WHERE day >= :cutoff AND receipt_count > 0
+    GROUP BY day
+    ORDER BY date
+'''
+
+TOP_ITEMS_SQL = '''
+    SELECT name, category, COUNT(*) as frequency, AVG(total_price) as avg_price
+    FROM items
+    GROUP BY LOWER(name), category
+    ORDER BY frequency DESC
+    LIMIT ?
+'''
+
+# Leads with the (product_id, day) key, so only this product's rows are read
+PRICE_FILTER = 'o.product_id = :product_id AND o.day >= DATE(:cutoff)'
+PRICE_STORE_FILTER = ' AND r.store_name = :store COLLATE NOCASE'
+PRICE_HISTORY_SQL = '''
+    SELECT o.day, r.store_name, o.quantity, o.unit_price, o.receipt_id
+    FROM price_observations o
+    JOIN receipts r ON o.receipt_id = r.id
+    WHERE {where}
+    ORDER BY o.day, o.item_id
+'''
+PRICE_INFLATION_SQL = '''
+    SELECT strftime('%Y-%m', o.day) as month, AVG(o.unit_price), MIN(o.unit_price), MAX(o.unit_price),
+           COUNT(*)
+    FROM price_observations o
+    JOIN receipts r ON o.receipt_id = r.id
+    WHERE {where}
+    GROUP BY month
+    ORDER BY month
+'''
+
+UNFINISHED_JOBS_SQL = '''
+    SELECT id, owner_pid FROM jobs WHERE status IN ('queued', 'running') ORDER BY id
+'''
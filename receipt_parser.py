@@ -1,7 +1,26 @@
 import re
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple, Union
 import numpy as np
 
+# Lines that are just numbers, start with a date/time, or have no alphanumerics
+SKIP_LINE_RE = re.compile(r'\d+$|\d{1,2}[:/]\d{1,2}|[^a-zA-Z0-9]*$')
+
+# Item name cleanup
+WHITESPACE_RE = re.compile(r'\s+')
+NAME_JUNK_RE = re.compile(r'[^\w\s\-&]')
+NAME_AFFIX_RE = re.compile(r'^(?:item|product)\s*:?\s*|\s*(?:each|ea|pc|pcs)$', re.IGNORECASE)
+
+# Item names that look like totals or taxes
+TOTAL_WORDS_RE = re.compile(r'total|tax|subtotal|balance')
+
+# Store info
+STARTS_WITH_DIGIT_RE = re.compile(r'\d')
+PHONE_RE = re.compile(r'(\(?[\d\-\.\s]{10,}\)?)')
+DATE_RES = [
+    re.compile(r'(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})'),
+    re.compile(r'(\d{2,4}[\/\-]\d{1,2}[\/\-]\d{1,2})'),
+]
+
 class ReceiptParser:
     def __init__(self):
         # Common patterns for prices
@@ -33,48 +52,94 @@ class ReceiptParser:
             'grocery', 'produce', 'dairy', 'meat', 'bakery', 'frozen',
             'beverages', 'health', 'beauty', 'household', 'pharmacy'
         }
+        
+        self._compiled_key = None
+        self._compile_patterns()
+    
+    def _compile_patterns(self):
+        """Precompile the pattern lists above (again if they have been modified)"""
+        key = (tuple(self.price_patterns), tuple(self.quantity_patterns),
+               frozenset(self.ignore_words), frozenset(self.section_headers))
+        if key == self._compiled_key:
+            return
+        
+        self._price_res = [re.compile(pattern) for pattern in self.price_patterns]
+        self._quantity_res = [re.compile(pattern) for pattern in self.quantity_patterns]
+        
+        # One alternation replaces a substring check per ignore word
+        if self.ignore_words:
+            words = sorted(self.ignore_words, key=len, reverse=True)
+            self._ignore_words_re = re.compile('|'.join(re.escape(word) for word in words))
+        else:
+            self._ignore_words_re = re.compile(r'(?!)')
+        self._section_headers = frozenset(self.section_headers)
+        
+        self._compiled_key = key
 
     def parse_receipt(self, text: str) -> List[Dict]:
         """Parse receipt text and extract items with quantities and prices"""
-        lines = [line.strip() for line in text.split('\n') if line.strip()]
-        items = []
+        return list(self.iter_items(text))
+    
+    def iter_items(self, source: Union[str, Iterable[str]],
+                   store_info: Optional[Dict] = None) -> Iterator[Dict]:
+        """Yield validated items one at a time from receipt text or an iterable of lines.
+        
+        Lines are read lazily, so memory stays flat for huge inputs such as an
+        open file. Pass a store_info dict (see extract_store_info) to have it
+        filled in during the same scan.
+        """
+        self._compile_patterns()
         
-        for i, line in enumerate(lines):
+        for index, raw_line in enumerate(self._iter_lines(source)):
+            if store_info is not None:
+                self._update_store_info(store_info, index, raw_line)
+            
             # Skip empty lines and common headers
+            line = raw_line.strip()
             if not line or self._should_ignore_line(line):
                 continue
             
             # Try to extract item information from this line
             item = self._parse_line(line)
-            if item:
-                items.append(item)
-        
-        # Post-process to clean up and validate items
-        return self._clean_and_validate_items(items)
+            if item and self._is_valid_item(item):
+                yield item
+    
+    def parse_with_store_info(self, source: Union[str, Iterable[str]]) -> Tuple[Dict, List[Dict]]:
+        """Extract store info and items in a single scan over the lines"""
+        store_info = self._empty_store_info()
+        items = list(self.iter_items(source, store_info))
+        return store_info, items
+    
+    @staticmethod
+    def _iter_lines(source: Union[str, Iterable[str]]) -> Iterator[str]:
+        """Yield lines split on '\\n' without copying the whole text into a list"""
+        if isinstance(source, str):
+            start = 0
+            while True:
+                end = source.find('\n', start)
+                if end == -1:
+                    yield source[start:]
+                    return
+                yield source[start:end]
+                start = end + 1
+        else:
+            for line in source:
+                yield line[:-1] if line.endswith('\n') else line
 
     def _should_ignore_line(self, line: str) -> bool:
         """Check if a line should be ignored"""
-        line_lower = line.lower()
-        
-        # Ignore lines that are just numbers, dates, or times
-        if re.match(r'^\d+$', line) or re.match(r'^\d{1,2}[:/]\d{1,2}', line):
+        # Ignore lines that are just numbers, dates, or times, or only special characters
+        if SKIP_LINE_RE.match(line):
             return True
         
-        # Ignore lines with only special characters
-        if re.match(r'^[^a-zA-Z0-9]*$', line):
-            return True
+        line_lower = line.lower()
         
         # Ignore common receipt headers/footers
-        for word in self.ignore_words:
-            if word in line_lower:
-                return True
+        if self._ignore_words_re.search(line_lower):
+            return True
         
         # Ignore section headers
-        for header in self.section_headers:
-            if line_lower == header:
-                return True
-        
-        return False
+        return line_lower in self._section_headers
 
     def _parse_line(self, line: str) -> Optional[Dict]:
         """Parse a single line to extract item information"""
@@ -112,8 +177,9 @@ class ReceiptParser:
 
     def _find_price(self, line: str):
         """Find price pattern in line"""
-        for pattern in self.price_patterns:
-            match = re.search(pattern, line)
+        # Patterns are tried in priority order, so the first valid one wins
+        for pattern in self._price_res:
+            match = pattern.search(line)
             if match:
                 # Validate that this looks like a reasonable price
                 try:
@@ -126,8 +192,9 @@ class ReceiptParser:
 
     def _find_quantity(self, line: str):
         """Find quantity pattern in line"""
-        for pattern in self.quantity_patterns:
-            match = re.search(pattern, line.lower())
+        line_lower = line.lower()
+        for pattern in self._quantity_res:
+            match = pattern.search(line_lower)
             if match:
                 try:
                     qty = int(match.group(1))
@@ -140,77 +207,68 @@ class ReceiptParser:
     def _clean_item_name(self, name: str) -> str:
         """Clean and normalize item name"""
         # Remove extra whitespace and special characters
-        name = re.sub(r'\s+', ' ', name.strip())
-        name = re.sub(r'[^\w\s\-&]', '', name)
+        name = WHITESPACE_RE.sub(' ', name.strip())
+        name = NAME_JUNK_RE.sub('', name)
         
         # Remove common prefixes/suffixes
-        name = re.sub(r'^(item|product)\s*:?\s*', '', name, flags=re.IGNORECASE)
-        name = re.sub(r'\s*(each|ea|pc|pcs)$', '', name, flags=re.IGNORECASE)
+        name = NAME_AFFIX_RE.sub('', name)
         
         # Title case for better readability
         name = name.title()
         
         return name.strip()
 
-    def _clean_and_validate_items(self, items: List[Dict]) -> List[Dict]:
-        """Clean up and validate the extracted items"""
-        valid_items = []
+    def _is_valid_item(self, item: Dict) -> bool:
+        """Check that a parsed item has reasonable values"""
+        # Skip items with unreasonable values
+        if item['price'] <= 0 or item['price'] > 999.99:
+            return False
         
-        for item in items:
-            # Skip items with unreasonable values
-            if item['price'] <= 0 or item['price'] > 999.99:
-                continue
-            
-            if item['quantity'] <= 0 or item['quantity'] > 99:
-                continue
-            
-            if len(item['name']) < 2:
-                continue
-            
-            # Skip items that look like totals or taxes
-            name_lower = item['name'].lower()
-            if any(word in name_lower for word in ['total', 'tax', 'subtotal', 'balance']):
-                continue
-            
-            valid_items.append(item)
+        if item['quantity'] <= 0 or item['quantity'] > 99:
+            return False
         
-        return valid_items
-
+        if len(item['name']) < 2:
+            return False
+        
+        # Skip items that look like totals or taxes
+        if TOTAL_WORDS_RE.search(item['name'].lower()):
+            return False
+        
+        return True
+    
     def extract_store_info(self, text: str) -> Dict:
         """Extract store information from receipt text"""
-        lines = text.split('\n')
-        store_info = {'name': '', 'address': '', 'phone': '', 'date': ''}
+        store_info = self._empty_store_info()
         
+        for index, line in enumerate(self._iter_lines(text)):
+            self._update_store_info(store_info, index, line)
+        
+        return store_info
+    
+    def _empty_store_info(self) -> Dict:
+        return {'name': '', 'address': '', 'phone': '', 'date': ''}
+    
+    def _update_store_info(self, store_info: Dict, index: int, line: str):
+        """Fold one raw line into the store info found so far"""
         # Try to find store name (usually in first few lines)
-        for i, line in enumerate(lines[:5]):
-            line = line.strip()
-            if len(line) > 3 and not re.match(r'^\d', line):
+        if index < 5:
+            stripped = line.strip()
+            if len(stripped) > 3 and not STARTS_WITH_DIGIT_RE.match(stripped):
                 if not store_info['name']:
-                    store_info['name'] = line
-                elif not store_info['address'] and 'store' not in line.lower():
-                    store_info['address'] = line
+                    store_info['name'] = stripped
+                elif not store_info['address'] and 'store' not in stripped.lower():
+                    store_info['address'] = stripped
         
         # Look for phone number
-        phone_pattern = r'(\(?[\d\-\.\s]{10,}\)?)'
-        for line in lines:
-            phone_match = re.search(phone_pattern, line)
+        if not store_info['phone']:
+            phone_match = PHONE_RE.search(line)
             if phone_match:
                 store_info['phone'] = phone_match.group(1)
-                break
         
         # Look for date
-        date_patterns = [
-            r'(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})',
-            r'(\d{2,4}[\/\-]\d{1,2}[\/\-]\d{1,2})',
-        ]
-        
-        for line in lines:
-            for pattern in date_patterns:
-                date_match = re.search(pattern, line)
+        if not store_info['date']:
+            for pattern in DATE_RES:
+                date_match = pattern.search(line)
                 if date_match:
                     store_info['date'] = date_match.group(1)
                     break
-            if store_info['date']:
-                break
-        
-        return store_info
\ No newline at end of file
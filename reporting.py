@@ -0,0 +1,422 @@
+"""Columnar reporting over the full item history.
+
+Item rows are loaded once into typed NumPy arrays (strings become integer
+codes), and every report is a handful of vectorized operations over them, so
+reports stay fast with millions of items and new ones need no new SQL. A
+loaded history can be written to an .npz snapshot that other worker processes
+load instead of re-reading the database.
+
+Usage:
+    python -m reporting category_trend --days 90 --period week
+    python -m reporting unit_price --item milk
+"""
+import argparse
+import glob
+import inspect
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from database import ITEM_REWRITES_VERSION, RECEIPTS_VERSION, DatabaseManager
+
+# Rows fetched from SQLite per chunk while loading
+LOAD_CHUNK_ROWS = 100000
+
+# Snapshots are shared through this directory ('' keeps histories in memory only)
+SNAPSHOT_DIR = os.environ.get('REPORT_SNAPSHOT_DIR', '')
+
+# Upper bounds for report parameters; per-day reports allocate and label one
+# slot per day, so unbounded values could tie up a worker
+MAX_REPORT_DAYS = 3660
+MAX_REPORT_LIMIT = 500
+PARAMETER_RANGES = {
+    'days': (1, MAX_REPORT_DAYS),
+    'window': (1, MAX_REPORT_DAYS),
+    'limit': (1, MAX_REPORT_LIMIT),
+}
+
+# Items and receipts are read separately and matched with searchsorted, which
+# is several times faster than joining them in SQL
+RECEIPTS_QUERY = '''
+    SELECT id, CAST(julianday(DATE(upload_date)) - 2440587.5 AS INTEGER), COALESCE(store_name, '')
+    FROM receipts
+    WHERE id > ? AND DATE(upload_date) IS NOT NULL
+    ORDER BY id
+'''
+ITEMS_QUERY = '''
+    SELECT id, COALESCE(receipt_id, 0), category, name, COALESCE(quantity, 1), COALESCE(total_price, 0)
+    FROM items
+    WHERE id > ?
+'''
+
+NUMERIC_COLUMNS = {
+    'item_id': np.int64,
+    'receipt_id': np.int64,
+    'day': np.int32,  # days since 1970-01-01 of the receipt's upload date
+    'quantity': np.float64,
+    'total_price': np.float64,
+}
+# Columns stored as int32 codes into a list of distinct values
+CODED_COLUMNS = ('category', 'store', 'name')
+
+# Per-process history and the data versions it was loaded at
+_history = None
+_history_version = None
+_history_lock = threading.Lock()
+
+
+class ItemHistory:
+    """Every item joined with its receipt, one NumPy array per column"""
+    
+    def __init__(self, columns: Dict[str, np.ndarray], values: Dict[str, List[str]],
+                 last_receipt_id: int = 0, last_item_id: int = 0):
+        self.columns = columns
+        self.values = values
+        # Highest ids read, so later saves can be appended without a full reload
+        self.last_receipt_id = last_receipt_id
+        self.last_item_id = last_item_id
+        for name, array in columns.items():
+            setattr(self, name, array)
+    
+    def __len__(self) -> int:
+        return len(self.day)
+    
+    @classmethod
+    def from_database(cls, db_manager: DatabaseManager, base: Optional['ItemHistory'] = None,
+                      chunk_size: int = LOAD_CHUNK_ROWS) -> 'ItemHistory':
+        """Read the history in chunks, inside one read transaction so it is a consistent snapshot.
+        
+        With base, only receipts and items added after it are read and appended,
+        which is only correct if nothing older was changed or deleted since.
+        """
+        last_receipt_id = base.last_receipt_id if base else 0
+        last_item_id = base.last_item_id if base else 0
+        
+        with db_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN')
+            
+            cursor.execute(RECEIPTS_QUERY, (last_receipt_id,))
+            receipt_rows = cursor.fetchall()
+            receipt_ids, receipt_days, receipt_stores = zip(*receipt_rows) if receipt_rows else ((), (), ())
+            receipt_ids = np.array(receipt_ids, dtype=np.int64)
+            receipt_days = np.array(receipt_days, dtype=np.int32)
+            store_codes, stores = pd.factorize(np.array(receipt_stores, dtype=object))
+            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM receipts')
+            last_receipt_id = max(last_receipt_id, cursor.fetchone()[0])
+            del receipt_rows
+            
+            cursor.execute(ITEMS_QUERY, (last_item_id,))
+            chunks = {name: [] for name in ('item_id', 'receipt_id', 'category', 'name', 'quantity', 'total_price')}
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for name, data in zip(chunks, zip(*rows)):
+                    chunks[name].append(np.array(data, dtype=NUMERIC_COLUMNS.get(name, object)))
+            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM items')
+            last_item_id = max(last_item_id, cursor.fetchone()[0])
+        
+        def column(name):
+            return np.concatenate(chunks[name]) if chunks[name] else np.empty(0, dtype=NUMERIC_COLUMNS.get(name, object))
+        
+        # Position of each item's receipt; items without a dated receipt are dropped
+        item_receipts = column('receipt_id')
+        positions = np.minimum(np.searchsorted(receipt_ids, item_receipts), max(len(receipt_ids) - 1, 0))
+        keep = (receipt_ids[positions] == item_receipts) if len(receipt_ids) else np.zeros(len(item_receipts), bool)
+        positions = positions[keep]
+        
+        columns = {
+            'item_id': column('item_id')[keep],
+            'receipt_id': item_receipts[keep],
+            'day': receipt_days[positions],
+            'quantity': column('quantity')[keep],
+            'total_price': column('total_price')[keep],
+        }
+        values = {}
+        
+        category_codes, categories = pd.factorize(column('category')[keep])
+        # Lowercase each distinct name once instead of every row
+        name_codes, names = pd.factorize(column('name')[keep])
+        lower_codes, lower_names = pd.factorize(np.array([str(name).lower() for name in names], dtype=object))
+        
+        for name, codes, uniques in (('store', store_codes[positions], stores),
+                                     ('category', category_codes, categories),
+                                     ('name', lower_codes[name_codes], lower_names)):
+            known = list(base.values[name]) if base else []
+            lookup = {value: code for code, value in enumerate(known)}
+            mapping = np.array([lookup.setdefault(str(value), len(lookup)) for value in uniques], dtype=np.int32)
+            known.extend(list(lookup)[len(known):])
+            columns[name] = mapping[codes] if len(mapping) else codes.astype(np.int32)
+            values[name] = known
+        
+        if base:
+            columns = {name: np.concatenate([base.columns[name], array]) for name, array in columns.items()}
+        return cls(columns, values, last_receipt_id, last_item_id)
+    
+    def save(self, path: str):
+        """Write an .npz snapshot atomically"""
+        arrays = dict(self.columns)
+        for name, values in self.values.items():
+            arrays[f'{name}_values'] = np.array(values, dtype=str)
+        arrays['last_ids'] = np.array([self.last_receipt_id, self.last_item_id], dtype=np.int64)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path: str) -> 'ItemHistory':
+        with np.load(path) as snapshot:
+            columns = {name: snapshot[name] for name in list(NUMERIC_COLUMNS) + list(CODED_COLUMNS)}
+            values = {name: snapshot[f'{name}_values'].tolist() for name in CODED_COLUMNS}
+            last_receipt_id, last_item_id = snapshot['last_ids'].tolist()
+        return cls(columns, values, last_receipt_id, last_item_id)
+    
+    def to_dataframe(self) -> pd.DataFrame:
+        """The history as a DataFrame (categorical string columns) for ad-hoc analysis"""
+        frame = pd.DataFrame({name: self.columns[name] for name in NUMERIC_COLUMNS})
+        frame['date'] = self.day.astype('datetime64[D]')
+        for name in CODED_COLUMNS:
+            frame[name] = pd.Categorical.from_codes(self.columns[name], self.values[name])
+        return frame
+
+
+def _load_snapshot(path: str) -> Optional[ItemHistory]:
+    # A worker that loads newer data deletes older snapshots, possibly while
+    # another one is about to read them; that reader falls back to the database
+    try:
+        return ItemHistory.load(path)
+    except OSError:
+        return None
+
+def get_item_history(db_manager: DatabaseManager, snapshot_dir: Optional[str] = None) -> ItemHistory:
+    """This process's history for the current data versions, from memory, a snapshot or the database.
+    
+    Saves only append rows, so when just the receipts version moved the new
+    rows are appended; a delete, re-parse or correction (item_rewrites
+    version) forces a full reload.
+    """
+    global _history, _history_version
+    snapshot_dir = SNAPSHOT_DIR if snapshot_dir is None else snapshot_dir
+    
+    # Read before loading, so the data is never older than its label
+    version = (db_manager.db_path, db_manager.get_data_version(RECEIPTS_VERSION),
+               db_manager.get_data_version(ITEM_REWRITES_VERSION))
+    with _history_lock:
+        if _history is not None and _history_version == version:
+            return _history
+        
+        path = os.path.join(snapshot_dir, f'items-{version[1]}-{version[2]}.npz') if snapshot_dir else None
+        history = _load_snapshot(path) if path else None
+        if history is None:
+            appendable = _history is not None and _history_version[::2] == version[::2]
+            history = ItemHistory.from_database(db_manager, base=_history if appendable else None)
+            if path:
+                os.makedirs(snapshot_dir, exist_ok=True)
+                history.save(path)
+                for old_path in glob.glob(os.path.join(snapshot_dir, 'items-*.npz')):
+                    if old_path != path:
+                        try:
+                            os.remove(old_path)
+                        except FileNotFoundError:
+                            pass  # another worker cleaned it up first
+        
+        _history, _history_version = history, version
+        return history
+
+
+def _today() -> int:
+    return (date.today() - date(1970, 1, 1)).days
+
+def _in_window(history: ItemHistory, first_day: int) -> np.ndarray:
+    return (history.day >= first_day) & (history.day <= _today())
+
+def _periods(days: np.ndarray, period: str) -> np.ndarray:
+    """Period number of each day: the day itself, a Monday-based week or a calendar month"""
+    if period == 'day':
+        return days.astype(np.int64)
+    if period == 'week':
+        # 1970-01-01 was a Thursday
+        return (days.astype(np.int64) + 3) // 7
+    if period == 'month':
+        return days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    raise ValueError("period must be 'day', 'week' or 'month'")
+
+def _period_label(number: int, period: str) -> str:
+    if period == 'month':
+        return str(np.datetime64(number, 'M'))
+    if period == 'week':
+        return str(np.datetime64(number * 7 - 3, 'D'))
+    return str(np.datetime64(number, 'D'))
+
+def _rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    totals = np.cumsum(values, dtype=np.float64)
+    totals[window:] = totals[window:] - totals[:-window]
+    return totals
+
+def _rounded(values: np.ndarray) -> List:
+    return [round(float(value), 2) for value in values]
+
+def _trend(history: ItemHistory, column: str, days: int, period: str, limit: int) -> Dict:
+    first_day = _today() - days + 1
+    mask = _in_window(history, first_day)
+    periods = _periods(history.day[mask], period)
+    start, end = _periods(np.array([first_day, _today()]), period)
+    codes = history.columns[column][mask]
+    n_values = len(history.values[column])
+    n_periods = int(end - start + 1)
+    
+    totals = np.bincount((periods - start) * n_values + codes, weights=history.total_price[mask],
+                         minlength=n_periods * n_values).reshape(n_periods, n_values)
+    ranked = np.argsort(-totals.sum(axis=0), kind='stable')[:limit]
+    return {
+        'period': period,
+        'periods': [_period_label(number, period) for number in range(int(start), int(end) + 1)],
+        'series': {history.values[column][code]: _rounded(totals[:, code])
+                   for code in ranked if totals[:, code].any()},
+    }
+
+def category_trend(history: ItemHistory, days: int = 90, period: str = 'week', limit: int = 20) -> Dict:
+    """Spending per category in each period of the last N days"""
+    return _trend(history, 'category', days, period, limit)
+
+def store_trend(history: ItemHistory, days: int = 90, period: str = 'week', limit: int = 10) -> Dict:
+    """Spending per store in each period of the last N days"""
+    return _trend(history, 'store', days, period, limit)
+
+def rolling_spend(history: ItemHistory, days: int = 90, window: int = 7) -> Dict:
+    """Daily spending over the last N days with a trailing W-day moving average"""
+    if window < 1:
+        raise ValueError('window must be at least 1')
+    # Start window - 1 days early so the first average covers a full window
+    first_day = _today() - days - window + 2
+    mask = _in_window(history, first_day)
+    daily = np.bincount(history.day[mask] - first_day, weights=history.total_price[mask],
+                        minlength=days + window - 1)
+    average = _rolling_sum(daily, window) / window
+    return {
+        'dates': [str(np.datetime64(day, 'D')) for day in range(first_day + window - 1, _today() + 1)],
+        'daily_total': _rounded(daily[window - 1:]),
+        'rolling_average': _rounded(average[window - 1:]),
+    }
+
+def unit_price(history: ItemHistory, item: str = '', days: int = 365, window: int = 7) -> Dict:
+    """Average price per unit of items whose name contains `item`, per day, with a moving average"""
+    needle = item.lower().strip()
+    if not needle:
+        raise ValueError('item is required')
+    if window < 1:
+        raise ValueError('window must be at least 1')
+    
+    matching = [code for code, name in enumerate(history.values['name']) if needle in name]
+    first_day = _today() - days - window + 2
+    mask = _in_window(history, first_day) & (history.quantity > 0) & np.isin(history.name, matching)
+    offsets = history.day[mask] - first_day
+    per_unit = history.total_price[mask] / history.quantity[mask]
+    
+    length = days + window - 1
+    sums = np.bincount(offsets, weights=per_unit, minlength=length)
+    counts = np.bincount(offsets, minlength=length).astype(np.float64)
+    window_sums = _rolling_sum(sums, window)
+    window_counts = _rolling_sum(counts, window)
+    
+    def averages(totals, numbers):
+        return [round(float(total / number), 2) if number else None
+                for total, number in zip(totals[window - 1:], numbers[window - 1:])]
+    
+    names = np.bincount(history.name[mask], minlength=len(history.values['name']))
+    return {
+        'item': needle,
+        'matched_names': [history.values['name'][code] for code in np.argsort(-names, kind='stable')[:10]
+                          if names[code]],
+        'dates': [str(np.datetime64(day, 'D')) for day in range(first_day + window - 1, _today() + 1)],
+        'purchases': counts[window - 1:].astype(int).tolist(),
+        'average_unit_price': averages(sums, counts),
+        'rolling_average': averages(window_sums, window_counts),
+    }
+
+def top_items(history: ItemHistory, days: int = 90, limit: int = 10) -> Dict:
+    """Most frequently bought item names in the last N days, with spend and average price"""
+    mask = _in_window(history, _today() - days + 1)
+    names = history.name[mask]
+    n_names = len(history.values['name'])
+    counts = np.bincount(names, minlength=n_names)
+    spend = np.bincount(names, weights=history.total_price[mask], minlength=n_names)
+    ranked = [code for code in np.argsort(-counts, kind='stable')[:limit] if counts[code]]
+    return {'items': [{
+        'name': history.values['name'][code],
+        'frequency': int(counts[code]),
+        'total_spent': round(float(spend[code]), 2),
+        'avg_price': round(float(spend[code] / counts[code]), 2),
+    } for code in ranked]}
+
+
+REPORTS: Dict[str, Callable[..., Dict]] = {
+    'category_trend': category_trend,
+    'store_trend': store_trend,
+    'rolling_spend': rolling_spend,
+    'unit_price': unit_price,
+    'top_items': top_items,
+}
+
+def run_report(history: ItemHistory, name: str, params: Dict[str, str]) -> Dict:
+    """Run a report with string parameters (e.g. a query string), converted to each default's type.
+    
+    Raises KeyError for an unknown report and ValueError for bad parameters.
+    """
+    report = REPORTS[name]
+    defaults = {key: parameter.default for key, parameter in inspect.signature(report).parameters.items()
+                if parameter.default is not inspect.Parameter.empty}
+    kwargs = {}
+    for key, value in params.items():
+        if key not in defaults:
+            raise ValueError(f'unknown parameter {key!r} for {name}')
+        try:
+            kwargs[key] = type(defaults[key])(value)
+        except ValueError:
+            raise ValueError(f'{key} must be of type {type(defaults[key]).__name__}') from None
+    for key, (low, high) in PARAMETER_RANGES.items():
+        if key in kwargs and not low <= kwargs[key] <= high:
+            raise ValueError(f'{key} must be between {low} and {high}')
+    return report(history, **kwargs)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Run a columnar report over the item history')
+    parser.add_argument('report', choices=sorted(REPORTS))
+    parser.add_argument('--db', default='receipts.db', help='SQLite database path')
+    parser.add_argument('--days', type=str)
+    parser.add_argument('--period', type=str)
+    parser.add_argument('--window', type=str)
+    parser.add_argument('--item', type=str)
+    parser.add_argument('--limit', type=str)
+    args = parser.parse_args(argv)
+    
+    start = time.perf_counter()
+    history = get_item_history(DatabaseManager(args.db))
+    loaded = time.perf_counter()
+    params = {key: value for key, value in vars(args).items()
+              if key not in ('report', 'db') and value is not None}
+    try:
+        result = run_report(history, args.report, params)
+    except ValueError as e:
+        parser.error(str(e))
+    finished = time.perf_counter()
+    
+    print(json.dumps(result, indent=2))
+    print(f'{len(history)} items loaded in {loaded - start:.2f}s, report in {(finished - loaded) * 1000:.1f} ms',
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
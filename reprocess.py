@@ -0,0 +1,240 @@
+"""Re-parse and re-categorize stored receipts.
+
+Runs the current ReceiptParser and ItemCategorizer over the raw OCR text kept
+in the receipts table, so rule improvements reach old receipts without running
+OCR again. Only items that actually changed are written, one transaction per
+chunk, and progress is checkpointed so an interrupted run resumes where it
+stopped.
+
+Usage:
+    python -m reprocess [--db receipts.db] [--workers N] [--chunk-size 500]
+    python -m reprocess --restart --dry-run
+
+Only one run per database at a time: a second one exits with status 1.
+"""
+import argparse
+import fcntl
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, List, Optional, Tuple
+
+from database import DatabaseManager, _process_alive
+from item_categorizer import get_categorizer
+from receipt_parser import ReceiptParser
+
+CHECKPOINT_NAME = 'reparse'
+
+# Columns compared when diffing new items against stored rows
+ITEM_FIELDS = ('name', 'category', 'quantity', 'unit_price', 'total_price', 'raw_line')
+
+# Per-process parser, built once in each pool worker
+_worker_parser = None
+
+
+def _item_row(item: Dict) -> Tuple:
+    return tuple(item[field] for field in ITEM_FIELDS)
+
+def diff_items(existing: List[Dict], parsed: List[Dict]) -> Dict:
+    """Work out the deletes, updates and inserts that turn existing rows into parsed items.
+    
+    Rows identical to a parsed item are left alone. Remaining rows are reused
+    for parsed items from the same raw line (e.g. a new category), and whatever
+    is left over is deleted or inserted.
+    """
+    unmatched = {}
+    for item in existing:
+        unmatched.setdefault(_item_row(item), []).append(item['id'])
+    
+    changed = []
+    for item in parsed:
+        ids = unmatched.get(_item_row(item))
+        if ids:
+            ids.pop()
+        else:
+            changed.append(item)
+    
+    leftover = {}
+    for item in existing:
+        ids = unmatched[_item_row(item)]
+        if item['id'] in ids:
+            leftover.setdefault(item['raw_line'], []).append(item['id'])
+    
+    updates, inserts = [], []
+    for item in changed:
+        ids = leftover.get(item['raw_line'])
+        if ids:
+            updates.append(dict(item, id=ids.pop(0)))
+        else:
+            inserts.append(item)
+    
+    deletes = [item_id for ids in leftover.values() for item_id in ids]
+    return {'delete': deletes, 'update': updates, 'insert': inserts}
+
+def _reparse_receipt(receipt_id: int, raw_text: str, existing: List[Dict], db_path: str) -> Optional[Dict]:
+    """Pool worker: parse and categorize one receipt and diff it against its stored items"""
+    global _worker_parser
+    if _worker_parser is None:
+        _worker_parser = ReceiptParser()
+    
+    items = _worker_parser.parse_receipt(raw_text or '')
+    categories = get_categorizer(DatabaseManager(db_path), max_age=1.0).categorize_many([item['name'] for item in items])
+    parsed = []
+    for item, category in zip(items, categories):
+        parsed.append({
+            'name': item['name'],
+            'category': category,
+            'quantity': item['quantity'],
+            'unit_price': item['unit_price'],
+            'total_price': item['price'],
+            'raw_line': item['raw_line']
+        })
+    
+    # Never wipe a receipt's items because the text no longer parses
+    if not parsed:
+        return None
+    
+    change = diff_items(existing, parsed)
+    if not (change['delete'] or change['update'] or change['insert']):
+        return None
+    
+    change['receipt_id'] = receipt_id
+    change['total_amount'] = sum(item['total_price'] for item in parsed)
+    change['item_count'] = len(parsed)
+    return change
+
+def _lock_path(db_path: str) -> str:
+    return f'{db_path}.reparse.lock'
+
+def acquire_run_lock(db_path: str):
+    """Take the database's re-parse lock, or return None if another run holds it.
+    
+    The lock is an flock on a file next to the database, released when the
+    returned file is closed or the process exits (however it exits). The
+    holder writes its pid into the file so others can check it without
+    touching the lock; release_run_lock() clears it again.
+    """
+    # Append mode, so a failed attempt doesn't truncate the holder's pid
+    lock_file = open(_lock_path(db_path), 'a+')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    lock_file.truncate(0)
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    return lock_file
+
+def release_run_lock(lock_file):
+    """Clear the holder's pid and release the re-parse lock"""
+    lock_file.truncate(0)
+    lock_file.close()
+
+def reparse_running(db_path: str) -> bool:
+    """Whether any process is re-parsing the database right now.
+    
+    Only reads the lock file, so polling it never makes a starting run find
+    the lock taken.
+    """
+    try:
+        with open(_lock_path(db_path)) as lock_file:
+            pid = lock_file.read().strip()
+    except FileNotFoundError:
+        return False
+    return pid.isdigit() and _process_alive(int(pid))
+
+def run_reparse(db_manager: DatabaseManager, chunk_size: int = 500,
+                max_workers: Optional[int] = None, restart: bool = False,
+                dry_run: bool = False, progress=None) -> Dict:
+    """Re-parse every stored receipt, resuming from the last checkpoint unless restart is set.
+    
+    With dry_run the changes are counted but not written (and no checkpoint is kept).
+    progress, if given, is called with the stats dict after each chunk.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    start_time = time.perf_counter()
+    
+    checkpoint = db_manager.get_checkpoint(CHECKPOINT_NAME)
+    if checkpoint and checkpoint['status'] != 'done' and not restart and not dry_run:
+        last_id = checkpoint['last_id']
+        stats = checkpoint['stats']
+    else:
+        last_id = 0
+        stats = {'receipts': 0, 'changed_receipts': 0, 'deleted': 0, 'updated': 0, 'inserted': 0}
+    
+    if not dry_run:
+        db_manager.set_checkpoint(CHECKPOINT_NAME, 'running', last_id, stats)
+    
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            rows = db_manager.get_receipts_after(last_id, chunk_size)
+            if not rows:
+                break
+            
+            receipt_ids = [row[0] for row in rows]
+            existing = db_manager.get_items_for_receipts(receipt_ids)
+            changes = [
+                change for change in executor.map(
+                    _reparse_receipt, receipt_ids, [row[1] for row in rows],
+                    [existing[receipt_id] for receipt_id in receipt_ids], repeat(db_manager.db_path),
+                    chunksize=max(1, len(rows) // (max_workers * 4)))
+                if change
+            ]
+            
+            last_id = receipt_ids[-1]
+            stats['receipts'] += len(rows)
+            stats['changed_receipts'] += len(changes)
+            stats['deleted'] += sum(len(change['delete']) for change in changes)
+            stats['updated'] += sum(len(change['update']) for change in changes)
+            stats['inserted'] += sum(len(change['insert']) for change in changes)
+            
+            if not dry_run:
+                # The checkpoint commits with the chunk, so a crash never re-applies it
+                db_manager.apply_item_changes(changes, {'name': CHECKPOINT_NAME, 'last_id': last_id,
+                                                        'stats': stats})
+            if progress:
+                progress(stats)
+    
+    if not dry_run:
+        db_manager.set_checkpoint(CHECKPOINT_NAME, 'done', last_id, stats)
+    
+    elapsed = time.perf_counter() - start_time
+    return dict(stats, seconds=round(elapsed, 2), dry_run=dry_run)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Re-parse and re-categorize stored receipts')
+    parser.add_argument('--db', default='receipts.db', help='SQLite database path')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=500, help='receipts diffed and saved per transaction')
+    parser.add_argument('--restart', action='store_true', help='ignore the checkpoint and start from the first receipt')
+    parser.add_argument('--dry-run', action='store_true', help='report changes without writing them')
+    args = parser.parse_args(argv)
+    
+    lock_file = acquire_run_lock(args.db)
+    if lock_file is None:
+        print(f"A re-parse of {args.db} is already running", file=sys.stderr)
+        return 1
+    
+    db_manager = DatabaseManager(args.db)
+    db_manager.init_database()
+    
+    def progress(stats):
+        print(f"{stats['receipts']} receipts checked, {stats['changed_receipts']} changed", file=sys.stderr)
+    
+    try:
+        stats = run_reparse(db_manager, args.chunk_size, args.workers, args.restart, args.dry_run, progress)
+    finally:
+        release_run_lock(lock_file)
+    
+    verb = 'would change' if stats['dry_run'] else 'changed'
+    print(f"\n{stats['receipts']} receipts checked, {stats['changed_receipts']} {verb} "
+          f"({stats['updated']} items updated, {stats['inserted']} inserted, {stats['deleted']} deleted) "
+          f"in {stats['seconds']}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
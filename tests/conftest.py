@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# The application modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager
+
+
+@pytest.fixture
+def db_manager(tmp_path):
+    """A migrated database in a temporary directory"""
+    manager = DatabaseManager(str(tmp_path / 'receipts.db'))
+    manager.init_database()
+    return manager
@@ -0,0 +1 @@
+"""Original implementations, kept unchanged so tests can check the optimized ones give identical results"""
@@ -0,0 +1,42 @@
+from typing import Dict, List
+
+
+def save_receipt(db_manager, filename: str, raw_text: str, items: List[Dict]) -> int:
+    """Save a receipt and its items to the database (DatabaseManager.save_receipt as it was, one INSERT per item)"""
+    conn = db_manager.get_connection()
+    cursor = conn.cursor()
+    
+    # Calculate totals
+    total_amount = sum(item.get('price', 0) for item in items)
+    item_count = len(items)
+    
+    # Extract store info (you might want to enhance this)
+    store_name = db_manager._extract_store_name(raw_text)
+    
+    # Insert receipt
+    cursor.execute('''
+        INSERT INTO receipts (filename, raw_text, store_name, total_amount, item_count)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (filename, raw_text, store_name, total_amount, item_count))
+    
+    receipt_id = cursor.lastrowid
+    
+    # Insert items
+    for item in items:
+        cursor.execute('''
+            INSERT INTO items (receipt_id, name, category, quantity, unit_price, total_price, raw_line)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            receipt_id,
+            item.get('name', ''),
+            item.get('category', 'other'),
+            item.get('quantity', 1),
+            item.get('unit_price', 0),
+            item.get('price', 0),
+            item.get('raw_line', '')
+        ))
+    
+    conn.commit()
+    conn.close()
+    
+    return receipt_id
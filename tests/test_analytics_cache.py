@@ -0,0 +1,41 @@
+import json
+from datetime import date, datetime, time, timedelta
+
+from analytics_cache import AnalyticsCache
+
+
+def _save(db_manager, when, category, price):
+    receipt_id = db_manager.save_receipt('a.png', 'FRESH MART', [
+        {'name': 'Item', 'category': category, 'quantity': 1, 'unit_price': price, 'price': price}])
+    with db_manager.connection() as conn:
+        conn.execute('UPDATE receipts SET upload_date = ? WHERE id = ?', (when.isoformat(' '), receipt_id))
+
+
+def _uncached(db_manager, days):
+    return {'category_spending': db_manager.get_spending_by_category(days),
+            'time_spending': db_manager.get_spending_over_time(days)}
+
+
+def test_cached_spending_matches_uncached_queries(db_manager):
+    first_day = date.today() - timedelta(days=7)
+    # The whole first day is in the window, whatever the time of the query
+    _save(db_manager, datetime.combine(first_day, time(0, 0, 1)), 'dairy', 2.50)
+    _save(db_manager, datetime.combine(first_day, time(23, 59)), 'produce', 1.25)
+    _save(db_manager, datetime.combine(first_day - timedelta(days=1), time(23, 59, 59)), 'dairy', 100.0)
+    _save(db_manager, datetime.now(), 'dairy', 4.00)
+    db_manager.rebuild_derived_tables()
+    
+    cache = AnalyticsCache(db_manager)
+    cached = lambda: json.loads(cache.get_or_compute('spending', {'days': 7}, lambda: _uncached(db_manager, 7)))
+    assert cached() == _uncached(db_manager, 7)
+    assert {row['category']: row['total_spent'] for row in cached()['category_spending']} == \
+        {'dairy': 6.5, 'produce': 1.25}
+    assert [row['date'] for row in cached()['time_spending']] == \
+        sorted({first_day.isoformat(), date.today().isoformat()})
+    
+    # A write invalidates the entry, and the recomputed result matches again
+    _save(db_manager, datetime.now(), 'produce', 3.00)
+    db_manager.rebuild_derived_tables()
+    assert cached() == _uncached(db_manager, 7)
+    assert {row['category']: row['total_spent'] for row in cached()['category_spending']} == \
+        {'dairy': 6.5, 'produce': 4.25}
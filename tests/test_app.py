@@ -0,0 +1,50 @@
+import importlib
+import sys
+
+import database
+from database import DatabaseManager
+from migrations import LATEST_VERSION, get_schema_version
+
+
+def test_app_migrates_its_database_on_import(tmp_path, monkeypatch):
+    # WSGI servers import the app without running __main__
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delitem(sys.modules, 'app', raising=False)
+    app_module = importlib.import_module('app')
+    try:
+        conn = app_module.db_manager.get_connection()
+        try:
+            assert get_schema_version(conn) == LATEST_VERSION
+        finally:
+            conn.close()
+        
+        # Cached analytics read the data_versions timestamps added by migration 4
+        response = app_module.app.test_client().get('/api/spending_data')
+        assert response.status_code == 200
+    finally:
+        app_module.job_queue.shutdown()
+        app_module.archive_executor.shutdown()
+        sys.modules.pop('app', None)
+
+
+def test_app_resumes_queued_jobs_on_import(tmp_path, monkeypatch):
+    # A job left queued by a previous process, whose archived upload is gone
+    monkeypatch.chdir(tmp_path)
+    # Pools are per path, and the app's relative path was used by other tests
+    monkeypatch.setattr(database, '_pools', {})
+    db_manager = DatabaseManager()
+    db_manager.init_database()
+    job_id = db_manager.create_job(str(tmp_path / 'gone.png'))
+    with db_manager.connection() as conn:
+        conn.execute('UPDATE jobs SET owner_pid = NULL WHERE id = ?', (job_id,))
+    
+    monkeypatch.delitem(sys.modules, 'app', raising=False)
+    app_module = importlib.import_module('app')
+    try:
+        # Without any upload or request reaching this process
+        app_module.job_queue.shutdown()
+        assert db_manager.get_job(job_id)['status'] == 'failed'
+    finally:
+        app_module.job_queue.shutdown()
+        app_module.archive_executor.shutdown()
+        sys.modules.pop('app', None)
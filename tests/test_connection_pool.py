@@ -0,0 +1,33 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import database
+from database import DatabaseManager, get_pool
+
+
+def _save_in_child(db_path):
+    # The parent's idle connections were closed by the fork handler
+    assert all(not pool._idle for pool in database._pools.values())
+    db_manager = DatabaseManager(db_path)
+    db_manager.save_receipt('child.png', 'CORNER GROCERY', [{'name': 'Bread', 'price': 2.99}])
+    return db_manager.get_receipt_totals()['receipts']
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='needs fork')
+def test_forked_worker_gets_its_own_connections(db_manager):
+    db_manager.save_receipt('parent.png', 'FRESH MART', [{'name': 'Milk', 'price': 3.49}])
+    parent_conn = get_pool(db_manager.db_path).acquire()
+    parent_conn.close()
+    
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('fork')) as executor:
+        assert executor.submit(_save_in_child, db_manager.db_path).result() == 2
+    
+    # The parent's pooled connection is untouched and sees the child's write
+    conn = get_pool(db_manager.db_path).acquire()
+    conn.close()
+    assert conn is parent_conn
+    assert db_manager.get_receipt_totals()['receipts'] == 2
+    db_manager.save_receipt('parent.png', 'FRESH MART', [])
+    assert db_manager.get_receipt_totals()['receipts'] == 3
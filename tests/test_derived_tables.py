@@ -0,0 +1,86 @@
+import inspect
+import os
+
+from database import ITEM_REWRITES_VERSION, RECEIPTS_VERSION, DatabaseManager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Tables index_new_items() and the triggers keep in step with receipts and items
+DERIVED_QUERIES = {
+    'spending_daily': 'SELECT day, ROUND(total_amount, 2), receipt_count FROM spending_daily '
+                      'WHERE receipt_count != 0 ORDER BY day',
+    'spending_daily_category': 'SELECT day, category, ROUND(total_spent, 2), item_count FROM spending_daily_category '
+                               'WHERE item_count != 0 ORDER BY day, category',
+    'items_search': 'SELECT rowid, name, raw_line, store_name FROM items_search ORDER BY rowid',
+    'price_observations': 'SELECT product_id, day, item_id, receipt_id, quantity, ROUND(unit_price, 4) '
+                          'FROM price_observations ORDER BY item_id',
+}
+
+
+def _item(name, category, price, quantity=1):
+    return {'name': name, 'category': category, 'quantity': quantity, 'unit_price': round(price / quantity, 2),
+            'price': price, 'raw_line': f'{name.upper()} {price:.2f}'}
+
+def _derived(db_manager):
+    conn = db_manager.get_connection()
+    try:
+        return {table: conn.execute(sql).fetchall() for table, sql in DERIVED_QUERIES.items()}
+    finally:
+        conn.close()
+
+
+def test_every_item_insert_indexes_the_new_items():
+    # Items may only be inserted through queries.ITEM_INSERT_SQL ...
+    for name in os.listdir(ROOT):
+        if name.endswith('.py') and name != 'queries.py':
+            with open(os.path.join(ROOT, name)) as f:
+                assert 'INSERT INTO items ' not in f.read(), f'{name} inserts items without ITEM_INSERT_SQL'
+    # ... and every method running it must hand the new rows to index_new_items()
+    inserting = []
+    for name, method in inspect.getmembers(DatabaseManager, inspect.isfunction):
+        source = inspect.getsource(method)
+        if 'ITEM_INSERT_SQL' in source:
+            inserting.append(name)
+            assert 'index_new_items' in source, f'DatabaseManager.{name} does not call index_new_items'
+    assert {'save_receipts', '_insert_receipt', 'apply_item_changes'} <= set(inserting)
+
+
+def test_write_paths_keep_derived_tables_in_sync(db_manager):
+    first = db_manager.save_receipt('a.png', 'FRESH MART\nMILK 3.49', [
+        _item('Whole Milk', 'dairy', 3.49), _item('Bananas', 'produce', 1.18, 2)])
+    batch = db_manager.save_receipts([
+        {'filename': 'b.png', 'raw_text': 'CORNER GROCERY', 'items': [_item('Bread', 'bakery', 2.99)]},
+        {'filename': 'c.png', 'raw_text': 'VALLEY FOODS', 'items': [_item('whole milk ', 'dairy', 3.59),
+                                                                    _item('Coffee', 'beverages', 7.99)]},
+    ])
+    receipt = db_manager.get_receipt(first)
+    milk, bananas = sorted(receipt['items'], key=lambda item: item['name'], reverse=True)
+    db_manager.apply_item_changes([{
+        'receipt_id': first,
+        'delete': [bananas['id']],
+        'update': [dict(milk, name='Skim Milk', total_price=3.29, unit_price=3.29)],
+        'insert': [{'name': 'Eggs', 'category': 'dairy', 'quantity': 1, 'unit_price': 4.19,
+                    'total_price': 4.19, 'raw_line': 'EGGS 4.19'}],
+        'total_amount': 7.48,
+        'item_count': 2,
+    }])
+    bread = db_manager.get_receipt(batch[0])['items'][0]
+    db_manager.update_item_category(bread['id'], 'pantry')
+    db_manager.delete_receipt(batch[1])
+    
+    maintained = _derived(db_manager)
+    assert all(maintained.values())
+    db_manager.rebuild_derived_tables()
+    assert _derived(db_manager) == maintained
+
+
+def test_rebuild_invalidates_cached_analytics(db_manager):
+    db_manager.save_receipt('a.png', 'FRESH MART', [_item('Whole Milk', 'dairy', 3.49)])
+    receipts_version = db_manager.get_data_version(RECEIPTS_VERSION)
+    rewrites_version = db_manager.get_data_version(ITEM_REWRITES_VERSION)
+    
+    db_manager.rebuild_derived_tables()
+    
+    assert db_manager.get_data_version(RECEIPTS_VERSION) == receipts_version + 1
+    # Items are untouched, so loaded report histories stay valid
+    assert db_manager.get_data_version(ITEM_REWRITES_VERSION) == rewrites_version
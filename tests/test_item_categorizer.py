@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from benchmarks.receipts import make_item_names, make_receipt
+from item_categorizer import ItemCategorizer
+from reference.item_categorizer import ItemCategorizer as ReferenceCategorizer
+
+EDGE_CASES = ['', '   ', 'MILK', ' whole milk ', 'milk chocolate', 'chocolate milk', 'ground', 'canned corn',
+              'bananna', 'kiwi', 'ki', 'x', 'GV ORGANIC BABY SPINACH 12OZ', 'zzzz qqqq', 'ice cream sandwich',
+              # Partial reads that contain one keyword and sit inside another
+              'lemona', 'pcorn', 'kpeas', 'sham', 'toil', 'foil', 'onuts']
+
+
+def _receipt_names(count, seed):
+    rng = random.Random(seed)
+    names = []
+    while len(names) < count:
+        names.extend(item['name'] for item in make_receipt(rng)['items'])
+    return names[:count]
+
+
+CORPORA = {
+    'edge_cases': EDGE_CASES,
+    'receipt_items': _receipt_names(1000, seed=1),
+    'noisy_names': make_item_names(1500, seed=2),
+}
+
+
+@pytest.mark.parametrize('corpus', list(CORPORA))
+@pytest.mark.parametrize('cache_size', [0, 100])
+def test_categorizer_matches_reference(corpus, cache_size):
+    names = CORPORA[corpus]
+    reference = ReferenceCategorizer()
+    expected = [reference.categorize_item(name) for name in names]
+    
+    categorizer = ItemCategorizer(cache_size=cache_size)
+    # Twice, so cached answers are checked as well
+    assert [categorizer.categorize_item(name) for name in names] == expected
+    assert [categorizer.categorize_item(name) for name in names] == expected
+    assert ItemCategorizer(cache_size=cache_size).categorize_many(names) == expected
+
+
+def test_custom_mappings_match_reference():
+    names = ['dragonfruit', 'dragon fruit bowl', 'dragonfruits', 'GV DRAGONFRUIT 2PK', 'milk']
+    categorizer, reference = ItemCategorizer(), ReferenceCategorizer()
+    assert [categorizer.categorize_item(name) for name in names] == \
+        [reference.categorize_item(name) for name in names]
+    
+    # Mappings added after the first lookups rebuild the index and drop stale cache entries
+    for c in (categorizer, reference):
+        c.add_custom_mapping('Dragonfruit', 'fruits')
+        c.add_custom_mapping('milk', 'beverages')
+    assert [categorizer.categorize_item(name) for name in names] == \
+        [reference.categorize_item(name) for name in names]
+    assert categorizer.categorize_many(names) == [reference.categorize_item(name) for name in names]
+
+
+@pytest.mark.parametrize('name', ['bananna', 'chiken', 'yoghurt', 'zzzz'])
+def test_suggestions_match_reference(name):
+    assert ItemCategorizer().suggest_category_for_unknown_item(name) == \
+        ReferenceCategorizer().suggest_category_for_unknown_item(name)
@@ -0,0 +1,18 @@
+from job_queue import run_job
+
+
+def test_unarchived_upload_fails_fast_when_resumed(db_manager):
+    # ARCHIVE_UPLOADS=0 queues jobs without a path; after a restart their bytes are gone
+    job_id = db_manager.create_job('')
+    
+    assert run_job(job_id, db_manager.db_path) == 'failed'
+    job = db_manager.get_job(job_id)
+    assert job['status'] == 'failed'
+    assert 'not archived' in job['error']
+
+
+def test_missing_archive_fails_the_job(db_manager, tmp_path):
+    job_id = db_manager.create_job(str(tmp_path / 'gone.png'))
+    
+    assert run_job(job_id, db_manager.db_path) == 'failed'
+    assert 'no longer available' in db_manager.get_job(job_id)['error']
@@ -0,0 +1,20 @@
+import pytest
+
+import metrics
+
+pytestmark = pytest.mark.skipif(not metrics.ENABLED, reason='METRICS=0')
+
+
+def test_failed_flush_keeps_changes_for_the_next_one(tmp_path, caplog):
+    # Drain whatever earlier tests recorded
+    metrics.flush(str(tmp_path / 'earlier.db'))
+    metrics.inc('jobs_total', 3, outcome='flush-test')
+    metrics.observe('receipt_items', 4)
+    
+    # The database can't be opened: the flush logs instead of raising
+    metrics.flush(str(tmp_path / 'missing' / 'metrics.db'))
+    assert 'Error flushing metrics' in caplog.text
+    
+    text = metrics.render(str(tmp_path / 'metrics.db'))
+    assert 'jobs_total{outcome="flush-test"} 3' in text.splitlines()
+    assert 'receipt_items_count 1' in text.splitlines()
@@ -0,0 +1,22 @@
+import pytest
+
+from migrations import HOT_QUERIES, LATEST_VERSION, explain_hot_queries, get_schema_version, migrate
+
+
+def test_init_database_applies_every_migration(db_manager):
+    conn = db_manager.get_connection()
+    try:
+        assert get_schema_version(conn) == LATEST_VERSION
+        assert migrate(conn) == []
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('name', sorted(HOT_QUERIES))
+def test_hot_query_uses_its_indexes(db_manager, name):
+    conn = db_manager.get_connection()
+    try:
+        result = explain_hot_queries(conn)[name]
+    finally:
+        conn.close()
+    assert result['uses_index'], f"{name} does not use {result['missing']}: {result['plan']}"
@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+
+def _buy(db_manager, name, purchases):
+    """Save one receipt per (days_ago, unit_price) and date it that many days back"""
+    for days_ago, price in purchases:
+        receipt_id = db_manager.save_receipt('a.png', 'FRESH MART', [
+            {'name': name, 'category': 'dairy', 'quantity': 1, 'unit_price': price, 'price': price}])
+        with db_manager.connection() as conn:
+            conn.execute('UPDATE receipts SET upload_date = ? WHERE id = ?',
+                         ((datetime.now() - timedelta(days=days_ago)).isoformat(' '), receipt_id))
+    db_manager.rebuild_derived_tables()
+    return db_manager.get_products(name)[0]['id']
+
+
+@pytest.mark.parametrize('days_ago, annualized', [(40, False), (100, False), (250, True)])
+def test_annualized_change_needs_a_minimum_span(db_manager, days_ago, annualized):
+    product_id = _buy(db_manager, 'Whole Milk', [(days_ago, 3.00), (0, 3.30)])
+    
+    inflation = db_manager.get_price_inflation(product_id)
+    assert inflation['change_percent'] == 10.0
+    assert (inflation['annualized_percent'] is not None) == annualized
+
+
+def test_product_search_matches_wildcards_literally(db_manager):
+    db_manager.save_receipt('a.png', 'FRESH MART', [{'name': name, 'price': 1.0}
+                                                    for name in ('100% Juice', 'a_b', 'ab', 'plain')])
+    
+    assert [product['name'] for product in db_manager.get_products('%')] == ['100% Juice']
+    assert [product['name'] for product in db_manager.get_products('_')] == ['a_b']
+    assert len(db_manager.get_products()) == 4
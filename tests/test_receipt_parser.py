@@ -0,0 +1,48 @@
+import io
+
+import pytest
+
+from benchmarks.receipts import make_receipt_dump, make_receipts
+from receipt_parser import ReceiptParser
+from reference.receipt_parser import ReceiptParser as ReferenceParser
+
+EDGE_CASES = [
+    '',
+    '\n\n  \n',
+    'FRESH MART\r\n123 MAIN ST\r\n(555) 123-4567\r\nMILK 3.49\r\nTOTAL 3.49',
+    'qty 2 Apples 1.99\n3 @ Limes 0.5\n2pcs Donuts 4,50\n4 pc Rolls 2.3\nItem: Eggs each 4.19',
+    'TOTAL TORTILLAS 2.99\nSubtotal chips 3.49\nDAIRY\nPRODUCE 12.00\n12/05/2024 10:31\n0042',
+    'Cheese $12.345\n$.99 Gum\nCoffee 1,234.56\n--- 9.99 ---\nX 0.00\nBig TV 1500.00',
+    "Ben & Jerry's 5.99\nM&M*S 1.29\nHalf-Gallon (2%) Milk 3.19\nCafé Crème 4.50",
+    'A\nBB\nSTORE 99\nCORNER GROCERY\n1 Elm St\nPh 555.123.4567\n2024-01-31\nBread 2.99',
+]
+
+
+CORPORA = {
+    'edge_cases': EDGE_CASES,
+    'receipts': [receipt['text'] for receipt in make_receipts(200, seed=1)],
+    'dump': [make_receipt_dump(5000, seed=2)],
+}
+
+
+@pytest.mark.parametrize('corpus', list(CORPORA))
+def test_parser_matches_reference(corpus):
+    parser, reference = ReceiptParser(), ReferenceParser()
+    for text in CORPORA[corpus]:
+        items, store_info = reference.parse_receipt(text), reference.extract_store_info(text)
+        assert parser.parse_receipt(text) == items
+        assert parser.extract_store_info(text) == store_info
+        assert parser.parse_with_store_info(text) == (store_info, items)
+        assert list(parser.iter_items(io.StringIO(text))) == items
+
+
+def test_added_patterns_match_reference():
+    parser, reference = ReceiptParser(), ReferenceParser()
+    text = 'Milk 3.49\nCoffee 7 EUR\n5 ea Limes 1.00\nBread 2.99'
+    assert parser.parse_receipt(text) == reference.parse_receipt(text)
+    
+    # Patterns appended after the first parse are picked up, as before
+    for p in (parser, reference):
+        p.price_patterns.append(r'(\d+) EUR')
+        p.quantity_patterns.append(r'(\d+)\s*ea\b')
+    assert parser.parse_receipt(text) == reference.parse_receipt(text)
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import reporting
+from reporting import MAX_REPORT_DAYS, ItemHistory, get_item_history, run_report
+
+
+@pytest.fixture(autouse=True)
+def fresh_history(monkeypatch):
+    """Each test starts without this process's cached history"""
+    monkeypatch.setattr(reporting, '_history', None)
+    monkeypatch.setattr(reporting, '_history_version', None)
+
+
+def _buy(db_manager, store, days_ago, items):
+    """Save a receipt from store dated days_ago, with (name, category, quantity, price) items"""
+    receipt_id = db_manager.save_receipt('a.png', f'{store}\n', [
+        {'name': name, 'category': category, 'quantity': quantity, 'price': price}
+        for name, category, quantity, price in items])
+    with db_manager.connection() as conn:
+        conn.execute('UPDATE receipts SET upload_date = ? WHERE id = ?',
+                     ((datetime.now() - timedelta(days=days_ago)).isoformat(' '), receipt_id))
+
+
+@pytest.fixture
+def history(db_manager):
+    _buy(db_manager, 'FRESH MART', 3, [('Milk', 'dairy', 1, 2.00)])
+    _buy(db_manager, 'FRESH MART', 2, [('Milk', 'dairy', 2, 6.00)])
+    _buy(db_manager, 'CORNER GROCERY', 1, [('Bread', 'bakery', 1, 4.00)])
+    _buy(db_manager, 'CORNER GROCERY', 0, [('Milk', 'dairy', 1, 3.50), ('Bread', 'bakery', 1, 2.50),
+                                            ('Apples', 'fruits', 4, 4.00)])
+    _buy(db_manager, 'FRESH MART', 400, [('Milk', 'dairy', 1, 99.00)])
+    return get_item_history(db_manager)
+
+
+def test_rolling_spend(history):
+    # Daily totals 3, 2, 1 and 0 days ago are 2, 6, 4 and 10
+    result = run_report(history, 'rolling_spend', {'days': '3', 'window': '2'})
+    
+    assert result['daily_total'] == [6.0, 4.0, 10.0]
+    assert result['rolling_average'] == [4.0, 5.0, 7.0]
+    assert result['dates'][-1] == datetime.now().date().isoformat()
+
+
+def test_store_trend(history):
+    result = run_report(history, 'store_trend', {'days': '3', 'period': 'day'})
+    
+    assert result['series'] == {'CORNER GROCERY': [0.0, 4.0, 10.0], 'FRESH MART': [6.0, 0.0, 0.0]}
+    assert len(result['periods']) == 3
+
+
+def test_unit_price_and_top_items(history):
+    milk = run_report(history, 'unit_price', {'item': 'MILK', 'days': '4', 'window': '2'})
+    # 2.00 for one, 6.00 for two, nothing, 3.50 for one
+    assert milk['average_unit_price'] == [2.0, 3.0, None, 3.5]
+    assert milk['rolling_average'][1:] == [2.5, 3.0, 3.5]
+    assert milk['purchases'] == [1, 1, 0, 1]
+    
+    top = run_report(history, 'top_items', {'days': '7', 'limit': '1'})
+    assert top['items'] == [{'name': 'milk', 'frequency': 3, 'total_spent': 11.5, 'avg_price': 3.83}]
+
+
+@pytest.mark.parametrize('name, params', [
+    ('rolling_spend', {'days': '0'}),
+    ('rolling_spend', {'days': str(MAX_REPORT_DAYS + 1)}),
+    ('rolling_spend', {'window': '-1'}),
+    ('top_items', {'limit': '100000'}),
+    ('top_items', {'days': 'soon'}),
+    ('top_items', {'color': 'red'}),
+    ('category_trend', {'period': 'year'}),
+])
+def test_rejects_bad_parameters(history, name, params):
+    with pytest.raises(ValueError):
+        run_report(history, name, params)
+
+
+def test_unknown_report(history):
+    with pytest.raises(KeyError):
+        run_report(history, 'nope', {})
+
+
+def test_snapshot_is_reused_by_other_processes(db_manager, tmp_path, monkeypatch):
+    _buy(db_manager, 'FRESH MART', 0, [('Milk', 'dairy', 1, 3.50)])
+    snapshot_dir = str(tmp_path / 'snapshots')
+    history = get_item_history(db_manager, snapshot_dir)
+    
+    # Another worker (no history in memory) loads the snapshot instead of the database
+    monkeypatch.setattr(reporting, '_history', None)
+    with monkeypatch.context() as patch:
+        patch.setattr(ItemHistory, 'from_database', None)
+        loaded = get_item_history(db_manager, snapshot_dir)
+    assert loaded is not history
+    assert run_report(loaded, 'rolling_spend', {'days': '1', 'window': '1'}) == \
+        run_report(history, 'rolling_spend', {'days': '1', 'window': '1'})
+    assert loaded.values == history.values and loaded.last_item_id == history.last_item_id
+    
+    # A save changes the data version: the new history replaces the old snapshot
+    _buy(db_manager, 'FRESH MART', 0, [('Bread', 'bakery', 1, 2.50)])
+    updated = get_item_history(db_manager, snapshot_dir)
+    assert len(updated) == 2
+    assert len(list((tmp_path / 'snapshots').glob('items-*.npz'))) == 1
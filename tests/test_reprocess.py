@@ -0,0 +1,114 @@
+import os
+
+from item_categorizer import ItemCategorizer
+from receipt_parser import ReceiptParser
+from reprocess import (CHECKPOINT_NAME, acquire_run_lock, diff_items, release_run_lock, reparse_running,
+                       run_reparse)
+
+TEXT = 'FRESH MART\nWhole Milk 3.49\nWhole Milk 3.49\nBananas 1.20\nTOTAL 8.18'
+
+
+def _item(item_id, name, category, price, raw_line):
+    return {'id': item_id, 'name': name, 'category': category, 'quantity': 1, 'unit_price': price,
+            'total_price': price, 'raw_line': raw_line}
+
+
+def _parsed(text):
+    """Items as the current parser and categorizer store them"""
+    categorizer = ItemCategorizer()
+    return [{'name': item['name'], 'category': categorizer.categorize_item(item['name']),
+             'quantity': item['quantity'], 'unit_price': item['unit_price'], 'price': item['price'], 'raw_line': item['raw_line']}
+            for item in ReceiptParser().parse_receipt(text)]
+
+
+def _stored(db_manager, receipt_id):
+    return [{key: item[key] for key in ('id', 'name', 'category', 'raw_line')}
+            for item in db_manager.get_items_for_receipts([receipt_id])[receipt_id]]
+
+
+def test_diff_keeps_identical_rows_and_duplicates():
+    milk = _item(1, 'Whole Milk', 'dairy', 3.49, 'Whole Milk 3.49')
+    existing = [milk, dict(milk, id=2), dict(milk, id=3)]
+    parsed = [{key: value for key, value in milk.items() if key != 'id'}] * 2
+    
+    # One duplicate too many is deleted; the other two are left alone
+    change = diff_items(existing, parsed)
+    assert len(change['delete']) == 1 and change['update'] == change['insert'] == []
+    assert diff_items(existing[:2], parsed) == {'delete': [], 'update': [], 'insert': []}
+    assert diff_items(existing[:1], parsed) == {'delete': [], 'update': [], 'insert': [parsed[1]]}
+
+
+def test_diff_updates_rows_from_the_same_raw_line():
+    existing = [_item(1, 'Whole Milk', 'other', 3.49, 'Whole Milk 3.49'),
+                _item(2, 'Bananas', 'fruits', 1.20, 'Bananas 1.20'),
+                _item(3, 'TOTAL', 'other', 8.18, 'TOTAL 8.18')]
+    milk, bananas, eggs = ({key: value for key, value in item.items() if key != 'id'} for item in (
+        _item(None, 'Whole Milk', 'dairy', 3.49, 'Whole Milk 3.49'), existing[1],
+        _item(None, 'Eggs', 'dairy', 4.19, 'Eggs 4.19')))
+    
+    change = diff_items(existing, [milk, bananas, eggs])
+    assert change == {'delete': [3], 'update': [dict(milk, id=1)], 'insert': [eggs]}
+
+
+def test_run_reparse_rewrites_only_changed_items(db_manager):
+    items = _parsed(TEXT)
+    unchanged_id = db_manager.save_receipt('a.png', TEXT, items)
+    # A stale category, and a line the parser now skips
+    stale = [dict(items[0], category='other'), items[1], items[2],
+             {'name': 'TOTAL', 'category': 'other', 'price': 8.18, 'raw_line': 'TOTAL 8.18'}]
+    stale_id = db_manager.save_receipt('b.png', TEXT, stale)
+    before = _stored(db_manager, stale_id)
+    
+    stats = run_reparse(db_manager, chunk_size=1, max_workers=1)
+    
+    assert {key: stats[key] for key in ('receipts', 'changed_receipts', 'deleted', 'updated', 'inserted')} == \
+        {'receipts': 2, 'changed_receipts': 1, 'deleted': 1, 'updated': 1, 'inserted': 0}
+    after = _stored(db_manager, stale_id)
+    # The row for the re-categorized line keeps its id
+    assert after == [dict(before[0], category=items[0]['category'])] + before[1:3]
+    assert db_manager.get_receipt(stale_id)['total_amount'] == round(3.49 * 2 + 1.20, 2)
+    assert db_manager.get_checkpoint(CHECKPOINT_NAME)['status'] == 'done'
+    
+    unchanged = _stored(db_manager, unchanged_id)
+    assert run_reparse(db_manager, max_workers=1)['changed_receipts'] == 0
+    assert _stored(db_manager, unchanged_id) == unchanged
+
+
+def test_run_reparse_resumes_from_the_checkpoint(db_manager):
+    stale = [dict(item, category='other') for item in _parsed(TEXT)]
+    first_id = db_manager.save_receipt('a.png', TEXT, stale)
+    second_id = db_manager.save_receipt('b.png', TEXT, stale)
+    done = {'receipts': 1, 'changed_receipts': 1, 'deleted': 0, 'updated': 3, 'inserted': 0}
+    db_manager.set_checkpoint(CHECKPOINT_NAME, 'running', first_id, done)
+    
+    stats = run_reparse(db_manager, max_workers=1)
+    
+    # Only the receipt after the checkpoint is re-parsed, and the counts carry on
+    assert {item['category'] for item in _stored(db_manager, first_id)} == {'other'}
+    assert {item['category'] for item in _stored(db_manager, second_id)} != {'other'}
+    assert stats['receipts'] == 2 and stats['changed_receipts'] == 2
+    
+    # restart ignores the checkpoint
+    assert run_reparse(db_manager, max_workers=1, restart=True)['changed_receipts'] == 1
+    assert {item['category'] for item in _stored(db_manager, first_id)} != {'other'}
+
+
+def test_reparse_running_only_reads_the_lock(tmp_path):
+    db_path = str(tmp_path / 'receipts.db')
+    assert not reparse_running(db_path)
+    
+    lock_file = acquire_run_lock(db_path)
+    assert reparse_running(db_path)
+    # A second run still finds the lock taken, without clearing the holder's pid
+    assert acquire_run_lock(db_path) is None
+    with open(f'{db_path}.reparse.lock') as f:
+        assert f.read() == str(os.getpid())
+    
+    release_run_lock(lock_file)
+    assert not reparse_running(db_path)
+    
+    # A pid left behind by a killed run is not mistaken for a live one
+    with open(f'{db_path}.reparse.lock', 'w') as f:
+        f.write('999999999')
+    assert not reparse_running(db_path)
+    release_run_lock(acquire_run_lock(db_path))
@@ -0,0 +1,67 @@
+import pytest
+
+from benchmarks.receipts import make_receipts
+from database import DatabaseManager
+from reference.database import save_receipt as reference_save_receipt
+
+# Everything a save writes, apart from upload_date
+CONTENT_QUERIES = {
+    'receipts': 'SELECT id, filename, raw_text, store_name, total_amount, item_count FROM receipts ORDER BY id',
+    'items': 'SELECT id, receipt_id, name, category, quantity, unit_price, total_price, raw_line '
+             'FROM items ORDER BY id',
+    'spending_daily_category': 'SELECT category, ROUND(total_spent, 2), item_count FROM spending_daily_category '
+                               'ORDER BY category',
+    'items_search': 'SELECT rowid, name, raw_line, store_name FROM items_search ORDER BY rowid',
+    # A rebuild numbers products in name order rather than as first seen
+    'price_observations': 'SELECT p.product_key, o.item_id, o.receipt_id, o.quantity, ROUND(o.unit_price, 4) '
+                          'FROM price_observations o JOIN products p ON o.product_id = p.id ORDER BY o.item_id',
+    'products': 'SELECT product_key, name, category FROM products ORDER BY product_key',
+}
+
+
+def _receipts():
+    receipts = [{'filename': f'{i:04d}.png', 'raw_text': receipt['text'], 'items': receipt['items']}
+                for i, receipt in enumerate(make_receipts(60, seed=3))]
+    # Missing fields fall back to the same defaults, and a receipt may have no items
+    receipts[10]['items'] = [{'name': 'Mystery'}, {'price': 1.5, 'raw_line': 'NO NAME 1.50'}, {}]
+    receipts[20]['items'] = []
+    receipts[30]['raw_text'] = ''
+    return receipts
+
+def _contents(db_manager):
+    conn = db_manager.get_connection()
+    try:
+        return {table: conn.execute(sql).fetchall() for table, sql in CONTENT_QUERIES.items()}
+    finally:
+        conn.close()
+
+def _saved_with(tmp_path, name, save):
+    db_manager = DatabaseManager(str(tmp_path / f'{name}.db'))
+    db_manager.init_database()
+    receipt_ids = save(db_manager, _receipts())
+    return receipt_ids, db_manager
+
+
+def test_batched_and_single_saves_match_original_inserts(tmp_path):
+    reference_ids, reference = _saved_with(tmp_path, 'reference', lambda db, receipts: [
+        reference_save_receipt(db, r['filename'], r['raw_text'], r['items']) for r in receipts])
+    # The original inserts predate the derived tables, so fill those by a rebuild
+    reference.rebuild_derived_tables()
+    expected = _contents(reference)
+    
+    single_ids, single = _saved_with(tmp_path, 'single', lambda db, receipts: [
+        db.save_receipt(r['filename'], r['raw_text'], r['items']) for r in receipts])
+    assert single_ids == reference_ids
+    assert _contents(single) == expected
+    
+    batched_ids, batched = _saved_with(tmp_path, 'batched', lambda db, receipts: [
+        receipt_id for offset in range(0, len(receipts), 25)
+        for receipt_id in db.save_receipts(receipts[offset:offset + 25])])
+    assert batched_ids == reference_ids
+    assert _contents(batched) == expected
+
+
+@pytest.mark.parametrize('batch', [[], [{'filename': 'a.png', 'raw_text': 'FRESH MART', 'items': []}]])
+def test_save_receipts_small_batches(db_manager, batch):
+    assert len(db_manager.save_receipts(batch)) == len(batch)
+    assert db_manager.get_receipt_totals()['receipts'] == len(batch)
@@ -0,0 +1,44 @@
+import sqlite3
+
+import pytest
+
+import migrations
+
+
+def _items(*names):
+    return [{'name': name, 'category': 'other', 'price': 1.0, 'raw_line': f'{name} 1.00'} for name in names]
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('%', ['50% off']),
+    ('_', ['a_b']),
+    ('\\', ['back\\slash']),
+    ('ab', ['ab']),
+])
+def test_short_queries_match_wildcards_literally(db_manager, query, expected):
+    db_manager.save_receipt('a.png', 'FRESH MART', _items('50% off', 'a_b', 'ab', 'back\\slash', 'plain'))
+    
+    results = db_manager.search_items(query)
+    assert sorted(result['name'] for result in results) == expected
+    assert {result['match'] for result in results} == {'substring'}
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('chedar', 'Cheddar Cheese'),
+    # No trigram in common with the name it means
+    ('mlik', 'Whole Milk'),
+    ('bnanas', 'Bananas'),
+])
+def test_fuzzy_search_finds_typos(db_manager, query, expected):
+    db_manager.save_receipt('a.png', 'FRESH MART', _items('Whole Milk', 'Cheddar Cheese', 'Bananas', 'Likely Bread'))
+    
+    results = db_manager.search_items(query)
+    assert expected in [result['name'] for result in results]
+    assert {result['match'] for result in results} == {'fuzzy'}
+    assert 'Bananas' not in [result['name'] for result in db_manager.search_items('mlik')]
+
+
+def test_search_index_needs_trigram_sqlite(monkeypatch):
+    monkeypatch.setattr(sqlite3, 'sqlite_version_info', (3, 33, 0))
+    with pytest.raises(RuntimeError, match='3.34.0'):
+        migrations.add_item_search_index(sqlite3.connect(':memory:').cursor())